@@ -1,5 +1,6 @@
 import os
 import json
+import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
@@ -7,6 +8,7 @@ from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends, Request, Form, File, UploadFile
 from fastapi.responses import RedirectResponse, HTMLResponse
 from sqlalchemy.orm import Session
+from starlette.datastructures import FormData
 
 from dao.database import get_db
 from dao.aluno_dao import AlunoDAO
@@ -22,9 +24,16 @@ from models.prova_questao import ProvaQuestao
 from models.resposta import Resposta
 from models.resultado import Resultado
 
-from controllers.usuario_controller import verificar_sessao
+from utils.requisicao import ler_formulario
+from utils.auth import verificar_aluno_sessao
+from utils.sessao import Principal, obter_principal
 
 from services.graficos_service import AnalyticsService
+from services.resumo_service import ResumoService
+from services import correcao_service
+from services.correcao_service import CorrecaoService
+from dao.submissao_prova_dao import SubmissaoProvaDAO
+from models.submissao_prova import StatusSubmissao
 from dao.notificacao_dao import NotificacaoDAO
 from dao.formulario_dao import FormularioDAO
 from dao.resposta_formulario_dao import RespostaFormularioDAO
@@ -132,7 +141,7 @@ def cadastro_aluno_page(request: Request, idUser: int):
     )
 
 @router.post("/cadastro/aluno/{idUser}")
-async def cadastrar_aluno(
+def cadastrar_aluno(
     idUser: int,
     nome: str = Form(...),
     ano: int = Form(...),
@@ -179,7 +188,7 @@ async def cadastrar_aluno(
     if not imagem_relativa and imagem and imagem.filename:
         filename = f"{idUser}_{datetime.now().strftime('%Y%m%d%H%M%S')}{Path(imagem.filename).suffix}"
         file_location = os.path.join(upload_dir_aluno, filename)
-        conteudo = await imagem.read()
+        conteudo = imagem.file.read()
         with open(file_location, "wb") as buffer:
             buffer.write(conteudo)
         imagem_relativa = f"/static/uploads/alunos/{filename}"
@@ -191,7 +200,7 @@ async def cadastrar_aluno(
     elif acesso_internet == "false":
         acesso_internet_bool = False
 
-    AlunoDAO.create(
+    aluno = AlunoDAO.create(
         db,
         idUser=idUser,
         nome=nome,
@@ -207,6 +216,8 @@ async def cadastrar_aluno(
         acesso_internet=acesso_internet_bool,
         observacoes=observacoes
     )
+    # Formulários já abertos para o novo aluno (o resto da reconciliação é do agendador)
+    NotificacaoDAO.sincronizar_pendentes_aluno(db, aluno.idAluno)
 
     return RedirectResponse(url="/login?sucesso=cadastro_realizado", status_code=303)
 
@@ -214,19 +225,18 @@ async def cadastrar_aluno(
 @router.get("/perfil")
 def perfil(
     request: Request,
-    user_id: str = Depends(verificar_sessao),
+    principal: Principal = Depends(verificar_aluno_sessao),
     db: Session = Depends(get_db),
 ):
     """
     Exibe o perfil do aluno com dados e gráficos de desempenho.
     A lógica de coleta de dados é delegada ao AnalyticsService.
     """
-    # user_id já foi validado pela dependência verificar_sessao
-    # Converte user_id para int, pois o serviço espera int
-    aluno_profile_data = AnalyticsService.get_aluno_profile_data(db, int(user_id))
+    # idAluno vem do token da sessão, sem consultar o banco
+    aluno_profile_data = AnalyticsService.get_aluno_profile_data(db, principal.papel_id)
 
     if not aluno_profile_data:
-        # Se o serviço retornar None (aluno não encontrado apesar do user_id válido),
+        # Se o serviço retornar None (aluno não encontrado apesar da sessão válida),
         # redireciona para o login ou uma página de erro.
         return RedirectResponse(url="/login?erro=aluno_nao_cadastrado", status_code=303)
 
@@ -238,23 +248,15 @@ def perfil(
 
     max_chart_value = aluno_profile_data.get('maxChartValue', 10)
 
-    # Verifica formulários não respondidos e cria notificações
-    NotificacaoDAO.verificar_formularios_nao_respondidos(db)
-
-    # Busca todos os formulários e verifica quais o aluno ainda não respondeu
-    formularios_pendentes = []
-    todos_formularios = FormularioDAO.get_all(db)
-    
-    for form in todos_formularios:
-        # Verifica se o aluno já respondeu este formulário
-        ja_respondeu = RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno.idAluno, form.id)
-        if not ja_respondeu:
-            # Se o aluno não respondeu, adiciona à lista de pendências
-            formularios_pendentes.append({
-                "id": form.id,
-                "titulo": form.titulo,
-                "link": f"/formularios/{form.id}"
-            })
+    # Formulários direcionados ao aluno que ele ainda não respondeu (consulta única)
+    formularios_pendentes = [
+        {
+            "id": form.id,
+            "titulo": form.titulo,
+            "link": f"/aluno/formularios/{form.id}"
+        }
+        for form in FormularioDAO.get_pendentes_for_aluno(db, aluno.idAluno)
+    ]
 
     # Busca as notificações não lidas do aluno
     notificacoes = NotificacaoDAO.get_notificacoes_by_aluno(db, aluno.idAluno, lida=False)
@@ -283,21 +285,20 @@ def perfil(
 
 # --- Rota /aluno/dashboard/{aluno_id} (AGORA REFATORADA) ---
 @router.get("/aluno/dashboard/{aluno_id}", response_class=HTMLResponse)
-async def dashboard_aluno(
+def dashboard_aluno(
     request: Request,
     aluno_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao) # Protege o dashboard do aluno
+    principal: Principal = Depends(obter_principal) # Protege o dashboard do aluno
 ):
     """
     Exibe o dashboard detalhado de um aluno específico.
     A lógica de coleta de dados é delegada ao AnalyticsService.
     """
-    # Embora a rota receba aluno_id, usamos user_id para garantir que o usuário logado
-    # tenha permissão para ver este dashboard (se essa for a regra de negócio).
-    # Caso contrário, se qualquer um puder ver o dashboard de qualquer aluno, remova user_id Depends(verificar_sessao).
-    # Para simplicidade e consistência, a lógica aqui é para o aluno ver SEU PRÓPRIO dashboard.
-    if int(user_id) != aluno_id and db.query(Usuario).filter(Usuario.id == int(user_id)).first().tipo != "gestor":
+    # O aluno vê apenas o SEU dashboard; o gestor vê o de qualquer aluno.
+    # Tipo e idAluno vêm do token da sessão, sem consultar o banco.
+    proprio = principal.tipo == "aluno" and principal.papel_id == aluno_id
+    if not proprio and principal.tipo != "gestor":
         # Se o ID na URL não corresponde ao usuário logado E o usuário não é gestor
         # Isso é uma regra de negócio, ajuste conforme a necessidade.
         raise HTTPException(
@@ -326,10 +327,10 @@ async def dashboard_aluno(
 @router.get("/aluno/dados")
 def editar_dados_page(
     request: Request,
-    user_id: str = Depends(verificar_sessao),
+    principal: Principal = Depends(verificar_aluno_sessao),
     db: Session = Depends(get_db)
 ):
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
+    aluno = db.get(Aluno, principal.papel_id)
     if not aluno:
         return RedirectResponse(url="/login", status_code=303)
     
@@ -342,9 +343,9 @@ def editar_dados_page(
     )
 
 @router.post("/aluno/dados")
-async def editar_dados(
+def editar_dados(
     request: Request,
-    user_id: str = Depends(verificar_sessao),
+    principal: Principal = Depends(verificar_aluno_sessao),
     nome: str = Form(...),
     idade: int = Form(...),
     municipio: str = Form(...),
@@ -360,18 +361,16 @@ async def editar_dados(
     foto_cortada: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
+    aluno = db.get(Aluno, principal.papel_id)
     if not aluno:
         return RedirectResponse(url="/login", status_code=303)
     
     # Atualizar dados básicos
     aluno.nome = nome
     aluno.idade = idade
-    aluno.municipio = municipio
     aluno.zona = zona
     aluno.origem_escolar = origem_escolar
-    aluno.curso = curso
-    aluno.ano = ano
+    ResumoService.atualizar_grupos_aluno(db, aluno, curso=curso, ano=ano, municipio=municipio)
     aluno.escola = escola
     aluno.forma_ingresso = forma_ingresso
     if acesso_internet == "true":
@@ -412,7 +411,7 @@ async def editar_dados(
         elif foto and foto.filename:
             filename = f"aluno_{aluno.idAluno}_{datetime.now().strftime('%Y%m%d%H%M%S')}{Path(foto.filename).suffix}"
             file_location = os.path.join(upload_dir_aluno, filename)
-            conteudo = await foto.read()
+            conteudo = foto.file.read()
             with open(file_location, "wb") as buffer:
                 buffer.write(conteudo)
             aluno.imagem = f"/static/uploads/alunos/{filename}"
@@ -428,20 +427,15 @@ def turmas_aluno(
     sucesso: str = None,
     erro: str = None,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
     """Lista turmas do aluno"""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        return RedirectResponse(url="/login", status_code=303)
-    
-    turmas_aluno = AlunoTurmaDAO.get_turmas_with_details_by_aluno(db, aluno.idAluno)
+    turmas_aluno = AlunoTurmaDAO.get_turmas_with_details_by_aluno(db, principal.papel_id)
     return templates.TemplateResponse(
         "aluno/turmas_aluno.html",
         {
             "request": request, 
             "turmas_aluno": turmas_aluno, 
-            "aluno": aluno,
             "sucesso": sucesso,
             "erro": erro
         }
@@ -453,12 +447,10 @@ def entrar_turma(
     request: Request,
     codigo: str = Form(...),
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
     """Processa entrada do aluno em turma"""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        return RedirectResponse(url="/login", status_code=303)
+    aluno_id = principal.papel_id
     
     # Buscar turma pelo código
     turma = TurmaDAO.get_by_codigo(db, codigo.upper())
@@ -466,12 +458,14 @@ def entrar_turma(
         return RedirectResponse(url="/aluno/turmas?erro=Código de turma inválido", status_code=303)
     
     # Verificar se aluno já está na turma
-    if AlunoTurmaDAO.is_aluno_in_turma(db, aluno.idAluno, turma.id):
+    if AlunoTurmaDAO.is_aluno_in_turma(db, aluno_id, turma.id):
         return RedirectResponse(url="/aluno/turmas?erro=Você já está matriculado nesta turma", status_code=303)
     
     # Adicionar aluno à turma
-    aluno_turma = AlunoTurmaDAO.create(db, aluno.idAluno, turma.id)
+    aluno_turma = AlunoTurmaDAO.create(db, aluno_id, turma.id)
     if aluno_turma:
+        # Formulários da turma passam a valer para o aluno
+        NotificacaoDAO.sincronizar_pendentes_aluno(db, aluno_id)
         return RedirectResponse(url="/aluno/turmas?sucesso=Entrou na turma com sucesso", status_code=303)
     else:
         return RedirectResponse(url="/aluno/turmas?erro=Erro ao entrar na turma", status_code=303)
@@ -480,26 +474,21 @@ def entrar_turma(
 def provas_aluno(
     request: Request,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
     """Lista provas disponíveis para o aluno"""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        return RedirectResponse(url="/login", status_code=303)
-    
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    ProvaTurmaDAO.check_and_update_expired(db)
+    aluno_id = principal.papel_id
     
     # Buscar provas ativas das turmas do aluno
-    provas_ativas = ProvaTurmaDAO.get_provas_for_aluno(db, aluno.idAluno)
+    provas_ativas = ProvaTurmaDAO.get_provas_for_aluno(db, aluno_id)
     
     # Buscar provas expiradas para consulta
-    provas_expiradas = ProvaTurmaDAO.get_provas_expired_for_aluno(db, aluno.idAluno)
+    provas_expiradas = ProvaTurmaDAO.get_provas_expired_for_aluno(db, aluno_id)
     
     # Para cada prova, verificar se o aluno já respondeu
     for prova_turma in provas_ativas:
         resultado = db.query(Resultado).filter(
-            Resultado.aluno_id == aluno.idAluno,
+            Resultado.aluno_id == aluno_id,
             Resultado.prova_id == prova_turma.prova.id
         ).first()
         prova_turma.aluno_ja_respondeu = resultado is not None
@@ -508,7 +497,7 @@ def provas_aluno(
     
     for prova_turma in provas_expiradas:
         resultado = db.query(Resultado).filter(
-            Resultado.aluno_id == aluno.idAluno,
+            Resultado.aluno_id == aluno_id,
             Resultado.prova_id == prova_turma.prova.id
         ).first()
         prova_turma.aluno_ja_respondeu = resultado is not None
@@ -519,7 +508,6 @@ def provas_aluno(
         "aluno/provas_aluno.html",
         {
             "request": request, 
-            "aluno": aluno,
             "provas_ativas": provas_ativas,
             "provas_expiradas": provas_expiradas
         }
@@ -532,15 +520,11 @@ def detalhes_turma_aluno(
     request: Request,
     turma_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
     """Detalhes de uma turma específica para o aluno"""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        return RedirectResponse(url="/login", status_code=303)
-    
     # Verificar se o aluno está na turma
-    if not AlunoTurmaDAO.is_aluno_in_turma(db, aluno.idAluno, turma_id):
+    if not AlunoTurmaDAO.is_aluno_in_turma(db, principal.papel_id, turma_id):
         raise HTTPException(status_code=403, detail="Você não está matriculado nesta turma")
     
     turma = TurmaDAO.get_with_details(db, turma_id)
@@ -558,7 +542,6 @@ def detalhes_turma_aluno(
         {
             "request": request, 
             "turma": turma, 
-            "aluno": aluno,
             "colegas": colegas,
             "provas_turma": provas_turma
         }
@@ -569,16 +552,9 @@ def responder_prova_aluno(
     request: Request,
     prova_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
     """Página para o aluno responder uma prova"""
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        return RedirectResponse(url="/login", status_code=303)
-    
     # Buscar prova com dados relacionados
     from sqlalchemy.orm import joinedload
     prova = db.query(Prova).options(
@@ -594,107 +570,96 @@ def responder_prova_aluno(
     
     return templates.TemplateResponse(
         "aluno/responder_prova.html",
-        {"request": request, "prova": prova, "aluno": aluno}
+        # Token do formulário: reenvios do mesmo formulário são reconhecidos como repetição
+        {"request": request, "prova": prova, "token_submissao": str(uuid.uuid4())}
     )
 
 @router.post("/aluno/prova/{prova_id}/responder")
-async def salvar_resposta_prova(
+def salvar_resposta_prova(
     request: Request,
     prova_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao),
+    form_data: FormData = Depends(ler_formulario)
 ):
     """Salva as respostas do aluno para uma prova"""
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        return RedirectResponse(url="/login", status_code=303)
-    
-    # Buscar prova
-    from sqlalchemy.orm import joinedload
-    prova = db.query(Prova).options(
-        joinedload(Prova.prova_questoes).joinedload(ProvaQuestao.questao_banco)
-    ).filter(Prova.id == prova_id).first()
+    # idAluno vem do token da sessão, sem consultar o banco
+    aluno_id = principal.papel_id
+    token = form_data.get("token_submissao") or None
+    
+    if correcao_service.ENVIO_EM_FILA:
+        # Modo fila: grava o envio e responde na hora; os workers do agendador corrigem
+        # com o gabarito atual (e descartam questões fora dele), então aqui não se usa o cache
+        if not db.query(Prova.id).filter(Prova.id == prova_id).first():
+            raise HTTPException(status_code=404, detail="Prova não encontrada")
+        if db.query(Resultado.id).filter(Resultado.aluno_id == aluno_id, Resultado.prova_id == prova_id).first():
+            return RedirectResponse(url="/aluno/provas?erro=Você já respondeu esta prova", status_code=303)
+        respostas = {
+            int(campo[len("questao_"):]): valor
+            for campo, valor in form_data.items()
+            if campo.startswith("questao_") and campo[len("questao_"):].isdigit() and isinstance(valor, str) and valor
+        }
+        submissao = SubmissaoProvaDAO.enfileirar(
+            db, aluno_id, prova_id, respostas, (token or str(uuid.uuid4()))[:36]
+        )
+        if submissao.aluno_id != aluno_id:
+            raise HTTPException(status_code=400, detail="Envio inválido")
+        return RedirectResponse(url=f"/aluno/provas?submissao={submissao.id}", status_code=303)
     
-    if not prova:
+    # Gabarito atual da prova em uma consulta (sem carregar as questões completas)
+    gabarito = CorrecaoService.gabarito_para_correcao(db, prova_id)
+    if not gabarito and not db.query(Prova.id).filter(Prova.id == prova_id).first():
         raise HTTPException(status_code=404, detail="Prova não encontrada")
     
-    # Verificar se o aluno já respondeu esta prova
-    resultado_existente = db.query(Resultado).filter(
-        Resultado.aluno_id == aluno.idAluno,
-        Resultado.prova_id == prova_id
-    ).first()
-    
-    if resultado_existente:
-        return RedirectResponse(url="/aluno/provas?erro=Você já respondeu esta prova", status_code=303)
-    
     # Processar respostas do formulário
-    form_data = await request.form()
-    respostas_corretas = 0
-    total_questoes = len(prova.prova_questoes)
-    
-    # Salvar cada resposta
-    for questao_prova in prova.prova_questoes:
-        questao_id = questao_prova.questao_banco.id
-        resposta_aluno = form_data.get(f"questao_{questao_id}")
-        
-        if resposta_aluno:
-            # Verificar se já existe uma resposta para esta questão (evitar duplicatas)
-            resposta_existente = db.query(Resposta).filter(
-                Resposta.aluno_id == aluno.idAluno,
-                Resposta.questao_id == questao_id
-            ).first()
-            
-            if resposta_existente:
-                # Atualizar resposta existente
-                resposta_existente.resposta = resposta_aluno
-            else:
-                # Criar nova resposta
-                resposta = Resposta(
-                    aluno_id=aluno.idAluno,
-                    questao_id=questao_id,
-                    resposta=resposta_aluno
-                )
-                db.add(resposta)
-            
-            # Verificar se está correta
-            if resposta_aluno == questao_prova.questao_banco.resposta_correta:
-                respostas_corretas += 1
-    
-    # Calcular nota e situação
-    total_questoes = len(prova.prova_questoes)
-    from utils.nota_service import calcular_nota_e_situacao
-    nota, situacao = calcular_nota_e_situacao(respostas_corretas, total_questoes)
-    
-    resultado = Resultado(
-        aluno_id=aluno.idAluno,
+    respostas = {
+        questao_id: form_data.get(f"questao_{questao_id}")
+        for questao_id in gabarito
+        if form_data.get(f"questao_{questao_id}")
+    }
+    
+    # Correção em memória; respostas e resultado gravados em uma única transação
+    resultado = CorrecaoService.registrar_envio(
+        db,
+        aluno_id=aluno_id,
         prova_id=prova_id,
-        acertos=respostas_corretas,
-        situacao=situacao,
-        nota=nota,
-        total_questoes=total_questoes
+        gabarito=gabarito,
+        respostas=respostas,
+        total_questoes=len(gabarito),
+        token=token
     )
-    db.add(resultado)
-    
-    db.commit()
+    if resultado is None:
+        return RedirectResponse(url="/aluno/provas?erro=Você já respondeu esta prova", status_code=303)
     
     return RedirectResponse(url="/aluno/provas?sucesso=Prova respondida com sucesso!", status_code=303)
 
+@router.get("/aluno/submissoes/{submissao_id}/status")
+def status_submissao_prova(
+    submissao_id: int,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(verificar_aluno_sessao)
+):
+    """Situação de um envio de prova na fila (consultada periodicamente pela página de provas)"""
+    submissao = SubmissaoProvaDAO.get_do_aluno(db, submissao_id, principal.papel_id)
+    if not submissao:
+        raise HTTPException(status_code=404, detail="Envio não encontrado")
+    
+    dados = {"id": submissao.id, "prova_id": submissao.prova_id, "status": submissao.status.value}
+    if submissao.status == StatusSubmissao.CONCLUIDA and submissao.resultado_id:
+        resultado = db.query(Resultado).filter(Resultado.id == submissao.resultado_id).first()
+        if resultado:
+            dados["resultado"] = {"acertos": resultado.acertos, "nota": resultado.nota, "situacao": resultado.situacao}
+    return dados
+
 @router.get("/aluno/prova/{prova_id}/consultar")
 def consultar_prova_aluno(
     request: Request,
     prova_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    ProvaTurmaDAO.check_and_update_expired(db)
     """Página para o aluno consultar uma prova (expirada ou já respondida)"""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        return RedirectResponse(url="/login", status_code=303)
+    aluno_id = principal.papel_id
     
     # Buscar prova com dados relacionados
     from sqlalchemy.orm import joinedload
@@ -713,7 +678,7 @@ def consultar_prova_aluno(
     
     # Verificar se o aluno já respondeu a prova
     resultado = db.query(Resultado).filter(
-        Resultado.aluno_id == aluno.idAluno,
+        Resultado.aluno_id == aluno_id,
         Resultado.prova_id == prova_id
     ).first()
     
@@ -724,7 +689,7 @@ def consultar_prova_aluno(
         Resposta.questao_id,
         func.max(Resposta.id).label('max_id')
     ).filter(
-        Resposta.aluno_id == aluno.idAluno,
+        Resposta.aluno_id == aluno_id,
         Resposta.questao_id.in_([pq.questao_banco_id for pq in prova.prova_questoes])
     ).group_by(Resposta.questao_id).subquery()
     
@@ -765,7 +730,6 @@ def consultar_prova_aluno(
         {
             "request": request, 
             "prova": prova, 
-            "aluno": aluno,
             "resultado": resultado,
             "respostas_aluno": respostas_aluno,
             "status_prova": status_prova,
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, Form, Request, HTTPException
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, Form, Request, HTTPException
+from fastapi.responses import RedirectResponse, HTMLResponse, FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import FormData
+import asyncio
 import json
+import os
+import tempfile
+import time
 from typing import Optional
 
 # Importações dos seus DAOs e Models
@@ -11,20 +18,32 @@ from dao.pergunta_formulario_dao import PerguntaFormularioDAO # Adicionado: DAO
 from dao.resposta_formulario_dao import RespostaFormularioDAO
 from dao.notificacao_dao import NotificacaoDAO
 from services.formulario_analytics_service import FormularioAnalyticsService
+from services.formulario_export_service import FormularioExportService, CABECALHO_EXPORTACAO
+from services.contagem_formulario_service import ContagemFormularioService
+from services.notificacao_service import NotificacaoService
 
 from models.aluno import Aluno
 
 from controllers.usuario_controller import verificar_sessao
-from controllers.gestor_controller import verificar_gestor_sessao 
+from utils.requisicao import ler_formulario
+from utils.auth import verificar_gestor_sessao, verificar_aluno_sessao
+from utils.sessao import Principal
+from utils import export_service
 
 # Importar a instância templates do app_config
 from app_config import templates
 
 router = APIRouter()
 
+RESPONDEDORES_POR_PAGINA = 50
+# Painel ao vivo (SSE): intervalo entre leituras dos contadores e duração de cada
+# conexão, em segundos; o EventSource do navegador reconecta sozinho ao fim.
+CONTAGENS_SSE_INTERVALO = float(os.getenv("CONTAGENS_SSE_INTERVALO", "3"))
+CONTAGENS_SSE_DURACAO = float(os.getenv("CONTAGENS_SSE_DURACAO", "300"))
+
 
 @router.get("/gestor/formularios", response_class=HTMLResponse)
-async def listar_formularios_gestor(request: Request, db: Session = Depends(get_db)):
+def listar_formularios_gestor(request: Request, db: Session = Depends(get_db)):
     """Lista todos os formulários cadastrados para o gestor."""
     formularios = FormularioDAO.get_all(db)
     formularios_info = []
@@ -68,8 +87,9 @@ def cadastrar_formulario_page(
     )
 
 @router.post("/gestor/formularios/cadastrar")
-async def cadastrar_formulario(
+def cadastrar_formulario(
     request: Request,
+    background_tasks: BackgroundTasks,
     titulo: str = Form(...),
     descricao: Optional[str] = Form(None),
     perguntas_json: str = Form(...),
@@ -122,44 +142,8 @@ async def cadastrar_formulario(
             #
         )
     
-    # Buscar alunos que devem receber o formulário baseado nos filtros
-    alunos_para_notificar = []
-    
-    if turma_id_int:
-        # Se direcionado a uma turma, buscar alunos dessa turma
-        from models.aluno_turma import AlunoTurma
-        aluno_turmas = db.query(AlunoTurma).filter(
-            AlunoTurma.turma_id == turma_id_int,
-            AlunoTurma.status == 'ativo'
-        ).all()
-        aluno_ids = [at.aluno_id for at in aluno_turmas]
-        alunos_para_notificar = db.query(Aluno).filter(Aluno.idAluno.in_(aluno_ids)).all()
-    elif campus_id_int:
-        # Se direcionado a um campus, buscar alunos das turmas desse campus
-        from models.turma import Turma
-        from models.aluno_turma import AlunoTurma
-        turmas_campus = db.query(Turma).filter(Turma.campus_id == campus_id_int).all()
-        turma_ids = [t.id for t in turmas_campus]
-        aluno_turmas = db.query(AlunoTurma).filter(
-            AlunoTurma.turma_id.in_(turma_ids),
-            AlunoTurma.status == 'ativo'
-        ).all()
-        aluno_ids = [at.aluno_id for at in aluno_turmas]
-        alunos_para_notificar = db.query(Aluno).filter(Aluno.idAluno.in_(aluno_ids)).all()
-    elif curso_final:
-        # Se direcionado a um curso, buscar alunos desse curso
-        alunos_para_notificar = db.query(Aluno).filter(Aluno.curso == curso_final).all()
-    else:
-        # Se não tem filtro, notificar todos os alunos
-        alunos_para_notificar = db.query(Aluno).all()
-        
-    for aluno in alunos_para_notificar:
-        NotificacaoDAO.criar_notificacao_para_novo_formulario(
-            db=db,
-            aluno_id=aluno.idAluno,
-            formulario_id=novo_formulario.id,
-            titulo_formulario=titulo
-        )
+    # Notificação em lote (INSERT ... SELECT), executada após a resposta
+    NotificacaoService.disparar_novo_formulario(db, background_tasks, novo_formulario.id)
 
     return RedirectResponse(url="/gestor/formularios", status_code=303)
 
@@ -167,21 +151,38 @@ async def cadastrar_formulario(
 def ver_alunos_que_responderam(
     request: Request,
     formulario_id: int,
+    apos: Optional[int] = None,
+    busca: Optional[str] = None,
     db: Session = Depends(get_db),
     gestor_id: int = Depends(verificar_gestor_sessao)
 ):
-    """Lista os alunos que responderam a um formulário específico."""
+    """Lista os alunos que responderam a um formulário específico, uma página por vez (?apos=<idAluno>)."""
     formulario = FormularioDAO.get_by_id(db, formulario_id)
     if not formulario:
         raise HTTPException(status_code=404, detail="Formulário não encontrado.")
     
-    alunos_respondedores = RespostaFormularioDAO.get_alunos_who_responded_formulario(db, formulario_id)
+    busca = (busca or "").strip() or None
+    respondedores, proximo = RespostaFormularioDAO.listar_respondedores(
+        db, formulario_id, apos_aluno_id=apos, busca=busca, limite=RESPONDEDORES_POR_PAGINA
+    )
     
     return templates.TemplateResponse(
         "gestor/alunos_respondedores.html",
-        {"request": request, "formulario": formulario, "alunos": alunos_respondedores}
+        {"request": request, "formulario": formulario, "respondedores": respondedores,
+         "proximo": proximo, "apos": apos, "busca": busca}
     )
 
+@router.get("/gestor/formularios/{formulario_id}/respostas/total")
+def contar_alunos_que_responderam(
+    formulario_id: int,
+    busca: Optional[str] = None,
+    db: Session = Depends(get_db),
+    gestor_id: int = Depends(verificar_gestor_sessao)
+):
+    """Quantidade de alunos que responderam (com o mesmo filtro de nome da listagem)."""
+    busca = (busca or "").strip() or None
+    return {"total": RespostaFormularioDAO.get_total_respondedores_by_formulario(db, formulario_id, busca=busca)}
+
 @router.get("/gestor/formularios/{formulario_id}/respostas/{aluno_id}")
 def ver_resposta_detalhada_aluno(
     request: Request,
@@ -233,25 +234,20 @@ def ver_resposta_detalhada_aluno(
     )
 
 @router.get("/aluno/formularios")
-async def listar_formularios_aluno(
+def listar_formularios_aluno(
     request: Request, 
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
     """Lista todos os formulários disponíveis para o aluno logado."""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        raise HTTPException(status_code=404, detail="Aluno não encontrado.")
-    
-    # Verifica formulários não respondidos e cria notificações
-    NotificacaoDAO.verificar_formularios_nao_respondidos(db)
+    aluno_id = principal.papel_id
     
     # Buscar formulários filtrados para o aluno (baseado em turma/campus/curso)
-    formularios = FormularioDAO.get_for_aluno(db, aluno.idAluno)
+    formularios = FormularioDAO.get_for_aluno(db, aluno_id)
     formularios_com_status = []
     
     for formulario in formularios:
-        ja_respondeu = RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno.idAluno, formulario.id)
+        ja_respondeu = RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno_id, formulario.id)
         formularios_com_status.append({
             "formulario": formulario,
             "ja_respondeu": ja_respondeu
@@ -267,20 +263,18 @@ def responder_formulario_page(
     request: Request,
     formulario_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao)
 ):
     """Página para o aluno responder um formulário específico."""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        raise HTTPException(status_code=404, detail="Aluno não encontrado.")
+    aluno_id = principal.papel_id
 
     formulario = FormularioDAO.get_by_id(db, formulario_id)
     if not formulario:
         raise HTTPException(status_code=404, detail="Formulário não encontrado.")
 
     # Verificar se já respondeu
-    if RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno.idAluno, formulario.id):
-        NotificacaoDAO.marcar_notificacao_como_lida(db, aluno.idAluno, link=f"/aluno/formularios/{formulario_id}")
+    if RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno_id, formulario.id):
+        NotificacaoDAO.marcar_notificacao_como_lida(db, aluno_id, link=f"/aluno/formularios/{formulario_id}")
         return templates.TemplateResponse(
             "aluno/formulario_ja_respondido.html",
             {"request": request, "formulario": formulario}
@@ -293,27 +287,26 @@ def responder_formulario_page(
         {
             "request": request,
             "formulario": formulario,
-            "perguntas": perguntas,
-            "aluno": aluno
+            "perguntas": perguntas
         }
     )
 
 @router.post("/aluno/formularios/{formulario_id}/responder")
-async def enviar_respostas(
+def enviar_respostas(
     request: Request,
     formulario_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao),
+    form_data: FormData = Depends(ler_formulario)
 ):
     """Processa as respostas do aluno para um formulário."""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        raise HTTPException(status_code=404, detail="Aluno não encontrado.")
+    aluno_id = principal.papel_id
 
-    if RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno.idAluno, formulario_id):
+    # Trava os envios deste aluno até o commit: um duplo envio não soma duas vezes nos contadores
+    if RespostaFormularioDAO.travar_envio(db, aluno_id, formulario_id):
+        db.rollback()
         raise HTTPException(status_code=400, detail="Você já respondeu este formulário.")
 
-    form_data = await request.form()
     perguntas = PerguntaFormularioDAO.get_by_formulario(db, formulario_id)
 
     for pergunta in perguntas:
@@ -324,41 +317,45 @@ async def enviar_respostas(
             if respostas_checkbox:
                 RespostaFormularioDAO.create_resposta(
                     db=db,
-                    aluno_id=aluno.idAluno,
+                    aluno_id=aluno_id,
                     formulario_id=formulario_id,
                     pergunta_id=pergunta.id,
-                    resposta_opcoes=json.dumps(respostas_checkbox)
+                    resposta_opcoes=json.dumps(respostas_checkbox),
+                    pergunta=pergunta
                 )
             
         elif resposta_input is not None: 
             RespostaFormularioDAO.create_resposta(
                 db=db,
-                aluno_id=aluno.idAluno,
+                aluno_id=aluno_id,
                 formulario_id=formulario_id,
                 pergunta_id=pergunta.id,
-                resposta_texto=str(resposta_input)
+                resposta_texto=str(resposta_input),
+                pergunta=pergunta
             )
 
+    ContagemFormularioService.registrar_envio(db, aluno_id, formulario_id)
     db.commit() 
     
-    NotificacaoDAO.marcar_notificacao_como_lida(db, aluno.idAluno, link=f"/aluno/formularios/{formulario_id}")
+    NotificacaoDAO.marcar_notificacao_como_lida(db, aluno_id, link=f"/aluno/formularios/{formulario_id}")
 
     return RedirectResponse(url="/aluno/formularios", status_code=303)
 
 @router.post("/aluno/formularios/{formulario_id}/enviar-respostas")
-async def enviar_respostas(
+def enviar_respostas(
     request: Request,
     formulario_id: int,
     db: Session = Depends(get_db),
-    user_id: str = Depends(verificar_sessao)
+    principal: Principal = Depends(verificar_aluno_sessao),
+    form_data: FormData = Depends(ler_formulario)
 ):
     """Processa as respostas enviadas pelo aluno."""
-    aluno = db.query(Aluno).filter(Aluno.idUser == int(user_id)).first()
-    if not aluno:
-        raise HTTPException(status_code=404, detail="Aluno não encontrado.")
-    
-    # Verifica se o aluno já respondeu
-    if RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno.idAluno, formulario_id):
+    aluno_id = principal.papel_id
+
+    # Verifica se o aluno já respondeu, travando os envios dele até o commit:
+    # um duplo envio não soma duas vezes nos contadores
+    if RespostaFormularioDAO.travar_envio(db, aluno_id, formulario_id):
+        db.rollback()
         return RedirectResponse(url="/aluno/formularios", status_code=303)
     
     # Busca o formulário e suas perguntas
@@ -368,9 +365,6 @@ async def enviar_respostas(
     
     perguntas = PerguntaFormularioDAO.get_by_formulario(db, formulario_id)
     
-    # Processa o formulário
-    form_data = await request.form()
-    
     try:
         for pergunta in perguntas:
             resposta = form_data.get(f"resposta_{pergunta.id}")
@@ -381,24 +375,29 @@ async def enviar_respostas(
                 if resposta_opcoes:
                     RespostaFormularioDAO.create_resposta(
                         db=db,
-                        aluno_id=aluno.idAluno,
+                        aluno_id=aluno_id,
                         formulario_id=formulario_id,
                         pergunta_id=pergunta.id,
-                        resposta_opcoes=json.dumps(resposta_opcoes)
+                        resposta_opcoes=json.dumps(resposta_opcoes),
+                        pergunta=pergunta
                     )
             else:
                 # Para outros tipos, o valor vem como string
                 if resposta:
                     RespostaFormularioDAO.create_resposta(
                         db=db,
-                        aluno_id=aluno.idAluno,
+                        aluno_id=aluno_id,
                         formulario_id=formulario_id,
                         pergunta_id=pergunta.id,
-                        resposta_texto=resposta
+                        resposta_texto=resposta,
+                        pergunta=pergunta
                     )
         
+        # Contadores do painel de resultados na mesma transação das respostas
+        ContagemFormularioService.registrar_envio(db, aluno_id, formulario_id)
+        
         # Marca a notificação como lida APÓS salvar todas as respostas
-        NotificacaoDAO.marcar_notificacao_como_lida(db, aluno.idAluno, link=f"/aluno/formularios/{formulario_id}")
+        NotificacaoDAO.marcar_notificacao_como_lida(db, aluno_id, link=f"/aluno/formularios/{formulario_id}")
         
         db.commit()
         return RedirectResponse(url="/aluno/formularios", status_code=303)
@@ -435,7 +434,7 @@ def registrar_formulario(
         )
     
 @router.post("/gestor/formularios/{formulario_id}/deletar", response_class=RedirectResponse)
-async def deletar_formulario(
+def deletar_formulario(
     request: Request,
     formulario_id: int,
     db: Session = Depends(get_db),
@@ -443,7 +442,8 @@ async def deletar_formulario(
 ):
     """Deleta um formulário e todas as suas perguntas e respostas associadas."""
     
-    # O método `delete` já busca o formulário e verifica se ele existe.
+    # O método `delete` já busca o formulário e verifica se ele existe; também
+    # apaga as opções marcadas e os contadores do painel na mesma transação.
     success = FormularioDAO.delete(db, formulario_id)
     
     if not success:
@@ -499,4 +499,90 @@ def dashboard_resultados_formulario(
             "analytics": analytics_data,
             "respostas_texto_por_pergunta": respostas_texto_por_pergunta
         }
-    )
\ No newline at end of file
+    )
+
+@router.get("/gestor/formularios/{formulario_id}/resultados/contagens")
+def contagens_resultados_formulario(
+    formulario_id: int,
+    db: Session = Depends(get_db),
+    gestor_id: int = Depends(verificar_gestor_sessao)
+):
+    """Contagens atuais do painel de resultados (lidas dos contadores, sem varrer as respostas)."""
+    contagens = FormularioAnalyticsService.get_contagens_ao_vivo(db, formulario_id)
+    if contagens is None:
+        raise HTTPException(status_code=404, detail="Formulário não encontrado.")
+    return contagens
+
+def _ler_contagens(bind, formulario_id: int):
+    # Sessão própria: a da requisição já foi fechada quando o stream começa
+    with Session(bind=bind) as db:
+        return FormularioAnalyticsService.get_contagens_ao_vivo(db, formulario_id)
+
+async def _eventos_contagens(request: Request, bind, formulario_id: int):
+    """Envia as contagens quando mudam; nos intervalos sem mudança, só um comentário de keep-alive."""
+    ultimo = None
+    fim = time.monotonic() + CONTAGENS_SSE_DURACAO
+    while time.monotonic() < fim and not await request.is_disconnected():
+        contagens = await run_in_threadpool(_ler_contagens, bind, formulario_id)
+        dados = json.dumps(contagens, ensure_ascii=False)
+        if dados != ultimo:
+            ultimo = dados
+            yield f"data: {dados}\n\n"
+        else:
+            yield ": sem mudanças\n\n"
+        await asyncio.sleep(CONTAGENS_SSE_INTERVALO)
+
+@router.get("/gestor/formularios/{formulario_id}/resultados/stream")
+def stream_resultados_formulario(
+    request: Request,
+    formulario_id: int,
+    db: Session = Depends(get_db),
+    gestor_id: int = Depends(verificar_gestor_sessao)
+):
+    """Server-sent events com as contagens do painel de resultados."""
+    if not FormularioDAO.get_by_id(db, formulario_id):
+        raise HTTPException(status_code=404, detail="Formulário não encontrado.")
+    return StreamingResponse(
+        _eventos_contagens(request, db.get_bind(), formulario_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/gestor/formularios/{formulario_id}/exportar")
+def exportar_respostas_formulario(
+    formulario_id: int,
+    formato: str = "csv",
+    db: Session = Depends(get_db),
+    gestor_id: int = Depends(verificar_gestor_sessao)
+):
+    """Exporta as respostas brutas do formulário em CSV (enviado em blocos) ou XLSX."""
+    formulario = FormularioDAO.get_by_id(db, formulario_id)
+    if not formulario:
+        raise HTTPException(status_code=404, detail="Formulário não encontrado.")
+    nome = f"respostas_formulario_{formulario_id}"
+
+    if formato == "csv":
+        linhas = FormularioExportService.linhas_em_sessao_propria(db.get_bind(), formulario_id)
+        return StreamingResponse(
+            export_service.csv_em_blocos(CABECALHO_EXPORTACAO, linhas),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f"attachment; filename={nome}.csv"}
+        )
+
+    if formato == "xlsx":
+        if not export_service.has_xlsxwriter:
+            return Response(content=b"XlsxWriter nao instalado.", media_type="text/plain", status_code=501)
+        descritor, caminho = tempfile.mkstemp(suffix=".xlsx")
+        os.close(descritor)
+        try:
+            export_service.gravar_xlsx(caminho, CABECALHO_EXPORTACAO, FormularioExportService.linhas(db, formulario_id))
+        except Exception:
+            os.unlink(caminho)
+            raise
+        return FileResponse(
+            caminho, media_type=export_service.XLSX_MEDIA_TYPE, filename=f"{nome}.xlsx",
+            background=BackgroundTask(os.unlink, caminho)
+        )
+
+    raise HTTPException(status_code=400, detail="Formato inválido. Use csv ou xlsx.")
@@ -5,13 +5,13 @@ from pathlib import Path
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Form, Request, UploadFile, File, Query, HTTPException
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, FileResponse
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, aliased
 from sqlalchemy import func, or_
 from fastapi.encoders import jsonable_encoder
 import re
-from passlib.hash import bcrypt
+from utils.senha_service import gerar_hash
 
 # Importações dos seus DAOs e Models
 from dao.database import get_db
@@ -28,13 +28,16 @@ from models.campus import Campus
 from models.turma import Turma
 from models.banco_questoes import BancoQuestoes
 from models.prova_questao import ProvaQuestao
+from models.relatorio_job import StatusRelatorioJob
 from models.prova_turma import ProvaTurma
 from models.resposta_formulario import RespostaFormulario
 from models.pergunta_formulario import PerguntaFormulario
 
 from controllers.usuario_controller import verificar_sessao
 
-from services.graficos_service import AnalyticsService
+from services.graficos_service import AnalyticsService, ALUNOS_POR_PAGINA
+from services.resumo_service import ResumoService
+from utils.materia_service import filtro_materia
 
 from dao.resposta_formulario_dao import RespostaFormularioDAO
 from dao.professor_dao import ProfessorDAO
@@ -42,28 +45,19 @@ from dao.campus_dao import CampusDAO
 from dao.turma_dao import TurmaDAO
 from dao.aluno_turma_dao import AlunoTurmaDAO
 from dao.prova_turma_dao import ProvaTurmaDAO
+from dao.relatorio_job_dao import RelatorioJobDAO
+from dao.submissao_prova_dao import SubmissaoProvaDAO
+from dao.notificacao_dao import NotificacaoDAO
 
 from utils.auth import verificar_gestor_sessao
+from utils.sessao import revogar_sessoes
 
 # Importar a instância templates do app_config
 from app_config import templates
 from services.relatorios_service import RelatorioService
-from utils.export_service import pdf_response_from_html, docx_response_from_data
-
-def verificar_gestor_sessao(request: Request, db: Session = Depends(get_db)):
-    """
-    Dependência para verificar se o usuário na sessão é um gestor.
-    Redireciona para a página de login se não for.
-    """
-    session_user_id = verificar_sessao(request)
-    usuario = db.query(Usuario).filter(Usuario.id == int(session_user_id)).first()
-    if not usuario or usuario.tipo != "gestor":
-        raise HTTPException(
-            status_code=303,
-            detail="Acesso não autorizado para gestores",
-            headers={"Location": "/login?erro=Acesso nao autorizado"},
-        )
-    return usuario.id
+from services.relatorio_jobs_service import RelatorioJobService
+from utils.export_service import pdf_response_from_html, docx_response_from_data, estatisticas_pdf
+from utils.cache import cache_relatorios
 
 # --- Configurações Iniciais ---
 UPLOAD_DIR = Path("templates/static/uploads")
@@ -72,12 +66,12 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 router = APIRouter()
 
 # --- Funções Auxiliares (mantidas, mas podem ser movidas para um utilitário se usadas em mais lugares) ---
-async def salvar_imagem(imagem: UploadFile, nome_arquivo: str):
+def salvar_imagem(imagem: UploadFile, nome_arquivo: str):
     """Salva uma imagem no diretório de uploads e retorna o caminho relativo."""
     upload_path = os.path.join(UPLOAD_DIR, "provas", nome_arquivo)
     os.makedirs(os.path.dirname(upload_path), exist_ok=True)
     with open(upload_path, "wb") as buffer:
-        buffer.write(await imagem.read())
+        buffer.write(imagem.file.read())
     return f"/static/uploads/provas/{nome_arquivo}"
 
 # --- Rotas de Gerenciamento de Provas ---
@@ -88,10 +82,6 @@ def cadastro_prova_page(
     gestor_id: int = Depends(verificar_gestor_sessao) # Protegido por gestor
 ):
     """Exibe a página de cadastro de provas e lista as provas existentes."""
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
     provas = db.query(Prova).all()
     provas_info = []
     
@@ -118,7 +108,7 @@ def cadastro_prova_page(
     )
 
 @router.post("/provas/cadastrar")
-async def cadastrar_prova(
+def cadastrar_prova(
     request: Request,
     materia: str = Form(...),
     db: Session = Depends(get_db),
@@ -147,8 +137,6 @@ async def cadastrar_prova(
     corretas_15: str = Form(...),
 ):
     """Rota para cadastrar uma prova e suas 15 questões."""
-    print("📌 Dados do formulário recebidos:", dict(await request.form())) # Debug, usar await aqui
-
     # Criar a prova
     nova_prova = Prova(materia=materia)
     db.add(nova_prova)
@@ -165,7 +153,7 @@ async def cadastrar_prova(
         image_path = None
         if imagens and i < len(imagens) and imagens[i] and imagens[i].filename: # Adicionado 'i < len(imagens)' para segurança
             filename = f"questao_{nova_prova.id}_{i}_{datetime.now().strftime('%Y%m%d%H%M%S')}{Path(imagens[i].filename).suffix}"
-            image_path = await salvar_imagem(imagens[i], filename) # Usa a função auxiliar
+            image_path = salvar_imagem(imagens[i], filename) # Usa a função auxiliar
 
         nova_questao = Questao(
             prova_id=nova_prova.id,
@@ -208,7 +196,7 @@ def editar_prova_page(
     )
 
 @router.post("/provas/editar/{prova_id}")
-async def editar_prova(
+def editar_prova(
     request: Request,
     prova_id: int,
     materia: str = Form(...),
@@ -243,7 +231,7 @@ async def editar_prova(
     if not prova:
         return RedirectResponse(url="/provas/cadastrar", status_code=303)
     
-    prova.materia = materia
+    ResumoService.atualizar_materia_prova(db, prova, materia)
     
     # Atualizar as questões
     questoes = db.query(Questao).filter(Questao.prova_id == prova_id).all()
@@ -273,7 +261,7 @@ async def editar_prova(
                         print(f"Erro ao remover imagem antiga da questão {questao.id}: {e}")
 
                 filename = f"questao_{prova_id}_{i}_{datetime.now().strftime('%Y%m%d%H%M%S')}{Path(imagens[i].filename).suffix}"
-                questao.imagem = await salvar_imagem(imagens[i], filename) # Usa a função auxiliar
+                questao.imagem = salvar_imagem(imagens[i], filename) # Usa a função auxiliar
     
     db.commit()
     return RedirectResponse(url="/provas/cadastrar", status_code=303)
@@ -302,7 +290,12 @@ def excluir_prova(
             db.query(Resposta).filter(Resposta.questao_id.in_(questoes_ids)).delete(synchronize_session=False)
             print(f"Respostas para questões da prova {prova_id} removidas.")
 
+        # Envios desta prova na fila (referenciam a prova e os resultados)
+        SubmissaoProvaDAO.delete_by_prova(db, prova_id)
+
         # 2. Deletar os Resultados associados à prova
+        # Descontar do resumo materializado antes de apagar
+        ResumoService.descontar(db, Resultado.prova_id == prova_id)
         # Delete diretamente da tabela Resultado
         db.query(Resultado).filter(Resultado.prova_id == prova_id).delete(synchronize_session=False)
         print(f"Resultados da prova {prova_id} removidos.")
@@ -339,129 +332,27 @@ def listar_alunos(
     municipio: Optional[str] = Query(None),
     zona: Optional[str] = Query(None),
     origem_escolar: Optional[str] = Query(None),
+    ordenar: str = Query("nome"),
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(ALUNOS_POR_PAGINA, ge=1),
 ):
-    """Lista alunos, com filtros opcionais, e exibe notas por matéria."""
-    # A lógica de consulta foi mantida aqui pois é específica da listagem de alunos,
-    # não diretamente parte dos dashboards analíticos que moveremos.
-
-    portugues = aliased(Prova)
-    matematica = aliased(Prova)
-    ciencias = aliased(Prova)
-
-    filtro_portugues = or_(
-        portugues.materia.ilike("português%"), 
-        portugues.materia.ilike("portugues%")
-    )
-    
-    filtro_matematica = or_(
-        matematica.materia.ilike("matemática%"), 
-        matematica.materia.ilike("matematica%")
-    )
-    
-    # Pega "Ciências", "Ciencias", "Ciências da Natureza", etc.
-    filtro_ciencias = or_(
-        ciencias.materia.ilike("ciência%"), 
-        ciencias.materia.ilike("ciencia%")
+    """Lista alunos, com filtros opcionais, e exibe notas por matéria (paginado no banco)."""
+    listagem = AnalyticsService.listar_alunos_com_notas(
+        db,
+        curso=curso,
+        ano=ano,
+        situacao=situacao,
+        nome=nome,
+        idade_min=idade_min,
+        idade_max=idade_max,
+        municipio=municipio,
+        zona=zona,
+        origem_escolar=origem_escolar,
+        ordenar=ordenar,
+        pagina=pagina,
+        por_pagina=por_pagina
     )
 
-    # Subquery para calcular a média das notas
-    media_subquery = (
-        func.coalesce(
-            db.query(Resultado.nota)
-            .join(portugues, Resultado.prova_id == portugues.id)
-            .filter(filtro_portugues, Resultado.aluno_id == Aluno.idAluno) # <-- Filtro novo
-            .order_by(Resultado.id.desc())
-            .limit(1)
-            .scalar_subquery(),
-            0,
-        ) +
-        func.coalesce(
-            db.query(Resultado.nota)
-            .join(matematica, Resultado.prova_id == matematica.id)
-            .filter(filtro_matematica, Resultado.aluno_id == Aluno.idAluno) # <-- Filtro novo
-            .order_by(Resultado.id.desc())
-            .limit(1)
-            .scalar_subquery(),
-            0,
-        ) +
-        func.coalesce(
-            db.query(Resultado.nota)
-            .join(ciencias, Resultado.prova_id == ciencias.id)
-            .filter(filtro_ciencias, Resultado.aluno_id == Aluno.idAluno) # <-- Filtro novo
-            .order_by(Resultado.id.desc())
-            .limit(1)
-            .scalar_subquery(),
-            0,
-        )
-    ) / 3.0
-
-    query = db.query(
-        Aluno,
-        # Nota de Português
-        func.coalesce(
-            db.query(Resultado.nota)
-            .join(portugues, Resultado.prova_id == portugues.id)
-            .filter(filtro_portugues, Resultado.aluno_id == Aluno.idAluno)
-            .order_by(Resultado.id.desc())
-            .limit(1)
-            .scalar_subquery(),
-            0,
-        ).label("nota_portugues"),
-        
-        # Nota de Matemática
-        func.coalesce(
-            db.query(Resultado.nota)
-            .join(matematica, Resultado.prova_id == matematica.id)
-            .filter(filtro_matematica, Resultado.aluno_id == Aluno.idAluno)
-            .order_by(Resultado.id.desc())
-            .limit(1)
-            .scalar_subquery(),
-            0,
-        ).label("nota_matematica"),
-        
-        # Nota de Ciências
-        func.coalesce(
-            db.query(Resultado.nota)
-            .join(ciencias, Resultado.prova_id == ciencias.id)
-            .filter(filtro_ciencias, Resultado.aluno_id == Aluno.idAluno)
-            .order_by(Resultado.id.desc())
-            .limit(1)
-            .scalar_subquery(),
-            0,
-        ).label("nota_ciencias"),
-        
-        media_subquery.label("media_geral")
-    ).select_from(Aluno)
-
-    # Aplicar filtros
-    if curso:
-        query = query.filter(Aluno.curso == curso)
-    if ano:
-        query = query.filter(Aluno.ano == ano)
-    if nome:
-        query = query.filter(Aluno.nome.ilike(f"%{nome}%"))
-    if idade_min is not None:
-        query = query.filter(Aluno.idade >= idade_min)
-    if idade_max is not None:
-        query = query.filter(Aluno.idade <= idade_max)
-    if municipio:
-        query = query.filter(Aluno.municipio.ilike(f"%{municipio}%"))
-    if zona:
-        query = query.filter(Aluno.zona == zona)
-    if origem_escolar:
-        query = query.filter(Aluno.origem_escolar == origem_escolar)
-
-    # Filtro por situação baseado na média calculada (nota de 0-10)
-    if situacao:
-        if situacao == "suficiente":
-            query = query.filter(media_subquery >= 8)
-        elif situacao == "regular":
-            query = query.filter(media_subquery > 5, media_subquery < 8)
-        elif situacao == "insuficiente":
-            query = query.filter(media_subquery <= 5)
-
-    alunos = query.all()
-
     # Preparar filtros aplicados para o template
     filtros_aplicados = {}
     if curso: filtros_aplicados['curso'] = curso
@@ -482,7 +373,9 @@ def listar_alunos(
         "gestor/gestor_alunos.html",
         {
             "request": request,
-            "alunos": alunos,
+            "alunos": listagem["alunos"],
+            "paginacao": listagem,
+            "ordenar": ordenar,
             "filtros_aplicados": filtros_aplicados,
             "municipios_disponiveis": municipios_lista
         },
@@ -535,19 +428,14 @@ def detalhes_aluno_gestor(
         return templates.TemplateResponse("404.html", {"request": request}, status_code=404)
 
     # Notas agregadas antigas (mantém retrocompatibilidade se ainda for útil no topo)
-    portugues = aliased(Prova)
-    matematica = aliased(Prova)
-    ciencias = aliased(Prova)
-
-    nota_portugues = db.query(Resultado.nota).join(portugues, Resultado.prova_id == portugues.id)\
-        .filter(portugues.materia == "Português", Resultado.aluno_id == aluno_id)\
-        .order_by(Resultado.id.desc()).limit(1).scalar()
-    nota_matematica = db.query(Resultado.nota).join(matematica, Resultado.prova_id == matematica.id)\
-        .filter(matematica.materia == "Matemática", Resultado.aluno_id == aluno_id)\
-        .order_by(Resultado.id.desc()).limit(1).scalar()
-    nota_ciencias = db.query(Resultado.nota).join(ciencias, Resultado.prova_id == ciencias.id)\
-        .filter(ciencias.materia == "Ciências", Resultado.aluno_id == aluno_id)\
-        .order_by(Resultado.id.desc()).limit(1).scalar()
+    def nota_recente(materia):
+        return db.query(Resultado.nota).join(Prova, Resultado.prova_id == Prova.id)\
+            .filter(filtro_materia(Prova.materia_id, materia), Resultado.aluno_id == aluno_id)\
+            .order_by(Resultado.id.desc()).limit(1).scalar()
+
+    nota_portugues = nota_recente("Português")
+    nota_matematica = nota_recente("Matemática")
+    nota_ciencias = nota_recente("Ciências")
 
     # Turmas do aluno (ativas)
     turmas_aluno = AlunoTurmaDAO.get_turmas_with_details_by_aluno(db, aluno_id)
@@ -630,7 +518,7 @@ def detalhes_aluno(
     return RedirectResponse(url=f"/gestor/aluno/{aluno_id}/detalhes", status_code=302)
 
 @router.post("/gestor/alunos/{aluno_id}/editar")
-async def editar_aluno(
+def editar_aluno(
     request: Request,
     aluno_id: int,
     nome: str = Form(...),
@@ -655,11 +543,9 @@ async def editar_aluno(
     # Atualizar dados básicos
     aluno.nome = nome
     aluno.idade = idade
-    aluno.municipio = municipio
     aluno.zona = zona
     aluno.origem_escolar = origem_escolar
-    aluno.curso = curso
-    aluno.ano = ano
+    ResumoService.atualizar_grupos_aluno(db, aluno, curso=curso, ano=ano, municipio=municipio)
     aluno.escola = escola
     aluno.forma_ingresso = forma_ingresso
     
@@ -707,7 +593,7 @@ async def editar_aluno(
             filepath = os.path.join(upload_dir_aluno, filename)
             
             # Salvar arquivo
-            content = await foto.read()
+            content = foto.file.read()
             with open(filepath, "wb") as buffer:
                 buffer.write(content)
             
@@ -718,7 +604,7 @@ async def editar_aluno(
     return RedirectResponse(url=f"/alunos/{aluno_id}", status_code=303)
 
 @router.post("/gestor/alunos/{aluno_id}/editar-observacoes")
-async def editar_observacoes_aluno(
+def editar_observacoes_aluno(
     aluno_id: int,
     observacoes: str = Form(None),
     db: Session = Depends(get_db),
@@ -744,19 +630,24 @@ def remover_aluno(
 
     try:
         # Deletar dados relacionados (ordem importa devido a FKs)
-        # Respostas de formulário
-        RespostaFormularioDAO.delete_respostas_from_formulario_by_aluno(db, aluno_id, formulario_id=None)
+        # Respostas de formulário (descontadas dos contadores do painel antes de apagar)
+        RespostaFormularioDAO.delete_respostas_by_aluno(db, aluno_id)
+
+        # Envios de prova na fila
+        SubmissaoProvaDAO.delete_by_aluno(db, aluno_id)
 
         # Respostas de prova
         db.query(Resposta).filter(Resposta.aluno_id == aluno_id).delete(synchronize_session=False)
 
-        # Resultados de prova
+        # Resultados de prova (descontados do resumo materializado antes de apagar)
+        ResumoService.descontar(db, Resultado.aluno_id == aluno_id)
         db.query(Resultado).filter(Resultado.aluno_id == aluno_id).delete(synchronize_session=False)
 
         # Notificações do aluno
         db.query(Notificacao).filter(Notificacao.aluno_id == aluno_id).delete(synchronize_session=False)
 
-        # Deletar o usuário correspondente ao aluno
+        # Deletar o usuário correspondente ao aluno (sessões abertas dele deixam de valer)
+        revogar_sessoes(db, aluno.idUser)
         db.query(Usuario).filter(Usuario.id == aluno_id).delete(synchronize_session=False)
 
         # Deletar a imagem do aluno se existir
@@ -791,7 +682,7 @@ def cadastrar_gestor_page(request: Request):
     return templates.TemplateResponse("gestor/cadastrar_gestor.html", {"request": request})
 
 @router.post("/gestor/cadastrar")
-async def cadastrar_gestor(
+def cadastrar_gestor(
     request: Request,
     nome: str = Form(...),
     email: str = Form(...),
@@ -808,7 +699,7 @@ async def cadastrar_gestor(
         return templates.TemplateResponse("gestor/cadastrar_gestor.html", {"request": request, "erro": "E-mail já cadastrado."})
         
     # Cria o usuário
-    senha_hash = bcrypt.hash(senha)
+    senha_hash = gerar_hash(senha)
     novo_usuario = Usuario(email=email, senha_hash=senha_hash, tipo='gestor')
     db.add(novo_usuario)
     db.commit()
@@ -823,7 +714,7 @@ async def cadastrar_gestor(
         file_location = os.path.join(gestor_upload_dir, filename)
         
         with open(file_location, "wb") as buffer:
-            buffer.write(await foto.read())
+            buffer.write(foto.file.read())
         imagem_path = f"/static/uploads/gestores/{filename}" # Caminho relativo com barra inicial
 
     # Cria o gestor
@@ -835,7 +726,7 @@ async def cadastrar_gestor(
 
 # --- Rota do Dashboard do Gestor (Refatorada) ---
 @router.get("/gestor/dashboard", response_class=HTMLResponse)
-async def dashboard_gestor(
+def dashboard_gestor(
     request: Request,
     db: Session = Depends(get_db),
     gestor_id: int = Depends(verificar_gestor_sessao) # Protegido por gestor
@@ -905,7 +796,7 @@ def cadastrar_professor_page(
     )
 
 @router.post("/gestor/professores/cadastrar")
-async def cadastrar_professor_gestor(
+def cadastrar_professor_gestor(
     request: Request,
     nome: str = Form(...),
     email: str = Form(...),
@@ -935,7 +826,7 @@ async def cadastrar_professor_gestor(
         file_location = os.path.join(professor_upload_dir, filename)
         
         with open(file_location, "wb") as buffer:
-            buffer.write(await foto.read())
+            buffer.write(foto.file.read())
         imagem_path = f"/static/uploads/professores/{filename}"
     
     # Criar professor
@@ -988,9 +879,6 @@ def listar_provas_professores(
     """Lista todas as provas criadas pelos professores"""
     from sqlalchemy.orm import joinedload
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
     provas = db.query(Prova).options(
         joinedload(Prova.professor),
         joinedload(Prova.prova_questoes)
@@ -1133,10 +1021,6 @@ def provas_turma_gestor(
     from sqlalchemy.orm import joinedload
     from models.prova_turma import ProvaTurma
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
     # Buscar turma com dados relacionados
     turma = db.query(Turma).options(
         joinedload(Turma.professor),
@@ -1173,7 +1057,7 @@ def remover_aluno_turma(
         raise HTTPException(status_code=404, detail="Aluno não encontrado na turma")
     
     # Marcar como removido em vez de deletar
-    aluno_turma.status = StatusAlunoTurma.REMOVIDO
+    ResumoService.atualizar_status_aluno_turma(db, aluno_turma, StatusAlunoTurma.REMOVIDO)
     db.commit()
     
     return RedirectResponse(url=f"/gestor/turma/{turma_id}/detalhes", status_code=303)
@@ -1199,8 +1083,9 @@ def adicionar_aluno_turma(
         raise HTTPException(status_code=404, detail="Aluno não encontrado na turma")
     
     # Marcar como ativo novamente
-    aluno_turma.status = StatusAlunoTurma.ATIVO
+    ResumoService.atualizar_status_aluno_turma(db, aluno_turma, StatusAlunoTurma.ATIVO)
     db.commit()
+    NotificacaoDAO.sincronizar_pendentes_aluno(db, aluno_id)
     
     return RedirectResponse(url=f"/gestor/turma/{turma_id}/alunos", status_code=303)
 
@@ -1214,9 +1099,6 @@ def detalhes_prova_gestor(
     """Detalhes de uma prova específica com turmas e resultados"""
     from sqlalchemy.orm import joinedload
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
     prova = db.query(Prova).options(
         joinedload(Prova.professor),
         joinedload(Prova.prova_questoes).joinedload(ProvaQuestao.questao_banco),
@@ -1247,9 +1129,6 @@ def turmas_prova_gestor(
     """Lista turmas de uma prova específica"""
     from sqlalchemy.orm import joinedload
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
     prova = db.query(Prova).options(
         joinedload(Prova.professor),
         joinedload(Prova.prova_turmas).joinedload(ProvaTurma.turma)
@@ -1273,9 +1152,6 @@ def resultados_prova_gestor(
     """Resultados de uma prova específica"""
     from sqlalchemy.orm import joinedload
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
     prova = db.query(Prova).options(
         joinedload(Prova.professor),
         joinedload(Prova.resultados).joinedload(Resultado.aluno)
@@ -1290,7 +1166,7 @@ def resultados_prova_gestor(
     )
 
 @router.get("/relatorios")
-async def relatorios_gestor(
+def relatorios_gestor(
     request: Request,
     db: Session = Depends(get_db),
     gestor_id: int = Depends(verificar_gestor_sessao)
@@ -1303,7 +1179,7 @@ async def relatorios_gestor(
     )
 
 @router.get("/gestor/relatorios/export/pdf")
-async def export_relatorios_gestor_pdf(
+def export_relatorios_gestor_pdf(
     request: Request,
     db: Session = Depends(get_db),
     gestor_id: int = Depends(verificar_gestor_sessao)
@@ -1314,18 +1190,66 @@ async def export_relatorios_gestor_pdf(
     return pdf_response_from_html(html, filename="relatorio_gestor.pdf")
 
 @router.get("/gestor/relatorios/export/docx")
-async def export_relatorios_gestor_docx(
+def export_relatorios_gestor_docx(
     db: Session = Depends(get_db),
     gestor_id: int = Depends(verificar_gestor_sessao)
 ):
     dados = RelatorioService.get_gestor_report_data(db)
-    sections = {
-        "Médias por Matéria": dados["materias"],
-        "Médias por Curso": dados["cursos"],
-        "Participação": dados["participacao"],
-    }
+    sections = RelatorioService.secoes_relatorio_gestor(dados)
     return docx_response_from_data("Relatório do Gestor", sections, filename="relatorio_gestor.docx")
 
+# --- Relatórios em segundo plano: pede, consulta a situação e baixa quando pronto ---
+
+@router.post("/gestor/relatorios/jobs", status_code=202)
+def solicitar_relatorio_job(
+    tipo: str = Form(...),
+    db: Session = Depends(get_db),
+    gestor_id: int = Depends(verificar_gestor_sessao)
+):
+    """Enfileira a geração de um relatório e retorna o id do pedido."""
+    try:
+        job = RelatorioJobService.solicitar(db, tipo, {"gestor_id": gestor_id}, gestor_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return RelatorioJobService.como_dict(job)
+
+@router.get("/gestor/relatorios/jobs/{job_id}")
+def status_relatorio_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    gestor_id: int = Depends(verificar_gestor_sessao)
+):
+    """Situação de um pedido de relatório (consultada periodicamente pela página)."""
+    job = RelatorioJobDAO.get_do_solicitante(db, job_id, gestor_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    return RelatorioJobService.como_dict(job)
+
+@router.get("/gestor/relatorios/jobs/{job_id}/download")
+def download_relatorio_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    gestor_id: int = Depends(verificar_gestor_sessao)
+):
+    """Arquivo de um pedido concluído; 404 se não existe, ainda não ficou pronto ou já venceu."""
+    job = RelatorioJobDAO.get_do_solicitante(db, job_id, gestor_id)
+    if not job or job.status != StatusRelatorioJob.CONCLUIDO:
+        raise HTTPException(status_code=404, detail="Relatório não disponível")
+    caminho = RelatorioJobService.caminho_do_arquivo(job)
+    if not caminho.is_file():
+        raise HTTPException(status_code=404, detail="Relatório não disponível")
+    return FileResponse(caminho, media_type=job.media_type, filename=job.nome_arquivo)
+
+@router.get("/gestor/metricas/cache")
+def metricas_cache_gestor(gestor_id: int = Depends(verificar_gestor_sessao)):
+    """Contadores de acertos/falhas do cache de relatórios e dashboards."""
+    return cache_relatorios.estatisticas()
+
+@router.get("/gestor/metricas/pdf")
+def metricas_pdf_gestor(gestor_id: int = Depends(verificar_gestor_sessao)):
+    """Exportações em PDF: renderizações, acertos do cache, recusas e tempos por arquivo."""
+    return estatisticas_pdf()
+
 # ===== ROTAS DE GERENCIAMENTO DE USUÁRIOS =====
 
 @router.get("/gestor/gerenciar-usuarios")
@@ -1377,7 +1301,7 @@ def gerenciar_usuarios(
     )
 
 @router.post("/gestor/cadastrar-aluno")
-async def cadastrar_aluno(
+def cadastrar_aluno(
     request: Request,
     nome: str = Form(...),
     email: str = Form(...),
@@ -1431,7 +1355,7 @@ async def cadastrar_aluno(
             filename = f"{usuario.id}_{imagem.filename}"
             file_path = os.path.join(upload_dir, filename)
             with open(file_path, "wb") as buffer:
-                content = await imagem.read()
+                content = imagem.file.read()
                 buffer.write(content)
             imagem_path = "/static/uploads/alunos/" + filename
         
@@ -1449,6 +1373,8 @@ async def cadastrar_aluno(
         )
         db.add(aluno)
         db.commit()
+        # Formulários já abertos para o novo aluno (o resto da reconciliação é do agendador)
+        NotificacaoDAO.sincronizar_pendentes_aluno(db, aluno.idAluno)
         
         return RedirectResponse(url="/gestor/gerenciar-usuarios", status_code=303)
         
@@ -1457,7 +1383,7 @@ async def cadastrar_aluno(
         raise HTTPException(status_code=500, detail=f"Erro ao cadastrar aluno: {str(e)}")
 
 @router.post("/gestor/cadastrar-professor")
-async def cadastrar_professor(
+def cadastrar_professor(
     request: Request,
     nome: str = Form(...),
     email: str = Form(...),
@@ -1510,7 +1436,7 @@ async def cadastrar_professor(
             filename = f"{usuario.id}_{imagem.filename}"
             file_path = os.path.join(upload_dir, filename)
             with open(file_path, "wb") as buffer:
-                content = await imagem.read()
+                content = imagem.file.read()
                 buffer.write(content)
             imagem_path = "/static/uploads/professores/" + filename
         
@@ -1531,7 +1457,7 @@ async def cadastrar_professor(
         raise HTTPException(status_code=500, detail=f"Erro ao cadastrar professor: {str(e)}")
 
 @router.post("/gestor/cadastrar-gestor")
-async def cadastrar_gestor(
+def cadastrar_gestor(
     request: Request,
     nome: str = Form(...),
     email: str = Form(...),
@@ -1583,7 +1509,7 @@ async def cadastrar_gestor(
             filename = f"{usuario.id}_{imagem.filename}"
             file_path = os.path.join(upload_dir, filename)
             with open(file_path, "wb") as buffer:
-                content = await imagem.read()
+                content = imagem.file.read()
                 buffer.write(content)
             imagem_path = "/static/uploads/gestores/" + filename
         
@@ -1603,7 +1529,7 @@ async def cadastrar_gestor(
         raise HTTPException(status_code=500, detail=f"Erro ao cadastrar gestor: {str(e)}")
 
 @router.post("/gestor/editar-aluno/{aluno_id}")
-async def editar_aluno(
+def editar_aluno(
     aluno_id: int,
     request: Request,
     nome: str = Form(...),
@@ -1656,8 +1582,7 @@ async def editar_aluno(
         
         # Atualizar dados do aluno
         aluno.nome = nome
-        aluno.curso = curso
-        aluno.ano = ano
+        ResumoService.atualizar_grupos_aluno(db, aluno, curso=curso, ano=ano)
         
         # Processar nova imagem se fornecida
         if imagem and imagem.filename:
@@ -1667,7 +1592,7 @@ async def editar_aluno(
             file_path = os.path.join(upload_dir, filename)
             
             with open(file_path, "wb") as buffer:
-                content = await imagem.read()
+                content = imagem.file.read()
                 buffer.write(content)
             aluno.imagem = "/static/uploads/alunos/" + filename
         
@@ -1740,7 +1665,7 @@ def excluir_campus(
         raise HTTPException(status_code=500, detail=f"Erro ao excluir campus: {str(e)}")
 
 @router.post("/gestor/editar-professor/{professor_id}")
-async def editar_professor(
+def editar_professor(
     professor_id: int,
     request: Request,
     nome: str = Form(...),
@@ -1802,7 +1727,7 @@ async def editar_professor(
             file_path = os.path.join(upload_dir, filename)
             
             with open(file_path, "wb") as buffer:
-                content = await imagem.read()
+                content = imagem.file.read()
                 buffer.write(content)
             professor.imagem = "/static/uploads/professores/" + filename
         
@@ -1814,7 +1739,7 @@ async def editar_professor(
         raise HTTPException(status_code=500, detail=f"Erro ao editar professor: {str(e)}")
 
 @router.post("/gestor/editar-gestor/{gestor_id}")
-async def editar_gestor(
+def editar_gestor(
     gestor_id: int,
     request: Request,
     nome: str = Form(...),
@@ -1874,7 +1799,7 @@ async def editar_gestor(
             file_path = os.path.join(upload_dir, filename)
             
             with open(file_path, "wb") as buffer:
-                content = await imagem.read()
+                content = imagem.file.read()
                 buffer.write(content)
             gestor.imagem = "/static/uploads/gestores/" + filename
         
@@ -1909,13 +1834,17 @@ def excluir_aluno(
             AlunoTurmaDAO.hard_remove_aluno_from_turma(db, aluno_id, aluno_turma.turma_id)
         
         # Deletar dados relacionados (ordem importa devido a FKs)
-        # Respostas de formulário
-        RespostaFormularioDAO.delete_respostas_from_formulario_by_aluno(db, aluno_id, formulario_id=None)
+        # Respostas de formulário (descontadas dos contadores do painel antes de apagar)
+        RespostaFormularioDAO.delete_respostas_by_aluno(db, aluno_id)
+
+        # Envios de prova na fila
+        SubmissaoProvaDAO.delete_by_aluno(db, aluno_id)
 
         # Respostas de prova
         db.query(Resposta).filter(Resposta.aluno_id == aluno_id).delete(synchronize_session=False)
 
-        # Resultados de prova
+        # Resultados de prova (descontados do resumo materializado antes de apagar)
+        ResumoService.descontar(db, Resultado.aluno_id == aluno_id)
         db.query(Resultado).filter(Resultado.aluno_id == aluno_id).delete(synchronize_session=False)
 
         # Notificações do aluno
@@ -1935,6 +1864,7 @@ def excluir_aluno(
         # Deletar o usuário (cascade vai excluir o aluno)
         usuario = db.query(Usuario).filter(Usuario.id == aluno.idUser).first()
         if usuario:
+            revogar_sessoes(db, usuario.id)
             db.delete(usuario)
         
         db.commit()
@@ -1969,6 +1899,7 @@ def excluir_professor(
         # Excluir o usuário (cascade vai excluir o professor)
         usuario = db.query(Usuario).filter(Usuario.id == professor.id).first()
         if usuario:
+            revogar_sessoes(db, usuario.id)
             db.delete(usuario)
         
         db.commit()
@@ -2001,6 +1932,7 @@ def excluir_gestor(
         # Excluir o usuário (cascade vai excluir o gestor)
         usuario = db.query(Usuario).filter(Usuario.id == gestor.id).first()
         if usuario:
+            revogar_sessoes(db, usuario.id)
             db.delete(usuario)
         
         db.commit()
@@ -2013,38 +1945,13 @@ def excluir_gestor(
 # === ROTA PARA GERAR RELATÓRIO DO DASHBOARD ===
 
 @router.get("/gestor/dashboard/relatorio")
-async def gerar_relatorio_dashboard(
-    request: Request,
+def gerar_relatorio_dashboard(
     db: Session = Depends(get_db),
     gestor_id: int = Depends(verificar_gestor_sessao)
 ):
     """
-    Gera e baixa um relatório DOCX completo com todas as informações do dashboard.
+    Pede o relatório DOCX completo do dashboard aos workers de relatórios e leva à
+    página de relatórios, que acompanha o pedido e baixa o arquivo quando ficar pronto.
     """
-    try:
-        # Gerar o relatório usando o serviço
-        relatorio_buffer = RelatorioService.gerar_relatorio_geral_dashboard(db, gestor_id)
-        
-        # Criar nome do arquivo com timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"relatorio_geral_dashboard_{timestamp}.docx"
-        
-        # Retornar o arquivo para download
-        from fastapi.responses import Response
-        headers = {
-            "Content-Disposition": f"attachment; filename={filename}",
-            "Content-Type": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        }
-        
-        return Response(
-            content=relatorio_buffer.read(),
-            headers=headers,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        
-    except Exception as e:
-        print(f"Erro ao gerar relatório: {e}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Erro ao gerar relatório: {str(e)}"
-        )
\ No newline at end of file
+    job = RelatorioJobService.solicitar(db, "dashboard_gestor", {"gestor_id": gestor_id}, gestor_id)
+    return RedirectResponse(url=f"/relatorios?relatorio={job.id}", status_code=303)
\ No newline at end of file
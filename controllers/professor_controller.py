@@ -18,6 +18,7 @@ from models.resposta import Resposta
 from models.usuario import Usuario
 
 from controllers.usuario_controller import verificar_sessao
+from utils.auth import verificar_professor_sessao
 from dao.professor_dao import ProfessorDAO
 from dao.campus_dao import CampusDAO
 from dao.turma_dao import TurmaDAO
@@ -25,9 +26,12 @@ from dao.aluno_turma_dao import AlunoTurmaDAO
 from dao.banco_questoes_dao import BancoQuestoesDAO
 from dao.prova_questao_dao import ProvaQuestaoDAO
 from dao.notificacao_professor_dao import NotificacaoProfessorDAO
+from dao.submissao_prova_dao import SubmissaoProvaDAO
 
 from app_config import templates
 from services.relatorios_service import RelatorioService
+from services.correcao_service import CorrecaoService
+from services.resumo_service import ResumoService
 from utils.export_service import pdf_response_from_html, docx_response_from_data
 
 # Configurações
@@ -36,20 +40,6 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 router = APIRouter()
 
-def verificar_professor_sessao(request: Request, db: Session = Depends(get_db)):
-    """
-    Dependência para verificar se o usuário na sessão é um professor.
-    """
-    session_user_id = verificar_sessao(request)
-    usuario = db.query(Usuario).filter(Usuario.id == int(session_user_id)).first()
-    if not usuario or usuario.tipo != "professor":
-        raise HTTPException(
-            status_code=303,
-            detail="Acesso não autorizado para professores",
-            headers={"Location": "/login?erro=Acesso nao autorizado"},
-        )
-    return usuario.id
-
 # === ROTAS DE CADASTRO DE PROFESSOR ===
 
 @router.get("/professor/cadastrar")
@@ -62,7 +52,7 @@ def cadastro_professor_page(request: Request, db: Session = Depends(get_db)):
     )
 
 @router.post("/professor/cadastrar")
-async def cadastrar_professor(
+def cadastrar_professor(
     request: Request,
     nome: str = Form(...),
     email: str = Form(...),
@@ -120,7 +110,7 @@ async def cadastrar_professor(
         filename = f"professor_{datetime.now().strftime('%Y%m%d%H%M%S')}{Path(foto.filename).suffix}"
         file_location = os.path.join(professor_upload_dir, filename)
         with open(file_location, "wb") as buffer:
-            buffer.write(await foto.read())
+            buffer.write(foto.file.read())
         imagem_path = f"/static/uploads/professores/{filename}"
     
     # Criar professor
@@ -393,7 +383,7 @@ def criar_questao_page(
     )
 
 @router.post("/professor/banco-questoes/criar")
-async def criar_questao(
+def criar_questao(
     request: Request,
     enunciado: str = Form(...),
     opcao_a: str = Form(...),
@@ -418,7 +408,7 @@ async def criar_questao(
         file_location = os.path.join(questoes_upload_dir, filename)
         
         with open(file_location, "wb") as buffer:
-            buffer.write(await imagem.read())
+            buffer.write(imagem.file.read())
         imagem_path = f"/static/uploads/questoes/{filename}"
     
     # Converter checkbox para boolean
@@ -452,10 +442,6 @@ def provas_professor(
     """Lista provas do professor com informações de alunos que responderam"""
     from sqlalchemy.orm import joinedload
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
     # Buscar provas com contagem de resultados
     provas = db.query(Prova).options(
         joinedload(Prova.resultados).joinedload(Resultado.aluno)
@@ -618,9 +604,6 @@ def visualizar_prova_professor(
     """Visualiza uma prova específica do professor com alunos que responderam"""
     from sqlalchemy.orm import joinedload
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
     prova = db.query(Prova).options(
         joinedload(Prova.prova_questoes).joinedload(ProvaQuestao.questao_banco),
         joinedload(Prova.prova_turmas).joinedload(ProvaTurma.turma),
@@ -691,7 +674,7 @@ def salvar_edicao_prova(
     
     # Atualizar dados da prova
     prova.titulo = titulo
-    prova.materia = materia
+    ResumoService.atualizar_materia_prova(db, prova, materia)
     
     # Remover questões antigas
     db.query(ProvaQuestao).filter(ProvaQuestao.prova_id == prova_id).delete()
@@ -706,6 +689,7 @@ def salvar_edicao_prova(
         db.add(prova_questao)
     
     db.commit()
+    CorrecaoService.invalidar_gabaritos(prova_id)
     return RedirectResponse(url="/professor/provas", status_code=303)
 
 @router.post("/professor/prova-turma/{prova_turma_id}/editar-data")
@@ -733,6 +717,9 @@ def editar_data_expiracao_prova_turma(
     try:
         nova_data = datetime.strptime(data_expiracao, "%Y-%m-%dT%H:%M")
         prova_turma.data_expiracao = nova_data
+        # Prazo prorrogado: a disponibilização volta a ficar ativa
+        if prova_turma.status == StatusProvaTurma.EXPIRADA and nova_data > datetime.now():
+            prova_turma.status = StatusProvaTurma.ATIVA
         db.commit()
         
         return {"success": True, "message": "Data de expiração atualizada com sucesso"}
@@ -752,9 +739,6 @@ def disponibilizar_prova_professor(
     """Página para disponibilizar uma prova para turmas"""
     from sqlalchemy.orm import joinedload
     
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
     prova = db.query(Prova).options(
         joinedload(Prova.prova_questoes)
     ).filter(Prova.id == prova_id, Prova.professor_id == professor_id).first()
@@ -800,12 +784,14 @@ def salvar_disponibilizacao_prova(
             data_expiracao=data_expiracao_dt,
             status=StatusProvaTurma.ATIVA
         )
-        db.add(prova_turma)
+        ResumoService.alterar_prova_turma(db, prova_id, turma_id, lambda pt=prova_turma: db.add(pt))
     
     # Atualizar status da prova
     prova.status = "ativa"
     
     db.commit()
+    # Gabarito pronto em cache antes de os alunos começarem a enviar
+    CorrecaoService.compilar_gabarito(db, prova_id)
     return RedirectResponse(url="/professor/provas", status_code=303)
 
 @router.post("/professor/prova/{prova_id}/excluir")
@@ -823,8 +809,13 @@ def excluir_prova_professor(
     # Verificar se a prova pode ser excluída (não pode ter respostas)
     # Implementar verificação se necessário
     
+    # Os resultados são removidos em cascata: descontar do resumo materializado antes
+    from models.resultado import Resultado
+    ResumoService.descontar(db, Resultado.prova_id == prova_id)
+    SubmissaoProvaDAO.delete_by_prova(db, prova_id)
     db.delete(prova)
     db.commit()
+    CorrecaoService.invalidar_gabaritos(prova_id)
     return RedirectResponse(url="/professor/provas", status_code=303)
 
 # === ROTAS DE GERENCIAMENTO DE QUESTÕES ===
@@ -948,6 +939,7 @@ def salvar_edicao_questao(
         questao.imagem = f"/static/uploads/questoes/{filename}"
     
     db.commit()
+    CorrecaoService.invalidar_gabaritos_da_questao(db, questao_id)
     return RedirectResponse(url="/professor/banco-questoes", status_code=303)
 
 @router.post("/professor/questao/{questao_id}/excluir")
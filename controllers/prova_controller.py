@@ -1,16 +1,21 @@
+import uuid
 from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from fastapi.responses import RedirectResponse, HTMLResponse
 from sqlalchemy.orm import Session
+from starlette.datastructures import FormData
 from dao.database import get_db
 from models.prova import Prova
 from models.questao import Questao
 from models.resultado import Resultado
 from models.resposta import Resposta
 from models.aluno import Aluno
-from dao.resposta_dao import RespostaDAO
 from dao.questao_dao import QuestaoDAO
-from dao.resultados_dao import ResultadoDAO
+from services.correcao_service import CorrecaoService
+from utils.materia_service import filtro_materia
 from controllers.usuario_controller import verificar_sessao
+from utils.requisicao import ler_formulario
+from utils.auth import verificar_aluno_sessao
+from utils.sessao import Principal
 
 # Importar a instância templates do app_config
 from app_config import templates
@@ -41,10 +46,6 @@ def listar_provas(request: Request, user_id: int = Depends(verificar_sessao), db
 # Página para o aluno responder a prova
 @router.get("/prova/{prova_id}")
 def responder_prova(request: Request, prova_id: int, db: Session = Depends(get_db)):
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
     prova = db.query(Prova).filter(Prova.id == prova_id).first()
     if not prova:
         raise HTTPException(status_code=404, detail="Prova não encontrada")
@@ -58,71 +59,39 @@ def responder_prova(request: Request, prova_id: int, db: Session = Depends(get_d
         {
             "request": request,
             "prova": prova,
-            "questoes": questoes
+            "questoes": questoes,
+            "token_submissao": str(uuid.uuid4())
         }
     )
 
 @router.post("/prova/{prova_id}/responder")
-async def enviar_respostas(
+def enviar_respostas(
     prova_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    user_id: int = Depends(verificar_sessao),
+    principal: Principal = Depends(verificar_aluno_sessao),
+    form_data: FormData = Depends(ler_formulario)
 ):
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
-    # Verifica se o aluno existe
-    aluno = db.query(Aluno).filter_by(idUser=user_id).first()
-    if not aluno:
-        raise HTTPException(status_code=404, detail="Aluno não encontrado")
-
-    # Verifica se o aluno já respondeu essa prova
-    resultado_existente = ResultadoDAO.buscar_por_aluno_e_prova(db, aluno_id=aluno.idAluno, prova_id=prova_id)
-    if resultado_existente:
-        return RedirectResponse(url="/perfil?erro=Ja_respondida", status_code=303)
-
-    form_data = await request.form()
+    # O idAluno vem do token da sessão (utils/sessao.py)
     respostas = {
-        int(key.split("_")[1]): value
+        int(key.split("_")[1]): value.strip().lower()
         for key, value in form_data.items()
         if key.startswith("resposta_")
     }
 
-    acertos = 0
-
-    for questao_id, resposta_aluno in respostas.items():
-        questao = db.query(Questao).filter_by(id=questao_id).first()
-        if not questao:
-            continue
-
-        # Salva a resposta do aluno
-        RespostaDAO.create(
-            db,
-            aluno_id=aluno.idAluno,
-            questao_id=questao_id,
-            resposta=resposta_aluno.strip().lower()
-        )
-
-        if resposta_aluno.strip().lower() == questao.resposta_correta.strip().lower():
-            acertos += 1
-
-    # Calcula nota e total de questões
-    total_questoes = len(respostas)
-    from utils.nota_service import calcular_nota_e_situacao
-    nota, situacao = calcular_nota_e_situacao(acertos, total_questoes)
-
-    # Salva o resultado
-    ResultadoDAO.criar_resultado(
-        db=db,
-        aluno_id=aluno.idAluno,
+    # Gabarito carregado de uma vez; respostas e resultado gravados em uma transação
+    gabarito = CorrecaoService.gabarito_legado(db, prova_id)
+    resultado = CorrecaoService.registrar_envio(
+        db,
+        aluno_id=principal.papel_id,
         prova_id=prova_id,
-        acertos=acertos,
-        situacao=situacao,
-        nota=nota,
-        total_questoes=total_questoes
+        gabarito=gabarito,
+        respostas=respostas,
+        total_questoes=len(respostas),
+        token=form_data.get("token_submissao") or None
     )
+    if resultado is None:
+        return RedirectResponse(url="/perfil?erro=Ja_respondida", status_code=303)
 
     return RedirectResponse(url="/perfil", status_code=303)
 
@@ -158,10 +127,6 @@ def resultado_detalhado_prova(
     user_id: int = Depends(verificar_sessao),
     db: Session = Depends(get_db)
 ):
-    # Verificar e atualizar provas expiradas antes de qualquer visualização
-    from dao.prova_turma_dao import ProvaTurmaDAO
-    ProvaTurmaDAO.check_and_update_expired(db)
-    
     # Verifica se o aluno existe
     aluno = db.query(Aluno).filter_by(idUser=user_id).first()
     if not aluno:
@@ -191,7 +156,7 @@ def resultado_detalhado_prova(
     resumos_materias = []
 
     for materia_nome in materias_fixas:
-        prova_materia = db.query(Prova).filter(Prova.materia == materia_nome).first()
+        prova_materia = db.query(Prova).filter(filtro_materia(Prova.materia_id, materia_nome)).first()
         prova_disponivel = prova_materia is not None
         nota = None
         status = "Ainda não há provas disponíveis"
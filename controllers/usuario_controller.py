@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, Form, Request, Response, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
-from passlib.hash import bcrypt
 from dao.database import get_db
 from models.aluno import Aluno
 from models.usuario import Usuario
+from utils.senha_service import verificar_senha_no_pool, gerar_hash_no_pool, precisa_rehash
+from utils.sessao import (
+    Principal, COOKIE_SESSAO, SESSAO_MAX_IDADE, criar_token, ler_token, esquecer_token, lembrar_versao,
+    revogar_sessoes, obter_principal
+)
 
 # Importar a instância templates do app_config
 from app_config import templates
@@ -23,7 +27,7 @@ def index_page(request: Request):
     return templates.TemplateResponse("gestor/dashboard_gestor.html", {"request": request})
 
 @router.post("/login")
-async def login(
+def login(
     request: Request,
     email: str = Form(...),
     senha: str = Form(...),
@@ -31,19 +35,28 @@ async def login(
 ):
     usuario = db.query(Usuario).filter(Usuario.email == email).first()
     
-    if not usuario or not bcrypt.verify(senha, usuario.senha_hash):
+    # bcrypt roda no pool limitado de utils/senha_service (a rota já está no pool de threads do FastAPI)
+    if not usuario or not verificar_senha_no_pool(senha, usuario.senha_hash):
         return templates.TemplateResponse(
             "aluno/login.html",
             {"request": request, "erro": "Email ou senha inválidos"}
         )
     
+    # Hash gerado com outro custo (BCRYPT_ROUNDS mudou): refaz com a senha recém-conferida
+    if precisa_rehash(usuario.senha_hash):
+        usuario.senha_hash = gerar_hash_no_pool(senha)
+        db.commit()
+    
     # Se o usuário for do tipo "aluno", verificar se está cadastrado em "alunos"
+    # Professor e gestor usam o próprio id do usuário como id do papel
+    papel_id = usuario.id
     if usuario.tipo == "aluno":
         aluno = db.query(Aluno).filter(Aluno.idUser == usuario.id).first()
         if not aluno:
             return RedirectResponse(
                 url=f"/cadastro/aluno/{usuario.id}", status_code=303
             )
+        papel_id = aluno.idAluno
     
     # Definir URL de redirecionamento baseado no tipo de usuário
     if usuario.tipo == "gestor":
@@ -53,40 +66,44 @@ async def login(
     else:  # aluno
         redirect_url = "/perfil"
     
-    # Criar sessão
+    # Criar sessão: token assinado com id, tipo, id do papel e versão de sessão (utils/sessao.py)
+    lembrar_versao(usuario.id, usuario.versao_sessao, usuario.tipo)
     response = RedirectResponse(url=redirect_url, status_code=303)
     response.set_cookie(
-        key="session_user", value=str(usuario.id), httponly=True
+        key=COOKIE_SESSAO,
+        value=criar_token(Principal(usuario.id, usuario.tipo, papel_id, usuario.versao_sessao)),
+        httponly=True,
+        samesite="lax",
+        max_age=SESSAO_MAX_IDADE
     )
     
     return response
 
 
 @router.post("/sair")
-def logout(request: Request):
-    session_user = request.cookies.get("session_user")
+def logout(request: Request, db: Session = Depends(get_db)):
+    session_user = request.cookies.get(COOKIE_SESSAO)
     
     if session_user:
-        print(f"🔍 Cookie encontrado: {session_user}")
+        print("🔍 Cookie de sessão encontrado.")
+        # Revoga o token (e cópias dele) também nos outros processos, não só o cache local
+        principal = ler_token(session_user)
+        if principal is not None:
+            revogar_sessoes(db, principal.usuario_id)
+            db.commit()
+        esquecer_token(session_user)
     else:
         print("❌ Nenhum cookie encontrado, redirecionando mesmo assim.")
 
     response = RedirectResponse(url="/login", status_code=303)
-    response.delete_cookie(key="session_user", path="/")
+    response.delete_cookie(key=COOKIE_SESSAO, path="/")
     
     print("✅ Instrução de remoção de cookie adicionada à resposta.")
     return response
 
 
 #  Solução correta para verificar a sessão
-def verificar_sessao(request: Request):
-    session_user = request.cookies.get("session_user")
-    if not session_user:
-        print("❌ Tentativa de acesso sem sessão ativa!")
-        # Redireciona para o login com o erro de "Usuário não autenticado"
-        raise HTTPException(
-            status_code=303,
-            detail="Usuário não autenticado",
-            headers={"Location": "/login?erro=Usuario nao autenticado"},
-        )
-    return session_user  # Retorna o ID do usuário para uso na rota
+def verificar_sessao(request: Request, db: Session = Depends(get_db)):
+    # Token assinado e versão de sessão em cache; sem sessão válida redireciona para o login
+    principal = obter_principal(request, db)
+    return str(principal.usuario_id)  # Retorna o ID do usuário para uso na rota
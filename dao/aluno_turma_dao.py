@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from models.aluno_turma import AlunoTurma, StatusAlunoTurma
 from models.turma import Turma, StatusTurma
+from services.resumo_service import ResumoService
 
 class AlunoTurmaDAO:
     @staticmethod
@@ -24,7 +25,7 @@ class AlunoTurmaDAO:
         if existing:
             # Se já existe mas está removido, reativar
             if existing.status == StatusAlunoTurma.REMOVIDO:
-                existing.status = StatusAlunoTurma.ATIVO
+                ResumoService.atualizar_status_aluno_turma(db, existing, StatusAlunoTurma.ATIVO)
                 db.commit()
                 db.refresh(existing)
                 return existing
@@ -38,6 +39,7 @@ class AlunoTurmaDAO:
             turma_id=turma_id
         )
         db.add(aluno_turma)
+        ResumoService.atualizar_status_aluno_turma(db, aluno_turma, StatusAlunoTurma.ATIVO)
         db.commit()
         db.refresh(aluno_turma)
         return aluno_turma
@@ -86,7 +88,7 @@ class AlunoTurmaDAO:
         if not aluno_turma:
             return False
         
-        aluno_turma.status = StatusAlunoTurma.REMOVIDO
+        ResumoService.atualizar_status_aluno_turma(db, aluno_turma, StatusAlunoTurma.REMOVIDO)
         db.commit()
         return True
 
@@ -101,6 +103,8 @@ class AlunoTurmaDAO:
         if not aluno_turma:
             return False
         
+        if aluno_turma.status == StatusAlunoTurma.ATIVO:
+            ResumoService.desvincular_turma(db, AlunoTurma.id == aluno_turma.id)
         db.delete(aluno_turma)
         db.commit()
         return True
@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
 from models.banco_questoes import BancoQuestoes, StatusQuestao
+from utils.materia_service import filtro_materia
+from services.correcao_service import CorrecaoService
 
 class BancoQuestoesDAO:
     @staticmethod
@@ -58,7 +60,7 @@ class BancoQuestoesDAO:
             )
         )
         if materia:
-            query = query.filter(BancoQuestoes.materia == materia)
+            query = query.filter(filtro_materia(BancoQuestoes.materia_id, materia))
         return query.all()
     
     @staticmethod
@@ -69,14 +71,14 @@ class BancoQuestoesDAO:
             BancoQuestoes.publica == True
         )
         if materia:
-            query = query.filter(BancoQuestoes.materia == materia)
+            query = query.filter(filtro_materia(BancoQuestoes.materia_id, materia))
         return query.all()
 
     @staticmethod
     def get_by_materia(db: Session, materia: str):
         """Busca questões por matéria"""
         return db.query(BancoQuestoes).filter(
-            BancoQuestoes.materia == materia,
+            filtro_materia(BancoQuestoes.materia_id, materia),
             BancoQuestoes.status == StatusQuestao.ATIVA
         ).all()
 
@@ -85,7 +87,7 @@ class BancoQuestoesDAO:
         """Busca questões por professor e matéria"""
         return db.query(BancoQuestoes).filter(
             BancoQuestoes.professor_id == professor_id,
-            BancoQuestoes.materia == materia,
+            filtro_materia(BancoQuestoes.materia_id, materia),
             BancoQuestoes.status == StatusQuestao.ATIVA
         ).all()
 
@@ -125,6 +127,8 @@ class BancoQuestoesDAO:
         
         db.commit()
         db.refresh(questao)
+        if resposta_correta is not None:
+            CorrecaoService.invalidar_gabaritos_da_questao(db, questao_id)
         return questao
 
     @staticmethod
@@ -202,7 +206,7 @@ class BancoQuestoesDAO:
             query = query.filter(BancoQuestoes.enunciado.ilike(f"%{search_term}%"))
         
         if materia:
-            query = query.filter(BancoQuestoes.materia == materia)
+            query = query.filter(filtro_materia(BancoQuestoes.materia_id, materia))
         
         return query.all()
     
@@ -225,6 +229,6 @@ class BancoQuestoesDAO:
             query = query.filter(BancoQuestoes.enunciado.ilike(f"%{search_term}%"))
         
         if materia:
-            query = query.filter(BancoQuestoes.materia == materia)
+            query = query.filter(filtro_materia(BancoQuestoes.materia_id, materia))
         
         return query.all()
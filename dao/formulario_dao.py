@@ -31,62 +31,94 @@ class FormularioDAO:
         return db.query(Formulario).all()
     
     @staticmethod
-    def get_for_aluno(db: Session, aluno_id: int):
-        """Busca formulários disponíveis para um aluno específico baseado em turma/campus/curso"""
+    def consulta_alunos_alvo(turma_id: int = None, campus_id: int = None, curso: str = None):
+        """
+        SELECT com os ids dos alunos que devem receber um formulário,
+        pelo direcionamento mais específico: turma, campus, curso ou todos.
+        """
+        from sqlalchemy import select
         from models.aluno import Aluno
-        from models.aluno_turma import AlunoTurma
-        
-        aluno = db.query(Aluno).filter(Aluno.idAluno == aluno_id).first()
-        if not aluno:
-            return []
-        
-        # Buscar turmas do aluno
-        aluno_turmas = db.query(AlunoTurma).filter(
-            AlunoTurma.aluno_id == aluno_id,
-            AlunoTurma.status == 'ativo'
-        ).all()
-        turma_ids = [at.turma_id for at in aluno_turmas]
-        
-        # Buscar campus das turmas do aluno
-        campus_ids = []
-        if turma_ids:
-            from models.turma import Turma
-            turmas = db.query(Turma).filter(Turma.id.in_(turma_ids)).all()
-            campus_ids = [t.campus_id for t in turmas]
-        
-        # Buscar formulários que:
-        # 1. Não têm nenhum filtro (turma_id, campus_id, curso são None) - para todos
-        # 2. São direcionados à turma do aluno
-        # 3. São direcionados ao campus do aluno
-        # 4. São direcionados ao curso do aluno
-        from sqlalchemy import or_, and_
-        
-        conditions = []
-        
-        # Formulários sem filtro (para todos)
-        conditions.append(
+        from models.aluno_turma import AlunoTurma, StatusAlunoTurma
+        from models.turma import Turma
+
+        consulta = select(Aluno.idAluno)
+        if turma_id:
+            return consulta.where(Aluno.idAluno.in_(
+                select(AlunoTurma.aluno_id).where(
+                    AlunoTurma.turma_id == turma_id,
+                    AlunoTurma.status == StatusAlunoTurma.ATIVO
+                )
+            ))
+        if campus_id:
+            return consulta.where(Aluno.idAluno.in_(
+                select(AlunoTurma.aluno_id).join(Turma, Turma.id == AlunoTurma.turma_id).where(
+                    Turma.campus_id == campus_id,
+                    AlunoTurma.status == StatusAlunoTurma.ATIVO
+                )
+            ))
+        if curso:
+            return consulta.where(Aluno.curso == curso)
+        return consulta
+
+    @staticmethod
+    def condicao_alvo(aluno_id, aluno_curso):
+        """
+        Condição SQL: formulário direcionado ao aluno (sem filtro, à turma,
+        ao campus ou ao curso dele). Aceita valores ou colunas de Aluno,
+        o que permite usar a mesma regra para um aluno ou para todos de uma vez.
+        """
+        from sqlalchemy import select, or_, and_
+        from models.aluno_turma import AlunoTurma, StatusAlunoTurma
+        from models.turma import Turma
+
+        turma_ativa = and_(AlunoTurma.aluno_id == aluno_id, AlunoTurma.status == StatusAlunoTurma.ATIVO)
+        return or_(
             and_(
                 Formulario.turma_id.is_(None),
                 Formulario.campus_id.is_(None),
                 Formulario.curso.is_(None)
-            )
+            ),
+            Formulario.turma_id.in_(select(AlunoTurma.turma_id).where(turma_ativa)),
+            Formulario.campus_id.in_(
+                select(Turma.campus_id).join(AlunoTurma, AlunoTurma.turma_id == Turma.id).where(turma_ativa)
+            ),
+            Formulario.curso == aluno_curso
         )
-        
-        # Formulários direcionados à turma do aluno
-        if turma_ids:
-            conditions.append(Formulario.turma_id.in_(turma_ids))
-        
-        # Formulários direcionados ao campus do aluno
-        if campus_ids:
-            conditions.append(Formulario.campus_id.in_(campus_ids))
-        
-        # Formulários direcionados ao curso do aluno
-        if aluno.curso:
-            conditions.append(Formulario.curso == aluno.curso)
-        
-        query = db.query(Formulario).filter(or_(*conditions))
-        
-        return query.all()
+
+    @staticmethod
+    def condicao_nao_respondido(aluno_id):
+        """Condição SQL: o aluno não tem nenhuma resposta no formulário."""
+        from sqlalchemy import select, exists
+        from models.resposta_formulario import RespostaFormulario
+
+        return ~exists(select(RespostaFormulario.id).where(
+            RespostaFormulario.aluno_id == aluno_id,
+            RespostaFormulario.formulario_id == Formulario.id
+        ))
+
+    @staticmethod
+    def get_pendentes_for_aluno(db: Session, aluno_id: int):
+        """Formulários direcionados ao aluno que ele ainda não respondeu (uma consulta)."""
+        from sqlalchemy import select
+        from models.aluno import Aluno
+
+        curso = select(Aluno.curso).where(Aluno.idAluno == aluno_id).scalar_subquery()
+        return db.query(Formulario).filter(
+            FormularioDAO.condicao_alvo(aluno_id, curso),
+            FormularioDAO.condicao_nao_respondido(aluno_id)
+        ).order_by(Formulario.data_criacao.desc(), Formulario.id.desc()).all()
+
+    @staticmethod
+    def get_for_aluno(db: Session, aluno_id: int):
+        """Busca formulários disponíveis para um aluno específico baseado em turma/campus/curso"""
+        from sqlalchemy import select, exists
+        from models.aluno import Aluno
+
+        curso = select(Aluno.curso).where(Aluno.idAluno == aluno_id).scalar_subquery()
+        return db.query(Formulario).filter(
+            exists(select(Aluno.idAluno).where(Aluno.idAluno == aluno_id)),
+            FormularioDAO.condicao_alvo(aluno_id, curso)
+        ).all()
 
     @staticmethod
     def add_pergunta(
@@ -115,8 +147,16 @@ class FormularioDAO:
 
     @staticmethod
     def delete(db: Session, formulario_id: int):
+        from models.resposta_formulario_opcao import RespostaFormularioOpcao
+        from services.contagem_formulario_service import ContagemFormularioService
+
         formulario = db.query(Formulario).filter(Formulario.id == formulario_id).first()
         if formulario:
+            # Opções marcadas e contadores na mesma transação da exclusão do formulário
+            db.query(RespostaFormularioOpcao).filter(
+                RespostaFormularioOpcao.formulario_id == formulario_id
+            ).delete(synchronize_session=False)
+            ContagemFormularioService.remover_formulario(db, formulario_id)
             db.delete(formulario)
             db.commit()
             print("Formulario deletado com sucesso")
@@ -2,9 +2,206 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import text
+from sqlalchemy import text, inspect
 from dao.database import engine, SessionLocal
 
+def criar_indice(db, tabela: str, indice: str, colunas, unico: bool = False) -> bool:
+    """Cria o índice se ainda não existir (funciona em MySQL e SQLite). Retorna True se criou."""
+    existentes = {i["name"] for i in inspect(db.connection()).get_indexes(tabela)}
+    if indice in existentes:
+        return False
+    tipo = "UNIQUE INDEX" if unico else "INDEX"
+    db.execute(text(f"CREATE {tipo} {indice} ON {tabela} ({', '.join(colunas)})"))
+    return True
+
+def remover_indice(db, tabela: str, indice: str) -> bool:
+    """Remove o índice se existir. Retorna True se removeu."""
+    existentes = {i["name"] for i in inspect(db.connection()).get_indexes(tabela)}
+    if indice not in existentes:
+        return False
+    if db.get_bind().dialect.name == "mysql":
+        db.execute(text(f"DROP INDEX {indice} ON {tabela}"))
+    else:
+        db.execute(text(f"DROP INDEX {indice}"))
+    return True
+
+def _criar_indices(*indices):
+    """Passo de migração que cria os índices (tabela, nome, colunas) informados."""
+    def aplicar(db):
+        for tabela, indice, colunas in indices:
+            if criar_indice(db, tabela, indice, colunas):
+                print(f" Índice {indice} criado em {tabela}")
+    return aplicar
+
+def _remover_duplicados(db, tabela: str, colunas, manter: str) -> int:
+    """
+    Apaga as linhas repetidas em `colunas`, mantendo a de menor id (manter="primeira")
+    ou a de maior id (manter="ultima"). A tabela derivada evita o erro 1093 do MySQL.
+    """
+    comparacao = "<" if manter == "primeira" else ">"
+    mesmas_chaves = " AND ".join(f"outra.{coluna} = linha.{coluna}" for coluna in colunas)
+    return db.execute(text(f"""
+        DELETE FROM {tabela} WHERE id IN (
+            SELECT id FROM (
+                SELECT DISTINCT linha.id FROM {tabela} linha
+                JOIN {tabela} outra ON {mesmas_chaves} AND outra.id {comparacao} linha.id
+            ) AS duplicados
+        )
+    """)).rowcount
+
+def _envio_de_prova_unico(db):
+    """Remove envios duplicados e troca os índices de resultados/respostas por índices únicos."""
+    colunas = {c["name"] for c in inspect(db.connection()).get_columns("resultados")}
+    if "token_submissao" not in colunas:
+        db.execute(text("ALTER TABLE resultados ADD COLUMN token_submissao VARCHAR(36) NULL"))
+
+    # Vale o primeiro resultado enviado e a última resposta de cada questão
+    resultados = _remover_duplicados(db, "resultados", ("aluno_id", "prova_id"), manter="primeira")
+    respostas = _remover_duplicados(db, "respostas", ("aluno_id", "questao_id"), manter="ultima")
+    if resultados or respostas:
+        print(f" Removidos {resultados} resultado(s) e {respostas} resposta(s) duplicados")
+
+    criar_indice(db, "resultados", "uq_resultados_aluno_prova", ("aluno_id", "prova_id"), unico=True)
+    criar_indice(db, "respostas", "uq_respostas_aluno_questao", ("aluno_id", "questao_id"), unico=True)
+    remover_indice(db, "resultados", "ix_resultados_aluno_prova")
+    remover_indice(db, "respostas", "ix_respostas_aluno_questao")
+
+    if resultados:
+        # A dimensão 'matéria' depende de materia_id (versão 10), que recalcula a dela
+        from services.resumo_service import ResumoService, DIMENSOES
+        ResumoService.reconstruir(db, tuple(d for d in DIMENSOES if d != 'materia'))
+
+def _opcoes_de_formulario_normalizadas(db):
+    """Cria respostas_formulario_opcoes e preenche a partir das respostas já gravadas."""
+    from models.resposta_formulario_opcao import RespostaFormularioOpcao
+    from dao.resposta_formulario_dao import RespostaFormularioDAO
+
+    RespostaFormularioOpcao.__table__.create(bind=db.connection(), checkfirst=True)
+    gravadas = RespostaFormularioDAO.preencher_opcoes(db)
+    if gravadas:
+        print(f" {gravadas} opção(ões) de resposta de formulário copiada(s)")
+
+def _contagens_de_formulario(db):
+    """Cria contagens_formulario e calcula os contadores a partir das respostas já gravadas."""
+    from models.contagem_formulario import ContagemFormulario
+    from services.contagem_formulario_service import ContagemFormularioService
+
+    ContagemFormulario.__table__.create(bind=db.connection(), checkfirst=True)
+    linhas = ContagemFormularioService.reconstruir(db)
+    if linhas:
+        print(f" {linhas} contador(es) de formulário calculado(s)")
+
+def _resumo_sem_turma(db):
+    """
+    Sem efeito: apagava a dimensão 'turma' do resumo, que voltou a ser mantida.
+    Fica na lista para manter a numeração; a versão 9 recalcula essa dimensão.
+    """
+
+def _resumo_por_turma(db):
+    """Recalcula a dimensão 'turma' do resumo (apagada em bancos que aplicaram a versão 7 antiga)."""
+    from services.resumo_service import ResumoService
+    ResumoService.reconstruir(db, ('turma',))
+
+def _versao_de_sessao(db):
+    """Adiciona usuarios.versao_sessao, assinada no token de sessão para permitir revogá-lo."""
+    colunas = {c["name"] for c in inspect(db.connection()).get_columns("usuarios")}
+    if "versao_sessao" not in colunas:
+        db.execute(text("ALTER TABLE usuarios ADD COLUMN versao_sessao INTEGER NOT NULL DEFAULT 0"))
+        print(" Coluna versao_sessao criada em usuarios")
+
+def _materia_id(db):
+    """
+    Dimensão de matérias: coluna materia_id indexada (com FK no MySQL) em provas e
+    banco_questoes, preenchida a partir do texto da matéria; recalcula o resumo por matéria.
+    """
+    from services.resumo_service import ResumoService
+
+    for tabela in ("provas", "banco_questoes"):
+        colunas = {c["name"] for c in inspect(db.connection()).get_columns(tabela)}
+        if "materia_id" not in colunas:
+            db.execute(text(f"ALTER TABLE {tabela} ADD COLUMN materia_id INT NULL"))
+            if db.get_bind().dialect.name == "mysql":
+                db.execute(text(
+                    f"ALTER TABLE {tabela} ADD CONSTRAINT fk_{tabela}_materia FOREIGN KEY (materia_id) REFERENCES materias(id)"
+                ))
+            print(f" Coluna materia_id criada em {tabela}")
+        criar_indice(db, tabela, f"ix_{tabela}_materia_id", ("materia_id",))
+
+    preenchidas = preencher_materia_id(db)
+    if preenchidas:
+        print(f" materia_id preenchido em {preenchidas} registro(s)")
+    ResumoService.reconstruir(db, ('materia',))
+
+# Migrações versionadas: cada passo roda uma única vez, em ordem, e fica
+# registrado em schema_versao. Novas alterações entram no fim com a próxima versão.
+MIGRACOES = [
+    (1, "Índices das consultas de formulários pendentes", _criar_indices(
+        ("notificacoes", "ix_notificacoes_aluno_link", ("aluno_id", "link")),
+        ("respostas_formulario", "ix_respostas_formulario_aluno_formulario", ("aluno_id", "formulario_id")),
+    )),
+    (2, "Índices compostos dos caminhos críticos", _criar_indices(
+        ("resultados", "ix_resultados_aluno_prova", ("aluno_id", "prova_id")),
+        ("respostas", "ix_respostas_aluno_questao", ("aluno_id", "questao_id")),
+        ("prova_turmas", "ix_prova_turmas_status_expiracao", ("status", "data_expiracao")),
+        ("notificacoes", "ix_notificacoes_aluno_lida_data", ("aluno_id", "lida", "data_criacao")),
+        ("respostas_formulario", "ix_respostas_formulario_formulario_pergunta", ("formulario_id", "pergunta_id")),
+    )),
+    (3, "Envio de prova único por aluno (resultados e respostas)", _envio_de_prova_unico),
+    (4, "Opções marcadas das respostas de formulário em tabela própria", _opcoes_de_formulario_normalizadas),
+    (5, "Índice dos respondedores de formulário", _criar_indices(
+        ("respostas_formulario", "ix_respostas_formulario_formulario_aluno", ("formulario_id", "aluno_id")),
+    )),
+    (6, "Contadores de respostas por pergunta e opção dos formulários", _contagens_de_formulario),
+    (7, "Resumo de desempenho sem a dimensão turma", _resumo_sem_turma),
+    (8, "Versão de sessão dos usuários (revogação de login)", _versao_de_sessao),
+    (9, "Resumo de desempenho por turma recalculado", _resumo_por_turma),
+    (10, "Matéria normalizada (materia_id) em provas e banco de questões", _materia_id),
+]
+
+def aplicar_migracoes_versionadas(db) -> list:
+    """Aplica os passos de MIGRACOES ainda não registrados em schema_versao. Retorna as versões aplicadas."""
+    db.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_versao (
+            versao INT PRIMARY KEY,
+            descricao VARCHAR(255) NOT NULL,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    aplicadas = set(db.execute(text("SELECT versao FROM schema_versao")).scalars().all())
+    novas = []
+    for versao, descricao, aplicar in MIGRACOES:
+        if versao in aplicadas:
+            continue
+        print(f" Aplicando migração {versao}: {descricao}...")
+        aplicar(db)
+        db.execute(
+            text("INSERT INTO schema_versao (versao, descricao) VALUES (:versao, :descricao)"),
+            {"versao": versao, "descricao": descricao}
+        )
+        db.commit()
+        novas.append(versao)
+    return novas
+
+def preencher_materia_id(db) -> int:
+    """
+    Backfill de materia_id: normaliza em Python apenas as variações distintas
+    de matéria (poucas) e atualiza cada grupo com um UPDATE.
+    """
+    from utils.materia_service import obter_ou_criar_materia_id
+
+    atualizadas = 0
+    for tabela in ("provas", "banco_questoes"):
+        variacoes = db.execute(text(
+            f"SELECT DISTINCT materia FROM {tabela} WHERE materia_id IS NULL AND materia IS NOT NULL"
+        )).scalars().all()
+        for materia in variacoes:
+            materia_id = obter_ou_criar_materia_id(db.connection(), materia)
+            if materia_id is not None:
+                atualizadas += db.execute(text(
+                    f"UPDATE {tabela} SET materia_id = :materia_id WHERE materia = :materia AND materia_id IS NULL"
+                ), {"materia_id": materia_id, "materia": materia}).rowcount
+    return atualizadas
+
 def migrar_banco():
     """Migra o banco de dados para incluir as novas colunas e tabelas"""
     db = SessionLocal()
@@ -272,6 +469,7 @@ def migrar_banco():
                 print(" Colunas de direcionamento j existem na tabela formularios")
         
         db.commit()
+        aplicar_migracoes_versionadas(db)
         print(" Migrao do banco de dados concluda com sucesso!")
         
     except Exception as e:
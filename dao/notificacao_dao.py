@@ -1,9 +1,10 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_ # Adicionado 'and_' para usar em filtros múltiplos
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import desc, and_, or_, insert, literal, select, exists, cast, true, String # Adicionado 'and_' para usar em filtros múltiplos
 from models.notificacao import Notificacao
 from models.aluno import Aluno
 from models.formulario import Formulario
-from dao.resposta_formulario_dao import RespostaFormularioDAO
+
+PREFIXO_LINK_FORMULARIO = "/aluno/formularios/"
 
 class NotificacaoDAO:
     @staticmethod
@@ -23,16 +24,36 @@ class NotificacaoDAO:
         db.refresh(nova_notificacao)
         return nova_notificacao
 
+    @staticmethod
+    def _condicao_formulario_valido(aluno_id, aluno_curso):
+        """
+        Condição SQL: a notificação não aponta para um formulário, ou aponta
+        para um formulário que ainda existe e é direcionado ao aluno.
+        """
+        from dao.formulario_dao import FormularioDAO
+
+        return or_(
+            Notificacao.link.is_(None),
+            ~Notificacao.link.like(PREFIXO_LINK_FORMULARIO + "%"),
+            exists(select(Formulario.id).where(
+                Notificacao.link == literal(PREFIXO_LINK_FORMULARIO) + cast(Formulario.id, String(20)),
+                FormularioDAO.condicao_alvo(aluno_id, aluno_curso)
+            ))
+        )
+
     @staticmethod
     def get_notificacoes_by_aluno(db: Session, aluno_id: int, lida: bool = None, limit: int = None):
         """
         Retorna notificações para um aluno, opcionalmente filtrando por 'lida'
-        e limitando a quantidade. Valida se os formulários ainda existem e são relevantes para o aluno.
+        e limitando a quantidade. Notificações de formulários que não existem mais
+        ou não são relevantes para o aluno são filtradas na própria consulta
+        (a remoção fica com NotificacaoDAO.remover_notificacoes_obsoletas).
         """
-        from dao.formulario_dao import FormularioDAO
-        import re
-        
-        query = db.query(Notificacao).filter(Notificacao.aluno_id == aluno_id)
+        curso = select(Aluno.curso).where(Aluno.idAluno == aluno_id).scalar_subquery()
+        query = db.query(Notificacao).filter(
+            Notificacao.aluno_id == aluno_id,
+            NotificacaoDAO._condicao_formulario_valido(aluno_id, curso)
+        )
         if lida is not None: # Se 'lida' for True ou False, aplica o filtro
             query = query.filter(Notificacao.lida == lida)
         
@@ -41,33 +62,25 @@ class NotificacaoDAO:
         if limit:
             query = query.limit(limit)
         
-        notificacoes = query.all()
-        
-        # Filtrar notificações válidas: verificar se formulário existe e é relevante para o aluno
-        notificacoes_validas = []
-        formularios_validos = FormularioDAO.get_for_aluno(db, aluno_id)
-        formulario_ids_validos = {f.id for f in formularios_validos}
-        
-        for notif in notificacoes:
-            # Extrair formulario_id do link se existir
-            formulario_id = None
-            if notif.link and "/aluno/formularios/" in notif.link:
-                try:
-                    match = re.search(r'/aluno/formularios/(\d+)', notif.link)
-                    if match:
-                        formulario_id = int(match.group(1))
-                except:
-                    pass
-            
-            # Se não é notificação de formulário ou se o formulário existe e é válido para o aluno
-            if not formulario_id or formulario_id in formulario_ids_validos:
-                notificacoes_validas.append(notif)
-            else:
-                # Remover notificação de formulário que não existe mais ou não é relevante
-                db.delete(notif)
-        
+        return query.all()
+
+    @staticmethod
+    def remover_notificacoes_obsoletas(db: Session):
+        """
+        Remove notificações de formulários excluídos ou que deixaram de ser
+        direcionados ao aluno. Executada pelo agendador, fora das requisições.
+        """
+        ids = db.execute(
+            select(Notificacao.id).join(Aluno, Aluno.idAluno == Notificacao.aluno_id).where(
+                ~NotificacaoDAO._condicao_formulario_valido(Notificacao.aluno_id, Aluno.curso)
+            )
+        ).scalars().all()
+        for inicio in range(0, len(ids), 1000):
+            db.query(Notificacao).filter(
+                Notificacao.id.in_(ids[inicio:inicio + 1000])
+            ).delete(synchronize_session=False)
         db.commit()
-        return notificacoes_validas
+        return len(ids)
 
     @staticmethod
     def get_notificacao_by_id(db: Session, notificacao_id: int):
@@ -137,47 +150,115 @@ class NotificacaoDAO:
             link=f"/aluno/formularios/{formulario_id}"
         )
 
+    @staticmethod
+    def criar_notificacoes_em_lote(db: Session, consulta_alunos, titulo: str, mensagem: str = None, link: str = None):
+        """
+        Cria a mesma notificação para todos os alunos retornados por `consulta_alunos`
+        (um SELECT de ids) com um único INSERT ... SELECT e um commit.
+        Retorna a quantidade de notificações criadas.
+        """
+        alunos = consulta_alunos.subquery()
+        resultado = db.execute(insert(Notificacao).from_select(
+            ['aluno_id', 'titulo', 'mensagem', 'link', 'lida'],
+            select(
+                alunos.c[0],
+                literal(titulo),
+                literal(mensagem),
+                literal(link),
+                literal(False)
+            )
+        ))
+        db.commit()
+        return resultado.rowcount
+
+    @staticmethod
+    def notificar_novo_formulario(db: Session, formulario_id: int):
+        """Notifica em lote todos os alunos a quem o formulário é direcionado."""
+        from dao.formulario_dao import FormularioDAO
+
+        formulario = FormularioDAO.get_by_id(db, formulario_id)
+        if not formulario:
+            return 0
+        return NotificacaoDAO.criar_notificacoes_em_lote(
+            db,
+            FormularioDAO.consulta_alunos_alvo(formulario.turma_id, formulario.campus_id, formulario.curso),
+            titulo=f"Novo Formulário: {formulario.titulo}",
+            mensagem=f"Há um novo formulário '{formulario.titulo}' disponível para você responder. Clique para acessá-lo.",
+            link=f"/aluno/formularios/{formulario.id}"
+        )
+
+    @staticmethod
+    def _sincronizar_formularios_pendentes(db: Session, pendentes):
+        """
+        Garante uma notificação não lida "Formulário Pendente" para cada par
+        (aluno_id, formulario_id, titulo) de `pendentes`. Notificações já lidas
+        desses formulários são removidas e recriadas, como antes, mas tudo
+        em três comandos SQL, independentemente da quantidade de alunos.
+        """
+        pares = pendentes.subquery()
+        link = literal(PREFIXO_LINK_FORMULARIO) + cast(pares.c.formulario_id, String(20))
+        sem_nao_lida = ~exists(select(Notificacao.id).where(
+            Notificacao.aluno_id == pares.c.aluno_id,
+            Notificacao.link == link,
+            Notificacao.lida == False
+        ).correlate(pares))
+
+        # O MySQL não permite DELETE com subconsulta na própria tabela: busca os ids antes
+        lida = aliased(Notificacao)
+        ids_lidas = db.execute(
+            select(lida.id).join(pares, and_(lida.aluno_id == pares.c.aluno_id, lida.link == link))
+            .where(lida.lida == True, sem_nao_lida)
+        ).scalars().all()
+        for inicio in range(0, len(ids_lidas), 1000):
+            db.query(Notificacao).filter(
+                Notificacao.id.in_(ids_lidas[inicio:inicio + 1000])
+            ).delete(synchronize_session=False)
+
+        resultado = db.execute(insert(Notificacao).from_select(
+            ['aluno_id', 'titulo', 'mensagem', 'link', 'lida'],
+            select(
+                pares.c.aluno_id,
+                literal("Formulário Pendente: ") + pares.c.titulo,
+                literal("Você ainda não respondeu o formulário '") + pares.c.titulo
+                + literal("'. Clique para respondê-lo."),
+                link,
+                literal(False)
+            ).where(sem_nao_lida)
+        ))
+        db.commit()
+        return resultado.rowcount
+
+    @staticmethod
+    def sincronizar_pendentes_aluno(db: Session, aluno_id: int):
+        """Cria as notificações de formulários pendentes de um único aluno."""
+        from dao.formulario_dao import FormularioDAO
+
+        curso = select(Aluno.curso).where(Aluno.idAluno == aluno_id).scalar_subquery()
+        pendentes = select(
+            literal(aluno_id).label('aluno_id'),
+            Formulario.id.label('formulario_id'),
+            Formulario.titulo.label('titulo')
+        ).where(
+            FormularioDAO.condicao_alvo(aluno_id, curso),
+            FormularioDAO.condicao_nao_respondido(aluno_id)
+        )
+        return NotificacaoDAO._sincronizar_formularios_pendentes(db, pendentes)
+
     @staticmethod
     def verificar_formularios_nao_respondidos(db: Session):
-        """Verifica formulários não respondidos e cria notificações para os alunos.
-        Usa o método get_for_aluno para garantir que apenas formulários relevantes sejam considerados."""
+        """
+        Reconciliação global (executada pelo agendador): cria notificações de
+        formulários pendentes para todos os alunos de uma vez, com a mesma regra
+        de direcionamento de FormularioDAO.condicao_alvo.
+        """
         from dao.formulario_dao import FormularioDAO
-        
-        # Busca todos os alunos
-        alunos = db.query(Aluno).all()
-        
-        for aluno in alunos:
-            # Busca apenas formulários relevantes para este aluno (filtrados por turma/campus/curso)
-            formularios = FormularioDAO.get_for_aluno(db, aluno.idAluno)
-            
-            for formulario in formularios:
-                # Verifica se o aluno já respondeu este formulário
-                if not RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno.idAluno, formulario.id):
-                    # Verifica se já existe uma notificação não lida para este formulário
-                    notificacao_existente = db.query(Notificacao).filter(
-                        and_(
-                            Notificacao.aluno_id == aluno.idAluno,
-                            Notificacao.link == f"/aluno/formularios/{formulario.id}",
-                            Notificacao.lida == False
-                        )
-                    ).first()
-                    
-                    # Se não existe notificação ou se a notificação existente está lida, cria uma nova
-                    if not notificacao_existente:
-                        # Remove qualquer notificação antiga (lida ou não) para este formulário
-                        db.query(Notificacao).filter(
-                            and_(
-                                Notificacao.aluno_id == aluno.idAluno,
-                                Notificacao.link == f"/aluno/formularios/{formulario.id}"
-                            )
-                        ).delete()
-                        
-                        # Cria uma nova notificação
-                        NotificacaoDAO.create_notificacao(
-                            db=db,
-                            aluno_id=aluno.idAluno,
-                            titulo=f"Formulário Pendente: {formulario.titulo}",
-                            mensagem=f"Você ainda não respondeu o formulário '{formulario.titulo}'. Clique para respondê-lo.",
-                            link=f"/aluno/formularios/{formulario.id}"
-                        )
-                        db.commit()
\ No newline at end of file
+
+        pendentes = select(
+            Aluno.idAluno.label('aluno_id'),
+            Formulario.id.label('formulario_id'),
+            Formulario.titulo.label('titulo')
+        ).select_from(Aluno).join(Formulario, true()).where(
+            FormularioDAO.condicao_alvo(Aluno.idAluno, Aluno.curso),
+            FormularioDAO.condicao_nao_respondido(Aluno.idAluno)
+        )
+        return NotificacaoDAO._sincronizar_formularios_pendentes(db, pendentes)
@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Session
 from models.professor import Professor
 from models.usuario import Usuario
-from passlib.hash import bcrypt
+from utils.senha_service import gerar_hash
 
 class ProfessorDAO:
     @staticmethod
@@ -27,7 +27,7 @@ class ProfessorDAO:
             return None
         
         # Criar usuário
-        senha_hash = bcrypt.hash(senha)
+        senha_hash = gerar_hash(senha)
         usuario = Usuario(email=email, senha_hash=senha_hash, tipo='professor')
         db.add(usuario)
         db.commit()
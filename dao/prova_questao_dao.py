@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from models.prova_questao import ProvaQuestao
+from services.correcao_service import CorrecaoService
 
 class ProvaQuestaoDAO:
     @staticmethod
@@ -13,6 +14,7 @@ class ProvaQuestaoDAO:
         db.add(prova_questao)
         db.commit()
         db.refresh(prova_questao)
+        CorrecaoService.invalidar_gabaritos(prova_id)
         return prova_questao
 
     @staticmethod
@@ -47,6 +49,7 @@ class ProvaQuestaoDAO:
         
         db.delete(prova_questao)
         db.commit()
+        CorrecaoService.invalidar_gabaritos(prova_id)
         return True
 
     @staticmethod
@@ -54,6 +57,7 @@ class ProvaQuestaoDAO:
         """Remove todas as questões de uma prova"""
         db.query(ProvaQuestao).filter(ProvaQuestao.prova_id == prova_id).delete()
         db.commit()
+        CorrecaoService.invalidar_gabaritos(prova_id)
         return True
 
     @staticmethod
@@ -1,8 +1,25 @@
 from datetime import datetime
+from sqlalchemy import and_, or_, func, update
 from sqlalchemy.orm import Session
 from models.prova_turma import ProvaTurma, StatusProvaTurma
+from services.resumo_service import ResumoService
 
 class ProvaTurmaDAO:
+    @staticmethod
+    def filtro_ativa(agora: datetime = None):
+        """Condição SQL para disponibilizações efetivamente ativas (status e prazo)"""
+        agora = agora or datetime.now()
+        return and_(ProvaTurma.status == StatusProvaTurma.ATIVA, ProvaTurma.data_expiracao >= agora)
+
+    @staticmethod
+    def filtro_expirada(agora: datetime = None):
+        """Condição SQL para disponibilizações expiradas, gravadas ou com prazo vencido"""
+        agora = agora or datetime.now()
+        return or_(
+            ProvaTurma.status == StatusProvaTurma.EXPIRADA,
+            and_(ProvaTurma.status == StatusProvaTurma.ATIVA, ProvaTurma.data_expiracao < agora)
+        )
+
     @staticmethod
     def create(db: Session, prova_id: int, turma_id: int, professor_id: int, 
                data_inicio: datetime, data_expiracao: datetime):
@@ -14,7 +31,7 @@ class ProvaTurmaDAO:
             data_inicio=data_inicio,
             data_expiracao=data_expiracao
         )
-        db.add(prova_turma)
+        ResumoService.alterar_prova_turma(db, prova_id, turma_id, lambda: db.add(prova_turma))
         db.commit()
         db.refresh(prova_turma)
         return prova_turma
@@ -39,7 +56,7 @@ class ProvaTurmaDAO:
         """Busca provas ativas para uma turma"""
         return db.query(ProvaTurma).filter(
             ProvaTurma.turma_id == turma_id,
-            ProvaTurma.status == StatusProvaTurma.ATIVA
+            ProvaTurmaDAO.filtro_ativa()
         ).all()
 
     @staticmethod
@@ -52,7 +69,7 @@ class ProvaTurmaDAO:
         """Busca provas ativas disponibilizadas por um professor"""
         return db.query(ProvaTurma).filter(
             ProvaTurma.professor_id == professor_id,
-            ProvaTurma.status == StatusProvaTurma.ATIVA
+            ProvaTurmaDAO.filtro_ativa()
         ).all()
 
     @staticmethod
@@ -60,7 +77,7 @@ class ProvaTurmaDAO:
         """Busca provas expiradas de um professor"""
         return db.query(ProvaTurma).filter(
             ProvaTurma.professor_id == professor_id,
-            ProvaTurma.status == StatusProvaTurma.EXPIRADA
+            ProvaTurmaDAO.filtro_expirada()
         ).all()
 
     @staticmethod
@@ -100,24 +117,34 @@ class ProvaTurmaDAO:
         if not prova_turma:
             return False
         
-        db.delete(prova_turma)
+        ResumoService.alterar_prova_turma(
+            db, prova_turma.prova_id, prova_turma.turma_id, lambda: db.delete(prova_turma)
+        )
         db.commit()
         return True
 
     @staticmethod
     def check_and_update_expired(db: Session):
-        """Verifica e atualiza provas expiradas"""
-        now = datetime.now()
-        expired_provas = db.query(ProvaTurma).filter(
-            ProvaTurma.data_expiracao < now,
-            ProvaTurma.status == StatusProvaTurma.ATIVA
-        ).all()
-        
-        for prova_turma in expired_provas:
-            prova_turma.status = StatusProvaTurma.EXPIRADA
-        
+        """
+        Grava o status EXPIRADA nas disponibilizações com prazo vencido.
+        Executado pelo agendador em segundo plano (services/agendador_service.py);
+        as rotas não chamam este método, pois as consultas já usam o status efetivo.
+        """
+        resultado = db.execute(
+            update(ProvaTurma)
+            .where(ProvaTurma.status == StatusProvaTurma.ATIVA, ProvaTurma.data_expiracao < datetime.now())
+            .values(status=StatusProvaTurma.EXPIRADA)
+            .execution_options(synchronize_session=False)
+        )
         db.commit()
-        return len(expired_provas)
+        return resultado.rowcount
+
+    @staticmethod
+    def get_proxima_expiracao(db: Session):
+        """Retorna a data de expiração mais próxima entre as disponibilizações ativas"""
+        return db.query(func.min(ProvaTurma.data_expiracao)).filter(
+            ProvaTurma.status == StatusProvaTurma.ATIVA
+        ).scalar()
 
     @staticmethod
     def get_provas_for_aluno(db: Session, aluno_id: int):
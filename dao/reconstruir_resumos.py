@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dao.database import SessionLocal
+from models.resumo_desempenho import ResumoDesempenho
+from models.resultado import Resultado
+from services.resumo_service import ResumoService
+
+def reconstruir_resumos(somente_se_vazio: bool = False):
+    """
+    Recalcula a tabela resumos_desempenho a partir de resultados.
+    Com somente_se_vazio=True (usado na inicialização) só faz o backfill
+    quando o resumo ainda não foi populado.
+
+    Uso manual: python dao/reconstruir_resumos.py
+    """
+    db = SessionLocal()
+    try:
+        if somente_se_vazio:
+            resumo_vazio = db.query(ResumoDesempenho.id).first() is None
+            if not resumo_vazio or db.query(Resultado.id).first() is None:
+                return
+        print("Reconstruindo resumos de desempenho...")
+        total = ResumoService.reconstruir(db)
+        print(f"Resumos de desempenho reconstruídos: {total} grupos.")
+    except Exception as e:
+        print(f"Erro ao reconstruir resumos: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    reconstruir_resumos()
@@ -0,0 +1,90 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.orm import Session
+from models.relatorio_job import RelatorioJob, StatusRelatorioJob
+from dao.upsert import inserir_se_ausente
+
+class RelatorioJobDAO:
+    @staticmethod
+    def criar_ou_reutilizar(db: Session, tipo: str, parametros: str, solicitante_id: int, chave: str) -> RelatorioJob:
+        """
+        Cria o pedido e confirma (commit). Se já houver um pedido idêntico na fila
+        ou em geração (mesma `chave_ativa`), devolve esse pedido.
+        """
+        while True:
+            inserir_se_ausente(db, RelatorioJob, {
+                "tipo": tipo,
+                "parametros": parametros,
+                "solicitante_id": solicitante_id,
+                "chave_ativa": chave,
+                "status": StatusRelatorioJob.PENDENTE,
+                "tentativas": 0,
+            }, chaves=["chave_ativa"])
+            db.commit()
+            job = db.query(RelatorioJob).filter(RelatorioJob.chave_ativa == chave).first()
+            if job is not None:
+                return job
+            # O pedido idêntico terminou entre o INSERT e a leitura (finalizar libera a
+            # chave_ativa): agora o INSERT não tem mais com quem conflitar
+
+    @staticmethod
+    def _condicao_disponivel(agora: datetime):
+        """Pendentes, ou em geração com a reserva vencida (worker que caiu)."""
+        return or_(
+            RelatorioJob.status == StatusRelatorioJob.PENDENTE,
+            and_(RelatorioJob.status == StatusRelatorioJob.PROCESSANDO, RelatorioJob.reservada_ate < agora)
+        )
+
+    @staticmethod
+    def reservar(db: Session, duracao_reserva: int) -> Optional[RelatorioJob]:
+        """
+        Reserva o pedido mais antigo disponível para este worker (mesmo esquema de
+        SubmissaoProvaDAO.reservar_lote: UPDATE condicional marcado com um id do worker).
+        """
+        agora = datetime.now()
+        job_id = db.execute(
+            select(RelatorioJob.id)
+            .where(RelatorioJobDAO._condicao_disponivel(agora))
+            .order_by(RelatorioJob.id)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+
+        reserva = str(uuid.uuid4())
+        db.execute(
+            update(RelatorioJob)
+            .where(RelatorioJob.id == job_id, RelatorioJobDAO._condicao_disponivel(agora))
+            .values(
+                status=StatusRelatorioJob.PROCESSANDO,
+                reservada_por=reserva,
+                reservada_ate=agora + timedelta(seconds=duracao_reserva),
+                tentativas=RelatorioJob.tentativas + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return db.query(RelatorioJob).filter(RelatorioJob.reservada_por == reserva).first()
+
+    @staticmethod
+    def finalizar(db: Session, job: RelatorioJob, status: StatusRelatorioJob, erro: Optional[str] = None):
+        """Registra o desfecho e libera a chave para novos pedidos iguais (sem commit)."""
+        job.status = status
+        job.erro = erro[:255] if erro else None
+        job.chave_ativa = None
+        job.reservada_ate = None
+        job.data_conclusao = datetime.now()
+
+    @staticmethod
+    def get_do_solicitante(db: Session, job_id: int, solicitante_id: int) -> Optional[RelatorioJob]:
+        return db.query(RelatorioJob).filter(
+            RelatorioJob.id == job_id, RelatorioJob.solicitante_id == solicitante_id
+        ).first()
+
+    @staticmethod
+    def get_vencidos(db: Session, agora: datetime, limite: int = 100) -> list:
+        return db.query(RelatorioJob).filter(
+            RelatorioJob.status == StatusRelatorioJob.CONCLUIDO, RelatorioJob.expira_em < agora
+        ).order_by(RelatorioJob.expira_em).limit(limite).all()
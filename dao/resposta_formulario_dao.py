@@ -1,13 +1,18 @@
+import json
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, insert, exists
 from models.resposta_formulario import RespostaFormulario
+from models.resposta_formulario_opcao import RespostaFormularioOpcao
 from models.aluno import Aluno
 from models.pergunta_formulario import PerguntaFormulario
+from services.contagem_formulario_service import ContagemFormularioService
 
 class RespostaFormularioDAO:
     @staticmethod
-    def create_resposta(db: Session, aluno_id: int, formulario_id: int, pergunta_id: int, resposta_texto: str = None, resposta_opcoes: str = None):
+    def create_resposta(db: Session, aluno_id: int, formulario_id: int, pergunta_id: int, resposta_texto: str = None,
+                        resposta_opcoes: str = None, pergunta: PerguntaFormulario = None):
         """Cria uma nova resposta de formulário para um aluno.
+        Com a `pergunta`, grava também as opções marcadas (respostas_formulario_opcoes).
         Não comita aqui, o controller ou o serviço fará o commit da transação inteira.
         """
         nova_resposta = RespostaFormulario(
@@ -17,9 +22,82 @@ class RespostaFormularioDAO:
             resposta_texto=resposta_texto,
             resposta_opcoes=resposta_opcoes
         )
+        if pergunta is not None:
+            nova_resposta.opcoes_marcadas = [
+                RespostaFormularioOpcao(formulario_id=formulario_id, pergunta_id=pergunta_id, opcao_index=indice, opcao=opcao)
+                for indice, opcao in RespostaFormularioDAO.opcoes_marcadas(
+                    pergunta.tipo_pergunta, pergunta.opcoes, resposta_texto, resposta_opcoes
+                )
+            ]
         db.add(nova_resposta)
         return nova_resposta
 
+    @staticmethod
+    def opcoes_marcadas(tipo_pergunta: str, opcoes_pergunta: str, resposta_texto: str = None,
+                        resposta_opcoes: str = None) -> list:
+        """
+        (opcao_index, opcao) marcadas numa resposta de pergunta de escolha; lista vazia
+        para os outros tipos. O índice é a posição em PerguntaFormulario.opcoes (None se fora da lista).
+        """
+        from services.formulario_analytics_service import FormularioAnalyticsService, TIPOS_COM_GRAFICO
+
+        if tipo_pergunta not in TIPOS_COM_GRAFICO:
+            return []
+        try:
+            lista = json.loads(opcoes_pergunta) if opcoes_pergunta else []
+        except (json.JSONDecodeError, TypeError):
+            lista = []
+        indices = {}
+        for indice, opcao in enumerate(lista if isinstance(lista, list) else []):
+            indices.setdefault(str(opcao), indice)
+        marcadas = FormularioAnalyticsService.opcoes_da_resposta(
+            tipo_pergunta == 'multipla_escolha', resposta_texto, resposta_opcoes
+        )
+        return [(indices.get(opcao), opcao[:255]) for opcao in marcadas]
+
+    @staticmethod
+    def preencher_opcoes(db: Session, lote: int = 1000) -> int:
+        """
+        Backfill de respostas_formulario_opcoes a partir de resposta_texto/resposta_opcoes,
+        para as respostas de perguntas de escolha que ainda não têm opções gravadas.
+        Processa em lotes por id e comita cada lote. Retorna quantas opções gravou.
+        """
+        from services.formulario_analytics_service import TIPOS_COM_GRAFICO
+
+        gravadas = 0
+        ultimo_id = 0
+        while True:
+            linhas = db.execute(
+                select(
+                    RespostaFormulario.id, RespostaFormulario.formulario_id, RespostaFormulario.pergunta_id,
+                    RespostaFormulario.resposta_texto, RespostaFormulario.resposta_opcoes,
+                    PerguntaFormulario.tipo_pergunta, PerguntaFormulario.opcoes
+                )
+                .join(PerguntaFormulario, PerguntaFormulario.id == RespostaFormulario.pergunta_id)
+                .where(
+                    RespostaFormulario.id > ultimo_id,
+                    PerguntaFormulario.tipo_pergunta.in_(TIPOS_COM_GRAFICO),
+                    ~exists().where(RespostaFormularioOpcao.resposta_id == RespostaFormulario.id)
+                )
+                .order_by(RespostaFormulario.id)
+                .limit(lote)
+            ).all()
+            if not linhas:
+                return gravadas
+            ultimo_id = linhas[-1].id
+            novas = [
+                {"resposta_id": linha.id, "formulario_id": linha.formulario_id, "pergunta_id": linha.pergunta_id,
+                 "opcao_index": indice, "opcao": opcao}
+                for linha in linhas
+                for indice, opcao in RespostaFormularioDAO.opcoes_marcadas(
+                    linha.tipo_pergunta, linha.opcoes, linha.resposta_texto, linha.resposta_opcoes
+                )
+            ]
+            if novas:
+                db.execute(insert(RespostaFormularioOpcao), novas)
+            db.commit()
+            gravadas += len(novas)
+
     @staticmethod
     def get_respostas_by_aluno_and_formulario(db: Session, aluno_id: int, formulario_id: int):
         """Retorna todas as respostas de um aluno para um formulário específico,
@@ -38,13 +116,34 @@ class RespostaFormularioDAO:
         ).all()
 
     @staticmethod
-    def get_alunos_who_responded_formulario(db: Session, formulario_id: int):
-        """Retorna a lista de alunos que responderam a um formulário específico."""
-        return db.query(Aluno).join(
-            RespostaFormulario, Aluno.idAluno == RespostaFormulario.aluno_id
-        ).filter(
-            RespostaFormulario.formulario_id == formulario_id
-        ).distinct().all()
+    def listar_respondedores(db: Session, formulario_id: int, apos_aluno_id: int = None, busca: str = None,
+                             limite: int = 50):
+        """
+        Página de alunos que responderam ao formulário, em ordem de idAluno (keyset):
+        a próxima página começa depois de `apos_aluno_id`, percorrendo o índice
+        (formulario_id, aluno_id) sem OFFSET. `busca` filtra por parte do nome.
+        Retorna (lista de (Aluno, data da última resposta), idAluno para a próxima página ou None).
+        """
+        respondedores = select(
+            RespostaFormulario.aluno_id,
+            func.max(RespostaFormulario.data_resposta).label("data_resposta")
+        ).where(RespostaFormulario.formulario_id == formulario_id)
+        if apos_aluno_id is not None:
+            respondedores = respondedores.where(RespostaFormulario.aluno_id > apos_aluno_id)
+        if busca:
+            respondedores = respondedores.join(
+                Aluno, Aluno.idAluno == RespostaFormulario.aluno_id
+            ).where(Aluno.nome.ilike(f"%{busca}%"))
+        # Um a mais que o limite só para saber se existe próxima página
+        respondedores = respondedores.group_by(
+            RespostaFormulario.aluno_id
+        ).order_by(RespostaFormulario.aluno_id).limit(limite + 1).subquery()
+
+        linhas = db.query(Aluno, respondedores.c.data_resposta).join(
+            respondedores, Aluno.idAluno == respondedores.c.aluno_id
+        ).order_by(Aluno.idAluno).all()
+        proximo = linhas[limite - 1][0].idAluno if len(linhas) > limite else None
+        return linhas[:limite], proximo
 
     @staticmethod
     def has_aluno_responded_formulario(db: Session, aluno_id: int, formulario_id: int):
@@ -54,9 +153,32 @@ class RespostaFormularioDAO:
             RespostaFormulario.formulario_id == formulario_id
         ).first() is not None
 
+    @staticmethod
+    def travar_envio(db: Session, aluno_id: int, formulario_id: int) -> bool:
+        """
+        Serializa os envios de formulário do aluno: trava a linha do aluno (SELECT ... FOR UPDATE)
+        até o fim da transação, e um envio concorrente (duplo clique) espera este terminar.
+        A conferência "já respondeu?" é uma leitura travada, que enxerga o envio já confirmado
+        pelo outro. Retorna True se o aluno já respondeu o formulário.
+        """
+        db.query(Aluno.idAluno).filter(Aluno.idAluno == aluno_id).with_for_update().first()
+        return db.query(RespostaFormulario.id).filter(
+            RespostaFormulario.aluno_id == aluno_id,
+            RespostaFormulario.formulario_id == formulario_id
+        ).with_for_update(read=True).first() is not None
+
     @staticmethod
     def delete_respostas_from_formulario_by_aluno(db: Session, aluno_id: int, formulario_id: int):
         """Deleta todas as respostas de um aluno para um formulário específico."""
+        ContagemFormularioService.descontar_envio(db, aluno_id, formulario_id)
+        # Opções marcadas antes (o ON DELETE CASCADE não vale no SQLite sem foreign_keys)
+        respostas = select(RespostaFormulario.id).where(
+            RespostaFormulario.aluno_id == aluno_id,
+            RespostaFormulario.formulario_id == formulario_id
+        )
+        db.query(RespostaFormularioOpcao).filter(
+            RespostaFormularioOpcao.resposta_id.in_(respostas)
+        ).delete(synchronize_session=False)
         db.query(RespostaFormulario).filter(
             RespostaFormulario.aluno_id == aluno_id,
             RespostaFormulario.formulario_id == formulario_id
@@ -64,11 +186,27 @@ class RespostaFormularioDAO:
         return True
 
     @staticmethod
-    def get_total_respondedores_by_formulario(db: Session, formulario_id: int):
-        """Retorna o número total de alunos que responderam a um formulário específico."""
-        return db.query(func.count(func.distinct(RespostaFormulario.aluno_id))).filter(
+    def delete_respostas_by_aluno(db: Session, aluno_id: int):
+        """Deleta todas as respostas de formulário de um aluno (exclusão do aluno), descontando os contadores."""
+        ContagemFormularioService.descontar_aluno(db, aluno_id)
+        respostas = select(RespostaFormulario.id).where(RespostaFormulario.aluno_id == aluno_id)
+        db.query(RespostaFormularioOpcao).filter(
+            RespostaFormularioOpcao.resposta_id.in_(respostas)
+        ).delete(synchronize_session=False)
+        db.query(RespostaFormulario).filter(
+            RespostaFormulario.aluno_id == aluno_id
+        ).delete(synchronize_session=False)
+        return True
+
+    @staticmethod
+    def get_total_respondedores_by_formulario(db: Session, formulario_id: int, busca: str = None):
+        """Retorna o número total de alunos que responderam a um formulário específico (opcionalmente filtrando pelo nome)."""
+        query = db.query(func.count(func.distinct(RespostaFormulario.aluno_id))).filter(
             RespostaFormulario.formulario_id == formulario_id
-        ).scalar() or 0
+        )
+        if busca:
+            query = query.join(Aluno, Aluno.idAluno == RespostaFormulario.aluno_id).filter(Aluno.nome.ilike(f"%{busca}%"))
+        return query.scalar() or 0
 
     @staticmethod
     def get_respostas_aluno(db: Session, aluno_id: int, formulario_id: int):
@@ -83,6 +221,30 @@ class RespostaFormularioDAO:
             RespostaFormulario.formulario_id == formulario_id
         ).all()
 
+    @staticmethod
+    def iterar_para_exportacao(db: Session, formulario_id: int, lote: int = 1000):
+        """
+        Respostas do formulário com nome do aluno e enunciado da pergunta, lidas do
+        cursor do servidor em lotes de `lote` linhas (yield_per): nunca carrega tudo na memória.
+        """
+        consulta = select(
+            RespostaFormulario.aluno_id,
+            Aluno.nome,
+            RespostaFormulario.pergunta_id,
+            PerguntaFormulario.enunciado,
+            PerguntaFormulario.tipo_pergunta,
+            RespostaFormulario.resposta_texto,
+            RespostaFormulario.resposta_opcoes,
+            RespostaFormulario.data_resposta,
+        ).join(
+            Aluno, Aluno.idAluno == RespostaFormulario.aluno_id
+        ).join(
+            PerguntaFormulario, PerguntaFormulario.id == RespostaFormulario.pergunta_id
+        ).where(
+            RespostaFormulario.formulario_id == formulario_id
+        ).order_by(RespostaFormulario.id)
+        return db.execute(consulta.execution_options(yield_per=lote))
+
     @staticmethod
     def get_estatisticas_formulario(db: Session, formulario_id: int):
         """Retorna estatísticas básicas sobre as respostas do formulário"""
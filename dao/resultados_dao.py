@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from models.resultado import Resultado
+from services.resumo_service import ResumoService
 
 class ResultadoDAO:
     @staticmethod
@@ -13,6 +14,7 @@ class ResultadoDAO:
             total_questoes=total_questoes
         )
         db.add(novo_resultado)
+        ResumoService.registrar_resultado(db, novo_resultado)
         db.commit()
         db.refresh(novo_resultado)
         return novo_resultado
@@ -1,21 +1,15 @@
-import bcrypt
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.senha_service import gerar_hash
 
 def criptografar_senha(senha_texto_plano):
     """
     Criptografa uma senha usando bcrypt e retorna o hash gerado.
+    O custo vem de BCRYPT_ROUNDS (ver utils/senha_service.py).
     """
-    # 1. A senha precisa ser convertida para o formato de bytes (padrão utf-8)
-    senha_em_bytes = senha_texto_plano.encode('utf-8')
-    
-    # 2. Gera um "salt" aleatório. O salt garante que o mesmo password
-    #    gere um hash diferente a cada vez, aumentando a segurança.
-    salt = bcrypt.gensalt()
-    
-    # 3. Criptografa a senha (hash) usando o salt gerado
-    hash_gerado = bcrypt.hashpw(senha_em_bytes, salt)
-    
-    # 4. Retorna o hash como string
-    return hash_gerado.decode('utf-8')
+    return gerar_hash(senha_texto_plano)
 
 # Chame a função com a senha que você deseja criptografar
 if __name__ == "__main__":
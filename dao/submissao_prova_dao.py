@@ -0,0 +1,114 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.orm import Session
+from models.submissao_prova import SubmissaoProva, StatusSubmissao
+from dao.upsert import inserir_se_ausente
+
+class SubmissaoProvaDAO:
+    @staticmethod
+    def enfileirar(db: Session, aluno_id: int, prova_id: int, respostas: dict, token: str) -> SubmissaoProva:
+        """
+        Grava o envio na fila e confirma (commit) antes de responder ao aluno.
+        Um reenvio com o mesmo token devolve o envio já enfileirado.
+        """
+        inserir_se_ausente(db, SubmissaoProva, {
+            "aluno_id": aluno_id,
+            "prova_id": prova_id,
+            "token_submissao": token,
+            "respostas": json.dumps({str(q): r for q, r in respostas.items()}),
+            "status": StatusSubmissao.PENDENTE,
+            "tentativas": 0,
+        }, chaves=["token_submissao"])
+        db.commit()
+        return db.query(SubmissaoProva).filter(SubmissaoProva.token_submissao == token).first()
+
+    @staticmethod
+    def _condicao_disponivel(agora: datetime):
+        """Pendentes, ou em processamento com a reserva vencida (worker que caiu)."""
+        return or_(
+            SubmissaoProva.status == StatusSubmissao.PENDENTE,
+            and_(SubmissaoProva.status == StatusSubmissao.PROCESSANDO, SubmissaoProva.reservada_ate < agora)
+        )
+
+    @staticmethod
+    def reservar_lote(db: Session, limite: int, duracao_reserva: int) -> list:
+        """
+        Reserva até `limite` envios para este worker e os retorna.
+
+        A reserva é um UPDATE condicional marcado com um identificador do worker:
+        se dois workers escolherem os mesmos ids, só um deles os leva. Funciona
+        igual em MySQL e SQLite, sem SELECT ... FOR UPDATE.
+        """
+        agora = datetime.now()
+        ids = db.execute(
+            select(SubmissaoProva.id)
+            .where(SubmissaoProvaDAO._condicao_disponivel(agora))
+            .order_by(SubmissaoProva.id)
+            .limit(limite)
+        ).scalars().all()
+        if not ids:
+            return []
+
+        reserva = str(uuid.uuid4())
+        db.execute(
+            update(SubmissaoProva)
+            .where(SubmissaoProva.id.in_(ids), SubmissaoProvaDAO._condicao_disponivel(agora))
+            .values(
+                status=StatusSubmissao.PROCESSANDO,
+                reservada_por=reserva,
+                reservada_ate=agora + timedelta(seconds=duracao_reserva),
+                tentativas=SubmissaoProva.tentativas + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return db.query(SubmissaoProva).filter(SubmissaoProva.reservada_por == reserva).order_by(SubmissaoProva.id).all()
+
+    @staticmethod
+    def finalizar(db: Session, submissao: SubmissaoProva, status: StatusSubmissao,
+                  resultado_id: Optional[int] = None, erro: Optional[str] = None):
+        """Registra o desfecho do processamento (sem commit)."""
+        submissao.status = status
+        submissao.resultado_id = resultado_id
+        submissao.erro = erro[:255] if erro else None
+        submissao.reservada_ate = None
+        submissao.data_processamento = datetime.now()
+
+    @staticmethod
+    def get_do_aluno(db: Session, submissao_id: int, aluno_id: int) -> Optional[SubmissaoProva]:
+        return db.query(SubmissaoProva).filter(
+            SubmissaoProva.id == submissao_id, SubmissaoProva.aluno_id == aluno_id
+        ).first()
+
+    @staticmethod
+    def contar_por_status(db: Session) -> dict:
+        linhas = db.query(SubmissaoProva.status, func.count(SubmissaoProva.id)).group_by(SubmissaoProva.status).all()
+        return {status.value: total for status, total in linhas}
+
+    @staticmethod
+    def delete_by_aluno(db: Session, aluno_id: int):
+        """Apaga os envios do aluno (exclusão do aluno, sem commit)."""
+        db.execute(delete(SubmissaoProva).where(SubmissaoProva.aluno_id == aluno_id))
+
+    @staticmethod
+    def delete_by_prova(db: Session, prova_id: int):
+        """Apaga os envios da prova (exclusão da prova, sem commit)."""
+        db.execute(delete(SubmissaoProva).where(SubmissaoProva.prova_id == prova_id))
+
+    @staticmethod
+    def remover_finalizadas(db: Session, antes_de: datetime) -> int:
+        """
+        Apaga os envios já processados (concluídos, recusados ou com erro) antes de
+        `antes_de`: cada um guarda o JSON completo das respostas. Retorna quantos apagou.
+        """
+        removidas = db.execute(
+            delete(SubmissaoProva).where(
+                SubmissaoProva.status.in_([StatusSubmissao.CONCLUIDA, StatusSubmissao.RECUSADA, StatusSubmissao.ERRO]),
+                SubmissaoProva.data_processamento < antes_de
+            )
+        ).rowcount
+        db.commit()
+        return removidas
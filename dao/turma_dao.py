@@ -110,6 +110,10 @@ class TurmaDAO:
         if not turma:
             return False
         
+        # Matrículas e disponibilizações saem em cascata: descontar o grupo da turma antes
+        from models.aluno_turma import AlunoTurma
+        from services.resumo_service import ResumoService
+        ResumoService.desvincular_turma(db, AlunoTurma.turma_id == turma_id)
         db.delete(turma)
         db.commit()
         return True
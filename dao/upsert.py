@@ -0,0 +1,67 @@
+"""
+INSERT com tratamento de conflito de chave única, no dialeto do banco em uso
+(MySQL em produção, SQLite nos testes).
+"""
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+ER_DUP_ENTRY = 1062  # MySQL: valor duplicado em índice único
+
+
+def _insert(db: Session, modelo):
+    """Retorna o insert() específico do dialeto da sessão."""
+    dialeto = db.get_bind().dialect.name
+    if dialeto == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    elif dialeto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialeto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"Upsert não suportado para o dialeto {dialeto}")
+    return dialeto, insert(modelo)
+
+
+def inserir_se_ausente(db: Session, modelo, valores: dict, chaves: list) -> bool:
+    """
+    Insere a linha, a menos que já exista uma com as mesmas `chaves` (índice único).
+    Retorna True se a linha foi inserida. Sem leitura prévia: o próprio índice
+    único decide, e uma transação concorrente espera a outra terminar. Qualquer
+    outro erro (chave estrangeira, NOT NULL, truncamento) é levantado.
+    """
+    dialeto, comando = _insert(db, modelo)
+    if dialeto != "mysql":
+        comando = comando.on_conflict_do_nothing(index_elements=chaves)
+        return db.execute(comando.values(**valores)).rowcount == 1
+
+    # INSERT IGNORE transformaria em aviso todos os erros, não só a chave duplicada:
+    # insere num savepoint e só o conflito de índice único conta como "já existe"
+    try:
+        with db.begin_nested():
+            db.execute(comando.values(**valores))
+        return True
+    except IntegrityError as erro:
+        if _chave_duplicada(erro):
+            return False
+        raise
+
+
+def _chave_duplicada(erro: IntegrityError) -> bool:
+    """True se o erro do MySQL é de valor duplicado em índice único."""
+    argumentos = getattr(erro.orig, "args", ())
+    return bool(argumentos) and argumentos[0] == ER_DUP_ENTRY
+
+
+def inserir_ou_atualizar(db: Session, modelo, linhas: list, chaves: list, atualizar: list):
+    """Insere as linhas em lote; nas que já existem (mesmas `chaves`), atualiza as colunas `atualizar`."""
+    if not linhas:
+        return
+    dialeto, comando = _insert(db, modelo)
+    if dialeto == "mysql":
+        comando = comando.on_duplicate_key_update({coluna: comando.inserted[coluna] for coluna in atualizar})
+    else:
+        comando = comando.on_conflict_do_update(
+            index_elements=chaves,
+            set_={coluna: comando.excluded[coluna] for coluna in atualizar}
+        )
+    db.execute(comando, linhas)
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from models.usuario import Usuario
-from passlib.hash import bcrypt
+from utils.senha_service import gerar_hash
 
 class UsuarioDAO:
     @staticmethod
@@ -9,7 +9,7 @@ class UsuarioDAO:
 
     @staticmethod
     def create(db: Session, email: str, senha: str):
-        senha_hash = bcrypt.hash(senha)
+        senha_hash = gerar_hash(senha)
         novo_usuario = Usuario(email=email, senha_hash=senha_hash, tipo="aluno")
         db.add(novo_usuario)
         db.commit()
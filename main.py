@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from controllers.usuario_controller import router as usuario_router
@@ -16,14 +17,28 @@ from dao.database import engine, Base
 from dao.cadastrarGestor import criar_gestor_padrao
 from dao.criar_campus import criar_campus_iniciais
 from dao.migrar_banco import migrar_banco
+from dao.reconstruir_resumos import reconstruir_resumos
+from services.agendador_service import criar_agendador
+from utils.export_service import encerrar_pool_pdf
 
 Base.metadata.create_all(bind=engine)
 
 migrar_banco()
+reconstruir_resumos(somente_se_vazio=True)
 criar_gestor_padrao()
 criar_campus_iniciais()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tarefas periódicas (ex.: expiração de provas) fora do caminho das requisições
+    agendador = criar_agendador()
+    agendador.iniciar()
+    yield
+    await agendador.parar()
+    encerrar_pool_pdf()
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="templates/static"), name="static")
 
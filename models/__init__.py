@@ -10,10 +10,16 @@ from .prova_questao import ProvaQuestao
 from .prova_turma import ProvaTurma, StatusProvaTurma
 from .notificacao_professor import NotificacaoProfessor, TipoNotificacaoProfessor
 from .resposta_formulario import RespostaFormulario
+from .resposta_formulario_opcao import RespostaFormularioOpcao
 from .notificacao import Notificacao
 from .resposta import Resposta
 from .resultado import Resultado
 from .prova import Prova
 from .questao import Questao
 from .formulario import Formulario
-from .pergunta_formulario import PerguntaFormulario
\ No newline at end of file
+from .pergunta_formulario import PerguntaFormulario
+from .resumo_desempenho import ResumoDesempenho
+from .contagem_formulario import ContagemFormulario
+from .materia import Materia
+from .submissao_prova import SubmissaoProva, StatusSubmissao
+from .relatorio_job import RelatorioJob, StatusRelatorioJob
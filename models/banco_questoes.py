@@ -1,7 +1,9 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Text, Boolean
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from dao.database import Base
+from utils.materia_service import sincronizar_materia_id
 import enum
 
 class StatusQuestao(enum.Enum):
@@ -22,6 +24,7 @@ class BancoQuestoes(Base):
     opcao_e = Column(String(500), nullable=False)
     resposta_correta = Column(String(1), nullable=False)  # A, B, C, D ou E
     materia = Column(String(100), nullable=False)
+    materia_id = Column(Integer, ForeignKey('materias.id'), nullable=True, index=True)  # preenchido a partir de materia
     status = Column(Enum(StatusQuestao), default=StatusQuestao.ATIVA, nullable=False)
     publica = Column(Boolean, default=False, nullable=False)  # True = pública (outros professores podem usar), False = privada
     data_criacao = Column(DateTime, server_default=func.current_timestamp())
@@ -29,3 +32,6 @@ class BancoQuestoes(Base):
     # Relacionamentos
     professor = relationship("Professor", back_populates="banco_questoes")
     prova_questoes = relationship("ProvaQuestao", back_populates="questao_banco", cascade="all, delete-orphan")
+
+event.listen(BancoQuestoes, "before_insert", sincronizar_materia_id)
+event.listen(BancoQuestoes, "before_update", sincronizar_materia_id)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint, func
+from dao.database import Base
+
+class ContagemFormulario(Base):
+    """
+    Contadores das respostas de cada formulário, atualizados na mesma transação
+    do envio (ver services/contagem_formulario_service.py) e reconstruíveis a
+    partir de respostas_formulario. O painel de resultados lê estas linhas
+    (uma por opção) em vez de varrer as respostas.
+
+    pergunta_id = 0 e opcao = '': alunos que responderam ao formulário
+    opcao = '': respostas da pergunta
+    demais linhas: vezes que a opção foi marcada na pergunta
+    """
+    __tablename__ = "contagens_formulario"
+    __table_args__ = (
+        UniqueConstraint('formulario_id', 'pergunta_id', 'opcao', name='uq_contagem_formulario_pergunta_opcao'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    formulario_id = Column(Integer, nullable=False)
+    pergunta_id = Column(Integer, nullable=False)
+    opcao = Column(String(255), nullable=False, default='')
+    quantidade = Column(Integer, nullable=False, default=0)
+    data_atualizacao = Column(DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
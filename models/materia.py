@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from dao.database import Base
+
+class Materia(Base):
+    """
+    Dimensão de matérias. Cada variação de escrita de Prova.materia e
+    BancoQuestoes.materia ("Português", "portugues", ...) aponta, via materia_id,
+    para a mesma linha, identificada pela chave normalizada ("portugues").
+    """
+    __tablename__ = "materias"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chave = Column(String(100), unique=True, nullable=False)  # ver utils/materia_service.normalizar_materia
+    nome = Column(String(100), nullable=False)  # nome de exibição ("Português")
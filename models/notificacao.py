@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Boolean, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Boolean, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from dao.database import Base
 
 class Notificacao(Base):
     __tablename__ = "notificacoes"
+    __table_args__ = (
+        # Busca de notificações por aluno e formulário (link) nas sincronizações
+        Index("ix_notificacoes_aluno_link", "aluno_id", "link"),
+        # Notificações (não lidas) do aluno, mais recentes primeiro
+        Index("ix_notificacoes_aluno_lida_data", "aluno_id", "lida", "data_criacao"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     aluno_id = Column(Integer, ForeignKey("alunos.idAluno"), nullable=False)
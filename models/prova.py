@@ -1,7 +1,9 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
 from sqlalchemy import TIMESTAMP, func
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 from dao.database import Base
+from utils.materia_service import sincronizar_materia_id
 
 class Prova(Base):
     __tablename__ = "provas"
@@ -9,6 +11,7 @@ class Prova(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     titulo = Column(String(255), nullable=False)
     materia = Column(String(100), nullable=False)
+    materia_id = Column(Integer, ForeignKey('materias.id'), nullable=True, index=True)  # preenchido a partir de materia
     professor_id = Column(Integer, ForeignKey('professores.id'), nullable=False)
     status = Column(String(50), default="rascunho", nullable=False)
     data_criacao = Column(TIMESTAMP, server_default=func.current_timestamp())
@@ -20,3 +23,6 @@ class Prova(Base):
     resultados = relationship("Resultado", back_populates="prova", cascade="all, delete-orphan")
     prova_questoes = relationship("ProvaQuestao", back_populates="prova", cascade="all, delete-orphan")
     prova_turmas = relationship("ProvaTurma", back_populates="prova", cascade="all, delete-orphan")
+
+event.listen(Prova, "before_insert", sincronizar_materia_id)
+event.listen(Prova, "before_update", sincronizar_materia_id)
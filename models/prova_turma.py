@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime
 from dao.database import Base
 import enum
 
@@ -11,6 +12,10 @@ class StatusProvaTurma(enum.Enum):
 
 class ProvaTurma(Base):
     __tablename__ = 'prova_turmas'
+    __table_args__ = (
+        # Varredura de expiração do agendador (status ATIVA e prazo vencido)
+        Index('ix_prova_turmas_status_expiracao', 'status', 'data_expiracao'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     prova_id = Column(Integer, ForeignKey('provas.id'), nullable=False)
@@ -25,3 +30,13 @@ class ProvaTurma(Base):
     prova = relationship("Prova", back_populates="prova_turmas")
     turma = relationship("Turma", back_populates="prova_turmas")
     professor = relationship("Professor", back_populates="prova_turmas")
+
+    @property
+    def status_efetivo(self):
+        """
+        Status considerando o prazo: uma disponibilização ATIVA com prazo vencido
+        já é tratada como EXPIRADA, mesmo antes de o agendador gravar a mudança.
+        """
+        if self.status == StatusProvaTurma.ATIVA and self.data_expiracao and self.data_expiracao < datetime.now():
+            return StatusProvaTurma.EXPIRADA
+        return self.status
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Enum, Index
+from sqlalchemy.sql import func
+from dao.database import Base
+import enum
+
+class StatusRelatorioJob(enum.Enum):
+    PENDENTE = "pendente"
+    PROCESSANDO = "processando"
+    CONCLUIDO = "concluido"
+    ERRO = "erro"
+    EXPIRADO = "expirado"  # arquivo removido após a validade
+
+# Pedidos de relatório (DOCX/PDF) gerados em segundo plano pelos workers do agendador
+class RelatorioJob(Base):
+    __tablename__ = 'relatorio_jobs'
+    __table_args__ = (
+        # Reserva do próximo pedido pelos workers
+        Index('ix_relatorio_jobs_status_id', 'status', 'id'),
+        # Limpeza dos arquivos vencidos
+        Index('ix_relatorio_jobs_status_expira_em', 'status', 'expira_em'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tipo = Column(String(50), nullable=False)
+    parametros = Column(Text, nullable=False)  # JSON
+    solicitante_id = Column(Integer, ForeignKey('usuarios.id', ondelete='CASCADE'), nullable=False)
+    # sha256 de tipo + parâmetros enquanto o pedido está na fila ou em geração; NULL depois.
+    # Único: pedidos idênticos em andamento viram o mesmo job.
+    chave_ativa = Column(String(64), nullable=True, unique=True)
+    status = Column(Enum(StatusRelatorioJob), default=StatusRelatorioJob.PENDENTE, nullable=False)
+    tentativas = Column(Integer, default=0, nullable=False)
+    reservada_por = Column(String(36), nullable=True)
+    reservada_ate = Column(DateTime, nullable=True)
+    arquivo = Column(String(255), nullable=True)  # caminho dentro de RELATORIOS_DIR
+    nome_arquivo = Column(String(255), nullable=True)  # nome sugerido no download
+    media_type = Column(String(100), nullable=True)
+    erro = Column(String(255), nullable=True)
+    data_criacao = Column(DateTime, server_default=func.current_timestamp())
+    data_conclusao = Column(DateTime, nullable=True)
+    expira_em = Column(DateTime, nullable=True)
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from dao.database import Base
 from sqlalchemy.orm import relationship
 
 class Resposta(Base):
     __tablename__ = "respostas"
+    __table_args__ = (
+        # Uma resposta por aluno e questão: o envio grava com upsert
+        Index('uq_respostas_aluno_questao', 'aluno_id', 'questao_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     aluno_id = Column(Integer, ForeignKey("alunos.idAluno"), nullable=False)
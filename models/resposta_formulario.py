@@ -1,9 +1,17 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from dao.database import Base
 
 class RespostaFormulario(Base):
     __tablename__ = "respostas_formulario"
+    __table_args__ = (
+        # "O aluno já respondeu?" (anti-join dos formulários pendentes)
+        Index("ix_respostas_formulario_aluno_formulario", "aluno_id", "formulario_id"),
+        # Respostas por pergunta nas análises do formulário
+        Index("ix_respostas_formulario_formulario_pergunta", "formulario_id", "pergunta_id"),
+        # Lista e contagem de respondedores de um formulário (keyset por aluno_id)
+        Index("ix_respostas_formulario_formulario_aluno", "formulario_id", "aluno_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     aluno_id = Column(Integer, ForeignKey("alunos.idAluno"), nullable=False)
@@ -16,3 +24,4 @@ class RespostaFormulario(Base):
     aluno = relationship("Aluno", back_populates="respostas_formulario") ## -> CORRIGIDO
     formulario = relationship("Formulario", back_populates="respostas") ## -> CORRIGIDO
     pergunta = relationship("PerguntaFormulario", back_populates="respostas")
+    opcoes_marcadas = relationship("RespostaFormularioOpcao", cascade="all, delete-orphan", passive_deletes=True)
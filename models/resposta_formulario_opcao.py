@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from dao.database import Base
+
+# Opções marcadas em cada resposta de pergunta de escolha (uma linha por opção).
+# Formulário e pergunta repetidos aqui para a contagem das análises ser um GROUP BY indexado.
+class RespostaFormularioOpcao(Base):
+    __tablename__ = "respostas_formulario_opcoes"
+    __table_args__ = (
+        # Contagem por opção nas análises do formulário
+        Index("ix_respostas_formulario_opcoes_contagem", "formulario_id", "pergunta_id", "opcao"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    resposta_id = Column(Integer, ForeignKey("respostas_formulario.id", ondelete="CASCADE"), nullable=False, index=True)
+    formulario_id = Column(Integer, nullable=False)
+    pergunta_id = Column(Integer, nullable=False)
+    opcao_index = Column(Integer, nullable=True)  # posição em PerguntaFormulario.opcoes; None se fora da lista
+    opcao = Column(String(255), nullable=False)  # texto marcado (rótulo do gráfico, mesmo se a lista mudar)
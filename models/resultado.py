@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, ForeignKey, Enum, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Float, Index
 from dao.database import Base
 from sqlalchemy.orm import relationship
 
 class Resultado(Base):
     __tablename__ = 'resultados'
+    __table_args__ = (
+        # Um resultado por aluno e prova: o envio usa o índice para ignorar reenvios
+        Index('uq_resultados_aluno_prova', 'aluno_id', 'prova_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     aluno_id = Column(Integer, ForeignKey('alunos.idAluno'), nullable=False)
@@ -12,6 +16,7 @@ class Resultado(Base):
     situacao = Column(Enum('Insuficiente', 'Regular', 'Suficiente'), nullable=False)
     nota = Column(Float, nullable=False)
     total_questoes = Column(Integer, nullable=False)
+    token_submissao = Column(String(36), nullable=True)  # token do formulário que gerou o resultado
 
     aluno = relationship("Aluno", back_populates="resultados")
     prova = relationship("Prova", back_populates="resultados")
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint, func
+from dao.database import Base
+
+class ResumoDesempenho(Base):
+    """
+    Resumo materializado dos resultados de prova, agrupado por dimensão.
+    Atualizado de forma incremental a cada Resultado gravado
+    (ver services/resumo_service.py) e reconstruível com dao/reconstruir_resumos.py.
+
+    dimensao: 'prova', 'turma', 'materia', 'curso_ano' ou 'municipio'
+    chave: id da prova/turma, chave normalizada da matéria (materias.chave), "curso|ano" ou município
+    """
+    __tablename__ = "resumos_desempenho"
+    __table_args__ = (
+        UniqueConstraint('dimensao', 'chave', name='uq_resumo_dimensao_chave'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    dimensao = Column(String(20), nullable=False)
+    chave = Column(String(255), nullable=False)
+    total_resultados = Column(Integer, nullable=False, default=0)
+    soma_acertos = Column(Integer, nullable=False, default=0)
+    soma_notas = Column(Float, nullable=False, default=0)
+    qtd_acertos_7 = Column(Integer, nullable=False, default=0)
+    qtd_insuficiente = Column(Integer, nullable=False, default=0)
+    qtd_regular = Column(Integer, nullable=False, default=0)
+    qtd_suficiente = Column(Integer, nullable=False, default=0)
+    data_atualizacao = Column(DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
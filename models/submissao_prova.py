@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Enum, Index
+from sqlalchemy.sql import func
+from dao.database import Base
+import enum
+
+class StatusSubmissao(enum.Enum):
+    PENDENTE = "pendente"
+    PROCESSANDO = "processando"
+    CONCLUIDA = "concluida"
+    RECUSADA = "recusada"  # o aluno já tinha resultado na prova
+    ERRO = "erro"
+
+# Fila (outbox) de envios de prova, corrigidos depois pelos workers do agendador
+class SubmissaoProva(Base):
+    __tablename__ = 'submissoes_prova'
+    __table_args__ = (
+        # Reserva do próximo lote pelos workers
+        Index('ix_submissoes_prova_status_id', 'status', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    aluno_id = Column(Integer, ForeignKey('alunos.idAluno', ondelete='CASCADE'), nullable=False)
+    prova_id = Column(Integer, ForeignKey('provas.id', ondelete='CASCADE'), nullable=False)
+    token_submissao = Column(String(36), nullable=False, unique=True)  # reenvios do mesmo formulário não duplicam
+    respostas = Column(Text, nullable=False)  # JSON {questao_id: alternativa}
+    status = Column(Enum(StatusSubmissao), default=StatusSubmissao.PENDENTE, nullable=False)
+    tentativas = Column(Integer, default=0, nullable=False)
+    reservada_por = Column(String(36), nullable=True)  # worker que reservou o envio
+    reservada_ate = Column(DateTime, nullable=True)  # após esse prazo outro worker pode assumir
+    resultado_id = Column(Integer, ForeignKey('resultados.id', ondelete='SET NULL'), nullable=True)
+    erro = Column(String(255), nullable=True)
+    data_criacao = Column(DateTime, server_default=func.current_timestamp())
+    data_processamento = Column(DateTime, nullable=True)
@@ -9,6 +9,7 @@ class Usuario(Base):
     email = Column(String(255), unique=True, nullable=False)
     senha_hash = Column(String(255), nullable=False)
     tipo = Column(String(50), nullable=False)  # Aluno, Gestor, Professor
+    versao_sessao = Column(Integer, nullable=False, default=0, server_default='0')  # incrementada para revogar sessões
 
     aluno = relationship("Aluno", back_populates="usuario", uselist=False, cascade="all, delete-orphan")
     gestor = relationship("Gestor", back_populates="usuario", uselist=False, cascade="all, delete-orphan")
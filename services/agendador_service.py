@@ -0,0 +1,230 @@
+"""
+Agendador de tarefas em segundo plano, iniciado no lifespan do FastAPI (main.py).
+
+Cada tarefa roda periodicamente em uma thread (para não bloquear o event loop)
+com uma sessão própria do banco. Tarefas marcadas como `somente_lider` rodam em
+apenas um processo quando há vários workers do uvicorn: o líder é quem obtém o
+lock (GET_LOCK no MySQL; lock de arquivo nos demais bancos). Se o líder cair, o
+lock é liberado e outro worker assume na próxima verificação.
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+try:
+    import fcntl
+    has_fcntl = True
+except ImportError:  # Windows: sem lock entre processos, cada processo é líder
+    has_fcntl = False
+
+INTERVALO_EXPIRACAO = int(os.getenv("AGENDADOR_INTERVALO_EXPIRACAO", "60"))
+INTERVALO_FORMULARIOS = int(os.getenv("AGENDADOR_INTERVALO_FORMULARIOS", "900"))
+# Workers da fila de envios de prova (só com PROVAS_ENVIO_EM_FILA=1); rodam em todos os processos
+FILA_WORKERS = int(os.getenv("FILA_SUBMISSOES_WORKERS", "4"))
+FILA_LOTE = int(os.getenv("FILA_SUBMISSOES_LOTE", "50"))
+FILA_RESERVA = int(os.getenv("FILA_SUBMISSOES_RESERVA", "60"))
+# Envios já processados ficam na fila por esse número de dias (consulta de status pelo aluno)
+FILA_RETENCAO_DIAS = int(os.getenv("FILA_SUBMISSOES_RETENCAO_DIAS", "7"))
+INTERVALO_LIMPEZA_SUBMISSOES = int(os.getenv("AGENDADOR_INTERVALO_LIMPEZA_SUBMISSOES", "3600"))
+# Workers dos pedidos de relatório (services/relatorio_jobs_service.py); rodam em todos os processos
+RELATORIOS_WORKERS = int(os.getenv("RELATORIOS_WORKERS", "2"))
+RELATORIOS_INTERVALO = int(os.getenv("RELATORIOS_INTERVALO", "2"))
+RELATORIOS_RESERVA = int(os.getenv("RELATORIOS_RESERVA", "300"))
+INTERVALO_LIMPEZA_RELATORIOS = int(os.getenv("AGENDADOR_INTERVALO_LIMPEZA_RELATORIOS", "600"))
+
+
+class LockLider:
+    """Lock não bloqueante que elege um único processo líder."""
+
+    def __init__(self, nome: str, engine=None):
+        self.nome = nome
+        self.engine = engine
+        self._conexao = None
+        self._arquivo = None
+
+    def adquirir(self) -> bool:
+        if self.engine is not None and self.engine.dialect.name == "mysql":
+            return self._adquirir_mysql()
+        return self._adquirir_arquivo()
+
+    def _adquirir_mysql(self) -> bool:
+        # O lock pertence à conexão: ela fica reservada enquanto este processo for líder
+        if self._conexao is not None:
+            try:
+                dono = self._conexao.execute(
+                    text("SELECT IS_USED_LOCK(:nome) = CONNECTION_ID()"), {"nome": self.nome}
+                ).scalar()
+                if dono:
+                    return True
+            except Exception:
+                pass
+            self.liberar()
+        conexao = self.engine.connect()
+        if conexao.execute(text("SELECT GET_LOCK(:nome, 0)"), {"nome": self.nome}).scalar() == 1:
+            self._conexao = conexao
+            return True
+        conexao.close()
+        return False
+
+    def _adquirir_arquivo(self) -> bool:
+        if not has_fcntl:
+            return True
+        if self._arquivo is not None:
+            return True
+        arquivo = open(os.path.join(tempfile.gettempdir(), f"{self.nome}.lock"), "w")
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.close()
+            return False
+        self._arquivo = arquivo
+        return True
+
+    def liberar(self):
+        if self._conexao is not None:
+            try:
+                self._conexao.execute(text("SELECT RELEASE_LOCK(:nome)"), {"nome": self.nome})
+            except Exception:
+                pass
+            self._conexao.close()
+            self._conexao = None
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+
+class Agendador:
+    """Executa tarefas periódicas registradas com `registrar`."""
+
+    def __init__(self, fabrica_sessao=None, engine=None):
+        self.fabrica_sessao = fabrica_sessao
+        self.lider = LockLider("dipe_agendador", engine)
+        self.tarefas = []
+        self._tasks = []
+
+    def registrar(self, nome: str, funcao, intervalo: int, somente_lider: bool = True):
+        """
+        Registra `funcao(db)`. Se ela retornar um número, ele é usado como
+        segundos até a próxima execução (limitado a `intervalo`).
+        """
+        self.tarefas.append({"nome": nome, "funcao": funcao, "intervalo": intervalo, "somente_lider": somente_lider})
+
+    def _executar_com_sessao(self, funcao):
+        db = self.fabrica_sessao()
+        try:
+            return funcao(db)
+        finally:
+            db.close()
+
+    async def _laco(self, tarefa):
+        while True:
+            espera = tarefa["intervalo"]
+            try:
+                if not tarefa["somente_lider"] or self.lider.adquirir():
+                    proxima = await asyncio.to_thread(self._executar_com_sessao, tarefa["funcao"])
+                    if isinstance(proxima, (int, float)):
+                        espera = max(1, min(espera, proxima))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erro na tarefa agendada '{tarefa['nome']}': {e}")
+            await asyncio.sleep(espera)
+
+    def iniciar(self):
+        if self.fabrica_sessao is None:
+            return
+        self._tasks = [asyncio.create_task(self._laco(tarefa)) for tarefa in self.tarefas]
+
+    async def parar(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.lider.liberar()
+
+
+def tarefa_expirar_provas(db):
+    """Marca como expiradas as disponibilizações vencidas e agenda a próxima verificação."""
+    from dao.prova_turma_dao import ProvaTurmaDAO
+
+    expiradas = ProvaTurmaDAO.check_and_update_expired(db)
+    if expiradas:
+        print(f"Agendador: {expiradas} disponibilização(ões) de prova expirada(s).")
+    proxima = ProvaTurmaDAO.get_proxima_expiracao(db)
+    if proxima is None:
+        return None
+    return (proxima - datetime.now()).total_seconds() + 1
+
+
+def tarefa_notificar_formularios_pendentes(db):
+    """Reconcilia as notificações de formulários de todos os alunos (remove obsoletas, cria pendentes)."""
+    from dao.notificacao_dao import NotificacaoDAO
+
+    removidas = NotificacaoDAO.remover_notificacoes_obsoletas(db)
+    if removidas:
+        print(f"Agendador: {removidas} notificação(ões) de formulário obsoleta(s) removida(s).")
+    criadas = NotificacaoDAO.verificar_formularios_nao_respondidos(db)
+    if criadas:
+        print(f"Agendador: {criadas} notificação(ões) de formulário pendente criada(s).")
+
+
+def tarefa_processar_submissoes(db):
+    """Corrige os envios de prova da fila; volta a verificar em 1 segundo."""
+    from services.correcao_service import CorrecaoService
+
+    processadas = CorrecaoService.processar_fila(db, FILA_LOTE, FILA_RESERVA)
+    if processadas:
+        print(f"Agendador: {processadas} envio(s) de prova processado(s).")
+    return 1
+
+
+def tarefa_remover_submissoes_finalizadas(db):
+    """Apaga da fila os envios de prova processados há mais de FILA_RETENCAO_DIAS dias."""
+    from dao.submissao_prova_dao import SubmissaoProvaDAO
+
+    removidas = SubmissaoProvaDAO.remover_finalizadas(db, datetime.now() - timedelta(days=FILA_RETENCAO_DIAS))
+    if removidas:
+        print(f"Agendador: {removidas} envio(s) de prova antigo(s) removido(s) da fila.")
+
+
+def tarefa_gerar_relatorios(db):
+    """Gera os relatórios pedidos pelos gestores."""
+    from services.relatorio_jobs_service import RelatorioJobService
+
+    gerados = RelatorioJobService.processar_pendentes(db, RELATORIOS_RESERVA)
+    if gerados:
+        print(f"Agendador: {gerados} relatório(s) gerado(s).")
+
+
+def tarefa_remover_relatorios_vencidos(db):
+    """Apaga os arquivos de relatório cuja validade venceu."""
+    from services.relatorio_jobs_service import RelatorioJobService
+
+    removidos = RelatorioJobService.remover_vencidos(db)
+    if removidos:
+        print(f"Agendador: {removidos} relatório(s) vencido(s) removido(s).")
+
+
+def criar_agendador():
+    """Agendador da aplicação com as tarefas padrão registradas."""
+    from dao.database import SessionLocal, engine
+
+    agendador = Agendador(SessionLocal, engine)
+    agendador.registrar("expirar_provas", tarefa_expirar_provas, INTERVALO_EXPIRACAO)
+    agendador.registrar("formularios_pendentes", tarefa_notificar_formularios_pendentes, INTERVALO_FORMULARIOS)
+    agendador.registrar("limpar_relatorios", tarefa_remover_relatorios_vencidos, INTERVALO_LIMPEZA_RELATORIOS)
+    # Fora do modo fila também: apaga o que ficou de quando ele estava ligado
+    agendador.registrar("limpar_submissoes", tarefa_remover_submissoes_finalizadas, INTERVALO_LIMPEZA_SUBMISSOES)
+    # A reserva condicional (RelatorioJobDAO.reservar) permite vários workers em vários processos
+    for numero in range(1, RELATORIOS_WORKERS + 1):
+        agendador.registrar(f"relatorios_{numero}", tarefa_gerar_relatorios, RELATORIOS_INTERVALO, somente_lider=False)
+
+    from services.correcao_service import ENVIO_EM_FILA
+    if ENVIO_EM_FILA:
+        # A reserva por lote (SubmissaoProvaDAO.reservar_lote) permite vários workers em vários processos
+        for numero in range(1, FILA_WORKERS + 1):
+            agendador.registrar(f"fila_submissoes_{numero}", tarefa_processar_submissoes, 1, somente_lider=False)
+    return agendador
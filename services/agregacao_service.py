@@ -0,0 +1,116 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, union_all, literal, cast, case, distinct, String
+from models.aluno import Aluno
+from models.professor import Professor
+from models.gestor import Gestor
+from models.resultado import Resultado
+from models.resumo_desempenho import ResumoDesempenho
+from models.turma import Turma
+from services.resumo_service import ResumoService
+
+
+class AgregacaoService:
+    """
+    Camada de agregação dos dashboards.
+    Cada método executa uma única instrução SQL agrupada e devolve apenas
+    linhas por grupo (nunca uma linha por resultado ou por aluno).
+    Os números de resultados vêm do resumo materializado (ResumoService).
+    """
+
+    @staticmethod
+    def totais_usuarios(db: Session) -> dict:
+        """Contagens de alunos, professores e gestores."""
+        linha = db.execute(select(
+            select(func.count(Aluno.idAluno)).scalar_subquery().label('total_alunos'),
+            select(func.count(Professor.id)).scalar_subquery().label('total_professores'),
+            select(func.count(Gestor.id)).scalar_subquery().label('total_gestores')
+        )).one()
+        return dict(linha._mapping)
+
+    @staticmethod
+    def resumo_resultados(db: Session) -> dict:
+        """
+        Totais de resultados (soma de acertos, quantidade com 7 ou mais
+        acertos, contagem por situação) lidos do resumo materializado por
+        prova, mais a participação de alunos.
+        """
+        linha = db.query(
+            func.coalesce(func.sum(ResumoDesempenho.total_resultados), 0).label('total_resultados'),
+            func.coalesce(func.sum(ResumoDesempenho.soma_acertos), 0).label('soma_acertos'),
+            func.coalesce(func.sum(ResumoDesempenho.qtd_acertos_7), 0).label('qtd_acertos_7'),
+            func.coalesce(func.sum(ResumoDesempenho.qtd_insuficiente), 0).label('qtd_insuficiente'),
+            func.coalesce(func.sum(ResumoDesempenho.qtd_regular), 0).label('qtd_regular'),
+            func.coalesce(func.sum(ResumoDesempenho.qtd_suficiente), 0).label('qtd_suficiente'),
+            func.coalesce(func.sum(case((ResumoDesempenho.total_resultados > 0, 1), else_=0)), 0).label('provas_com_resultado'),
+            select(func.count(distinct(Resultado.aluno_id))).scalar_subquery().label('alunos_com_resultado')
+        ).filter(ResumoDesempenho.dimensao == 'prova').one()
+        return {chave: int(valor or 0) for chave, valor in linha._mapping.items()}
+
+    @staticmethod
+    def distribuicoes_alunos(db: Session) -> dict:
+        """
+        Quantidade de alunos por zona, município, idade, curso e ano.
+        Retorna {dimensao: [(valor, total), ...]} a partir de um UNION ALL.
+        """
+        def grupo(dimensao, coluna):
+            return select(
+                literal(dimensao).label('dimensao'),
+                cast(coluna, String(255)).label('valor'),
+                func.count(Aluno.idAluno).label('total')
+            ).group_by(coluna)
+
+        consulta = union_all(
+            grupo('zona', Aluno.zona),
+            grupo('municipio', Aluno.municipio),
+            grupo('idade', Aluno.idade),
+            grupo('curso', Aluno.curso),
+            grupo('ano', Aluno.ano)
+        )
+        distribuicoes = {'zona': [], 'municipio': [], 'idade': [], 'curso': [], 'ano': []}
+        for dimensao, valor, total in db.execute(consulta):
+            distribuicoes[dimensao].append((valor, total))
+        return distribuicoes
+
+    @staticmethod
+    def somas_por_grupo(db: Session) -> dict:
+        """
+        Soma e quantidade de acertos por curso, por ano do aluno e por matéria,
+        a partir do resumo materializado (uma linha por grupo).
+        Retorna {dimensao: {valor: (soma_acertos, total_resultados)}}.
+        """
+        resumo = ResumoService.por_dimensao(db, 'curso_ano', 'materia')
+        somas = {'curso': {}, 'ano': {}, 'materia': {}}
+
+        def acumular(dimensao, valor, linha):
+            soma, total = somas[dimensao].get(valor, (0.0, 0))
+            somas[dimensao][valor] = (soma + linha['soma_acertos'], total + linha['total_resultados'])
+
+        for chave, linha in resumo['curso_ano'].items():
+            if not linha['total_resultados']:
+                continue
+            curso, ano = chave.rsplit('|', 1)
+            acumular('curso', curso, linha)
+            acumular('ano', ano or None, linha)
+        for materia, linha in resumo['materia'].items():
+            if linha['total_resultados']:
+                acumular('materia', materia, linha)
+        return somas
+
+    @staticmethod
+    def medias_por_turma(db: Session) -> dict:
+        """
+        Média de acertos por turma, lida da dimensão 'turma' do resumo
+        materializado (uma linha por turma com resultado), em ordem de nome.
+        Retorna {'labels': [nomes], 'data': [médias]}.
+        """
+        linhas = db.query(
+            Turma.nome, ResumoDesempenho.soma_acertos, ResumoDesempenho.total_resultados
+        ).join(
+            ResumoDesempenho, ResumoDesempenho.chave == cast(Turma.id, String(255))
+        ).filter(
+            ResumoDesempenho.dimensao == 'turma', ResumoDesempenho.total_resultados > 0
+        ).order_by(Turma.nome, Turma.id).all()
+        return {
+            'labels': [nome for nome, _, _ in linhas],
+            'data': [round(soma / total, 2) for _, soma, total in linhas]
+        }
@@ -0,0 +1,147 @@
+from collections import Counter
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, union_all, literal, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from models.contagem_formulario import ContagemFormulario
+from models.resposta_formulario import RespostaFormulario
+from models.resposta_formulario_opcao import RespostaFormularioOpcao
+
+PERGUNTA_RESPONDEDORES = 0
+OPCAO_TOTAL = ''
+
+
+class ContagemFormularioService:
+    """
+    Mantém a tabela contagens_formulario: quantos alunos responderam a cada
+    formulário, quantas respostas cada pergunta recebeu e quantas vezes cada
+    opção foi marcada. O custo de ler os resultados passa a ser proporcional
+    ao número de opções, não ao de respostas.
+    """
+
+    @staticmethod
+    def _consulta_contagens(filtro=None):
+        """
+        UNION ALL com (formulario_id, pergunta_id, opcao, quantidade) das respostas
+        que satisfazem `filtro` (condição sobre RespostaFormulario).
+        """
+        def restringir(consulta):
+            return consulta.where(filtro) if filtro is not None else consulta
+
+        respondedores = restringir(select(
+            RespostaFormulario.formulario_id,
+            literal(PERGUNTA_RESPONDEDORES).label('pergunta_id'),
+            literal(OPCAO_TOTAL).label('opcao'),
+            func.count(func.distinct(RespostaFormulario.aluno_id)).label('quantidade')
+        )).group_by(RespostaFormulario.formulario_id)
+
+        perguntas = restringir(select(
+            RespostaFormulario.formulario_id,
+            RespostaFormulario.pergunta_id,
+            literal(OPCAO_TOTAL).label('opcao'),
+            func.count(RespostaFormulario.id).label('quantidade')
+        )).group_by(RespostaFormulario.formulario_id, RespostaFormulario.pergunta_id)
+
+        opcoes = restringir(select(
+            RespostaFormularioOpcao.formulario_id,
+            RespostaFormularioOpcao.pergunta_id,
+            RespostaFormularioOpcao.opcao,
+            func.count(RespostaFormularioOpcao.id).label('quantidade')
+        ).join(
+            RespostaFormulario, RespostaFormulario.id == RespostaFormularioOpcao.resposta_id
+        )).group_by(
+            RespostaFormularioOpcao.formulario_id, RespostaFormularioOpcao.pergunta_id, RespostaFormularioOpcao.opcao
+        )
+
+        return union_all(respondedores, perguntas, opcoes)
+
+    @staticmethod
+    def _aplicar(db: Session, linhas, sinal: int):
+        """Soma (sinal=1) ou subtrai (sinal=-1) as quantidades nos contadores."""
+        for linha in linhas:
+            quantidade = linha['quantidade'] * sinal
+            filtro = (
+                (ContagemFormulario.formulario_id == linha['formulario_id'])
+                & (ContagemFormulario.pergunta_id == linha['pergunta_id'])
+                & (ContagemFormulario.opcao == linha['opcao'])
+            )
+            incremento = update(ContagemFormulario).where(filtro).values(
+                quantidade=ContagemFormulario.quantidade + quantidade
+            ).execution_options(synchronize_session=False)
+
+            if db.execute(incremento).rowcount or sinal < 0:
+                continue
+            try:
+                with db.begin_nested():
+                    db.execute(insert(ContagemFormulario).values(
+                        formulario_id=linha['formulario_id'], pergunta_id=linha['pergunta_id'],
+                        opcao=linha['opcao'], quantidade=quantidade
+                    ))
+            except IntegrityError:
+                # Outra transação criou a linha ao mesmo tempo: basta incrementar
+                db.execute(incremento)
+
+    @staticmethod
+    def registrar_envio(db: Session, aluno_id: int, formulario_id: int):
+        """Soma aos contadores as respostas que o aluno acabou de adicionar à sessão (sem commit)."""
+        db.flush()
+        filtro = (RespostaFormulario.aluno_id == aluno_id) & (RespostaFormulario.formulario_id == formulario_id)
+        linhas = db.execute(ContagemFormularioService._consulta_contagens(filtro)).mappings().all()
+        ContagemFormularioService._aplicar(db, linhas, 1)
+
+    @staticmethod
+    def descontar_envio(db: Session, aluno_id: int, formulario_id: int):
+        """
+        Tira dos contadores todas as respostas do aluno no formulário (sem commit).
+        Deve ser chamado antes de excluir essas respostas.
+        """
+        filtro = (RespostaFormulario.aluno_id == aluno_id) & (RespostaFormulario.formulario_id == formulario_id)
+        linhas = db.execute(ContagemFormularioService._consulta_contagens(filtro)).mappings().all()
+        ContagemFormularioService._aplicar(db, linhas, -1)
+
+    @staticmethod
+    def descontar_aluno(db: Session, aluno_id: int):
+        """
+        Tira dos contadores todas as respostas do aluno, em todos os formulários (sem commit).
+        Deve ser chamado antes de excluir o aluno ou suas respostas.
+        """
+        linhas = db.execute(
+            ContagemFormularioService._consulta_contagens(RespostaFormulario.aluno_id == aluno_id)
+        ).mappings().all()
+        ContagemFormularioService._aplicar(db, linhas, -1)
+
+    @staticmethod
+    def remover_formulario(db: Session, formulario_id: int):
+        """Apaga os contadores de um formulário excluído (sem commit)."""
+        db.execute(delete(ContagemFormulario).where(ContagemFormulario.formulario_id == formulario_id))
+
+    @staticmethod
+    def reconstruir(db: Session) -> int:
+        """Recalcula todos os contadores a partir das respostas (backfill/correção)."""
+        db.execute(delete(ContagemFormulario))
+        db.execute(insert(ContagemFormulario).from_select(
+            ['formulario_id', 'pergunta_id', 'opcao', 'quantidade'],
+            ContagemFormularioService._consulta_contagens()
+        ))
+        db.commit()
+        return db.query(func.count(ContagemFormulario.id)).scalar()
+
+    @staticmethod
+    def por_formulario(db: Session, formulario_id: int):
+        """
+        Contadores de um formulário.
+        Retorna (alunos que responderam, {pergunta_id: respostas}, {pergunta_id: Counter(opcao -> quantidade)}).
+        """
+        linhas = db.query(
+            ContagemFormulario.pergunta_id, ContagemFormulario.opcao, ContagemFormulario.quantidade
+        ).filter(ContagemFormulario.formulario_id == formulario_id).all()
+
+        respondedores, totais, contagens = 0, {}, {}
+        for pergunta_id, opcao, quantidade in linhas:
+            if pergunta_id == PERGUNTA_RESPONDEDORES:
+                respondedores = quantidade
+            elif opcao == OPCAO_TOTAL:
+                totais[pergunta_id] = quantidade
+            elif quantidade:
+                contagens.setdefault(pergunta_id, Counter())[opcao] = quantidade
+        return respondedores, totais, contagens
@@ -0,0 +1,206 @@
+import json
+import os
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models.resposta import Resposta
+from models.resultado import Resultado
+from models.questao import Questao
+from models.prova_questao import ProvaQuestao
+from models.banco_questoes import BancoQuestoes
+from models.submissao_prova import SubmissaoProva, StatusSubmissao
+from dao.upsert import inserir_se_ausente, inserir_ou_atualizar
+from dao.submissao_prova_dao import SubmissaoProvaDAO
+from services.resumo_service import ResumoService
+from utils.nota_service import calcular_nota_e_situacao
+from utils.cache import CacheLRU, criar_backend
+
+# PROVAS_ENVIO_EM_FILA=1: o envio é gravado na fila (submissoes_prova) e corrigido pelos workers do agendador
+ENVIO_EM_FILA = os.getenv("PROVAS_ENVIO_EM_FILA", "0") == "1"
+FILA_MAX_TENTATIVAS = int(os.getenv("FILA_SUBMISSOES_MAX_TENTATIVAS", "5"))
+
+# Gabaritos compilados por prova, em instância própria (não disputa espaço com os relatórios)
+cache_gabaritos = criar_backend(
+    prefixo="dipe-gabaritos:",
+    max_itens=int(os.getenv("CACHE_GABARITOS_MAX", "1024")),
+    ttl=int(os.getenv("CACHE_GABARITOS_TTL", "3600"))
+)
+# Em memória, invalidar_gabaritos só vale no processo que fez a edição: a correção
+# (rota de envio e workers da fila, em todos os processos) não confia nesse cache
+GABARITOS_EM_MEMORIA = isinstance(cache_gabaritos, CacheLRU)
+
+
+class CorrecaoService:
+    """Correção e gravação em lote das respostas de uma prova."""
+
+    @staticmethod
+    def compilar_gabarito(db: Session, prova_id: int) -> dict:
+        """
+        Monta o gabarito {questao_id: alternativa} das questões do banco vinculadas
+        à prova e o guarda em cache_gabaritos (ids e letras em listas paralelas).
+        """
+        linhas = db.execute(
+            select(BancoQuestoes.id, BancoQuestoes.resposta_correta)
+            .join(ProvaQuestao, ProvaQuestao.questao_banco_id == BancoQuestoes.id)
+            .where(ProvaQuestao.prova_id == prova_id)
+        ).all()
+        compacto = {"ids": [questao_id for questao_id, _ in linhas], "letras": [correta for _, correta in linhas]}
+        try:
+            cache_gabaritos.set(f"gabarito:{prova_id}", json.dumps(compacto).encode("utf-8"))
+        except Exception as e:
+            print(f"Erro ao gravar gabarito em cache: {e}")
+        return dict(zip(compacto["ids"], compacto["letras"]))
+
+    @staticmethod
+    def gabarito_da_prova(db: Session, prova_id: int) -> dict:
+        """Gabarito da prova a partir do cache; compila na primeira vez."""
+        try:
+            valor = cache_gabaritos.get(f"gabarito:{prova_id}")
+        except Exception as e:
+            print(f"Erro ao ler gabarito do cache: {e}")
+            valor = None
+        if valor is None:
+            return CorrecaoService.compilar_gabarito(db, prova_id)
+        compacto = json.loads(valor)
+        return dict(zip(compacto["ids"], compacto["letras"]))
+
+    @staticmethod
+    def gabarito_para_correcao(db: Session, prova_id: int) -> dict:
+        """
+        Gabarito usado para corrigir (rota de envio e workers da fila): do cache só quando
+        ele é compartilhado entre os processos (Redis); com o cache em memória, lido do banco.
+        """
+        if GABARITOS_EM_MEMORIA:
+            return CorrecaoService.compilar_gabarito(db, prova_id)
+        return CorrecaoService.gabarito_da_prova(db, prova_id)
+
+    @staticmethod
+    def invalidar_gabaritos(*prova_ids: int):
+        """Descarta os gabaritos em cache das provas (chamar após o commit da edição)."""
+        for prova_id in prova_ids:
+            try:
+                cache_gabaritos.delete(f"gabarito:{prova_id}")
+            except Exception as e:
+                print(f"Erro ao invalidar gabarito da prova {prova_id}: {e}")
+
+    @staticmethod
+    def invalidar_gabaritos_da_questao(db: Session, questao_id: int):
+        """Descarta os gabaritos de todas as provas que usam a questão do banco."""
+        prova_ids = db.execute(
+            select(ProvaQuestao.prova_id).where(ProvaQuestao.questao_banco_id == questao_id).distinct()
+        ).scalars().all()
+        CorrecaoService.invalidar_gabaritos(*prova_ids)
+
+    @staticmethod
+    def gabarito_legado(db: Session, prova_id: int) -> dict:
+        """Gabarito das questões próprias da prova (tabela questoes, fluxo antigo)."""
+        linhas = db.execute(
+            select(Questao.id, Questao.resposta_correta).where(Questao.prova_id == prova_id)
+        ).all()
+        return {questao_id: correta for questao_id, correta in linhas}
+
+    @staticmethod
+    def corrigir(gabarito: dict, respostas: dict) -> int:
+        """Conta os acertos comparando as respostas ao gabarito, sem diferenciar maiúsculas."""
+        return sum(
+            1 for questao_id, resposta in respostas.items()
+            if questao_id in gabarito
+            and resposta.strip().upper() == gabarito[questao_id].strip().upper()
+        )
+
+    @staticmethod
+    def registrar_envio(db: Session, aluno_id: int, prova_id: int, gabarito: dict,
+                        respostas: dict, total_questoes: int, token: Optional[str] = None) -> Optional[Resultado]:
+        """
+        Grava as respostas e o resultado do aluno em uma única transação.
+
+        O resultado é inserido primeiro e o índice único (aluno_id, prova_id) decide
+        quem chegou antes: um envio concorrente ou repetido não insere nada. Se o
+        envio repetido traz o mesmo `token` do formulário, é um reenvio (duplo clique,
+        nova tentativa do balanceador) e o resultado existente é devolvido; senão o
+        aluno já respondeu e o retorno é None. As respostas são gravadas em lote com
+        upsert, e o resumo só é atualizado quando o resultado foi de fato inserido.
+        Respostas a questões fora do gabarito são descartadas.
+        """
+        respostas = {q: r for q, r in respostas.items() if q in gabarito}
+        token = token[:36] if token else None
+        acertos = CorrecaoService.corrigir(gabarito, respostas)
+        nota, situacao = calcular_nota_e_situacao(acertos, total_questoes)
+        chave = {"aluno_id": aluno_id, "prova_id": prova_id}
+
+        try:
+            inserido = inserir_se_ausente(db, Resultado, {
+                **chave,
+                "acertos": acertos,
+                "situacao": situacao,
+                "nota": nota,
+                "total_questoes": total_questoes,
+                "token_submissao": token
+            }, chaves=["aluno_id", "prova_id"])
+            if inserido:
+                inserir_ou_atualizar(db, Resposta, [
+                    {"aluno_id": aluno_id, "questao_id": questao_id, "resposta": resposta}
+                    for questao_id, resposta in respostas.items()
+                ], chaves=["aluno_id", "questao_id"], atualizar=["resposta"])
+                ResumoService.acumular(db, (Resultado.aluno_id == aluno_id) & (Resultado.prova_id == prova_id))
+                db.commit()
+            else:
+                db.rollback()
+        except Exception:
+            db.rollback()
+            raise
+
+        resultado = db.query(Resultado).filter_by(**chave).first()
+        if inserido or (token and resultado is not None and resultado.token_submissao == token):
+            return resultado
+        return None
+
+    @staticmethod
+    def processar_submissao(db: Session, submissao: SubmissaoProva, gabaritos: Optional[dict] = None) -> StatusSubmissao:
+        """
+        Corrige um envio reservado da fila e registra o desfecho. Se o processo cair
+        no meio, a reserva vence e outro worker repete o envio: o token faz
+        registrar_envio devolver o resultado já gravado em vez de recusar.
+        `gabaritos` ({prova_id: gabarito}) reaproveita os gabaritos já lidos no mesmo lote.
+        """
+        submissao_id, tentativas = submissao.id, submissao.tentativas
+        try:
+            if tentativas > FILA_MAX_TENTATIVAS:
+                raise RuntimeError("Número máximo de tentativas excedido")
+            respostas = {int(q): r for q, r in json.loads(submissao.respostas).items()}
+            gabaritos = {} if gabaritos is None else gabaritos
+            if submissao.prova_id not in gabaritos:
+                gabaritos[submissao.prova_id] = CorrecaoService.gabarito_para_correcao(db, submissao.prova_id)
+            gabarito = gabaritos[submissao.prova_id]
+            resultado = CorrecaoService.registrar_envio(
+                db, submissao.aluno_id, submissao.prova_id, gabarito, respostas,
+                total_questoes=len(gabarito), token=submissao.token_submissao
+            )
+            status = StatusSubmissao.CONCLUIDA if resultado else StatusSubmissao.RECUSADA
+            SubmissaoProvaDAO.finalizar(db, submissao, status, resultado_id=resultado.id if resultado else None)
+            db.commit()
+            return status
+        except Exception as e:
+            db.rollback()
+            print(f"Erro ao processar envio {submissao_id} (tentativa {tentativas}): {e}")
+            if tentativas < FILA_MAX_TENTATIVAS:
+                return StatusSubmissao.PROCESSANDO  # a reserva vence e o envio volta para a fila
+            submissao = db.get(SubmissaoProva, submissao_id)
+            SubmissaoProvaDAO.finalizar(db, submissao, StatusSubmissao.ERRO, erro=str(e))
+            db.commit()
+            return StatusSubmissao.ERRO
+
+    @staticmethod
+    def processar_fila(db: Session, tamanho_lote: int = 50, duracao_reserva: int = 60, max_lotes: int = 20) -> int:
+        """Reserva e corrige lotes da fila até esvaziá-la (ou até `max_lotes`). Retorna quantos envios processou."""
+        processadas = 0
+        for _ in range(max_lotes):
+            lote = SubmissaoProvaDAO.reservar_lote(db, tamanho_lote, duracao_reserva)
+            if not lote:
+                break
+            # Cada lote lê de novo o gabarito de cada prova (uma vez por prova)
+            gabaritos = {}
+            for submissao in lote:
+                CorrecaoService.processar_submissao(db, submissao, gabaritos)
+            processadas += len(lote)
+        return processadas
@@ -1,14 +1,22 @@
 """
 Serviço para análise e agregação de dados de formulários dinâmicos.
 Gera dados para gráficos Chart.js de perguntas de escolha única e múltipla escolha.
+
+As contagens vêm dos contadores de contagens_formulario, incrementados no envio
+das respostas (ContagemFormularioService): montar o painel custa uma leitura por
+opção, não por resposta.
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from models.resposta_formulario import RespostaFormulario
 from models.pergunta_formulario import PerguntaFormulario
+from services.contagem_formulario_service import ContagemFormularioService
 import json
 from collections import Counter
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+TIPOS_ESCOLHA_UNICA = ['escolha_unica', 'selecao_unica', 'sim_nao']
+TIPOS_COM_GRAFICO = TIPOS_ESCOLHA_UNICA + ['multipla_escolha']
+
 
 class FormularioAnalyticsService:
     """Serviço para análise de formulários e geração de dados para gráficos."""
@@ -20,25 +28,23 @@ class FormularioAnalyticsService:
         Inclui estatísticas gerais e dados para gráficos de cada pergunta.
         """
         from dao.formulario_dao import FormularioDAO
-        from dao.resposta_formulario_dao import RespostaFormularioDAO
         
         formulario = FormularioDAO.get_by_id(db, formulario_id)
         if not formulario:
             return None
         
-        # Estatísticas gerais
-        total_respondedores = RespostaFormularioDAO.get_total_respondedores_by_formulario(db, formulario_id)
-        total_respostas = RespostaFormularioDAO.get_estatisticas_formulario(db, formulario_id)
-        
         # Buscar todas as perguntas do formulário
         from dao.pergunta_formulario_dao import PerguntaFormularioDAO
         perguntas = PerguntaFormularioDAO.get_by_formulario(db, formulario_id)
         
+        # Estatísticas gerais e contagens por opção vêm dos contadores (uma linha por opção)
+        total_respondedores, totais, contagens = ContagemFormularioService.por_formulario(db, formulario_id)
+        
         # Gerar dados para gráficos de cada pergunta
         graficos_perguntas = []
         for pergunta in perguntas:
             grafico_data = FormularioAnalyticsService._gerar_grafico_pergunta(
-                db, formulario_id, pergunta
+                pergunta, contagens.get(pergunta.id, Counter()), totais.get(pergunta.id, 0)
             )
             if grafico_data:
                 graficos_perguntas.append(grafico_data)
@@ -46,31 +52,69 @@ class FormularioAnalyticsService:
         return {
             "formulario": formulario,
             "total_respondedores": total_respondedores,
-            "total_respostas": total_respostas.get("total_respostas", 0),
+            "total_respostas": sum(totais.values()),
             "graficos_perguntas": graficos_perguntas,
             "perguntas": perguntas
         }
     
+    @staticmethod
+    def get_contagens_ao_vivo(db: Session, formulario_id: int) -> Optional[Dict[str, Any]]:
+        """Parte de get_formulario_analytics que muda com novos envios, serializável em JSON (painel ao vivo)."""
+        analytics = FormularioAnalyticsService.get_formulario_analytics(db, formulario_id)
+        if not analytics:
+            return None
+        return {
+            "total_respondedores": analytics["total_respondedores"],
+            "total_respostas": analytics["total_respostas"],
+            "graficos_perguntas": analytics["graficos_perguntas"]
+        }
+    
+    @staticmethod
+    def opcoes_da_resposta(multipla: bool, texto: Optional[str], opcoes: Optional[str]) -> List[str]:
+        """Opções marcadas em uma resposta (regras do formato antigo, em JSON; usadas no envio e no backfill)."""
+        if not multipla:
+            # Escolha única: resposta_texto (formato mais comum) ou o primeiro item de resposta_opcoes
+            if texto:
+                return [texto.strip()] if texto.strip() else []
+            if not opcoes:
+                return []
+            try:
+                opcao_parsed = json.loads(opcoes)
+            except (json.JSONDecodeError, TypeError):
+                # Se não for JSON válido, tratar como string direta
+                opcao_parsed = opcoes
+            if isinstance(opcao_parsed, list):
+                opcao_parsed = str(opcao_parsed[0]) if opcao_parsed else ''
+            if isinstance(opcao_parsed, str) and opcao_parsed.strip():
+                return [opcao_parsed.strip()]
+            return []
+        
+        # Múltipla escolha: resposta_opcoes contém uma lista de opções
+        if not opcoes:
+            return []
+        try:
+            opcoes_selecionadas = json.loads(opcoes)
+        except (json.JSONDecodeError, TypeError):
+            # Se não for JSON válido, tratar como string única
+            return [str(opcoes)]
+        if isinstance(opcoes_selecionadas, list):
+            return [str(opcao) for opcao in opcoes_selecionadas]
+        return []
+    
     @staticmethod
     def _gerar_grafico_pergunta(
-        db: Session, 
-        formulario_id: int, 
-        pergunta: PerguntaFormulario
+        pergunta: PerguntaFormulario,
+        contagem: Counter,
+        total_respostas: int
     ) -> Dict[str, Any]:
         """
-        Gera dados para gráfico de uma pergunta específica.
+        Gera dados para gráfico de uma pergunta específica a partir das contagens.
         Retorna None se a pergunta não for de escolha única ou múltipla escolha.
         """
-        if pergunta.tipo_pergunta not in ['escolha_unica', 'selecao_unica', 'sim_nao', 'multipla_escolha']:
+        if pergunta.tipo_pergunta not in TIPOS_COM_GRAFICO:
             return None
         
-        # Buscar todas as respostas para esta pergunta
-        respostas = db.query(RespostaFormulario).filter(
-            RespostaFormulario.formulario_id == formulario_id,
-            RespostaFormulario.pergunta_id == pergunta.id
-        ).all()
-        
-        if not respostas:
+        if not total_respostas:
             return {
                 "pergunta_id": pergunta.id,
                 "enunciado": pergunta.enunciado,
@@ -87,117 +131,43 @@ class FormularioAnalyticsService:
             except:
                 opcoes_pergunta = []
         
-        # Agregar respostas
-        if pergunta.tipo_pergunta in ['escolha_unica', 'selecao_unica', 'sim_nao']:
-            # Para escolha única, as respostas podem estar em resposta_texto ou resposta_opcoes
-            contagem = Counter()
-            for resposta in respostas:
-                opcao_selecionada = None
-                
-                # Primeiro tentar resposta_texto (formato mais comum)
-                if resposta.resposta_texto:
-                    opcao_selecionada = resposta.resposta_texto.strip()
-                
-                # Se não tiver em texto, tentar resposta_opcoes
-                elif resposta.resposta_opcoes:
-                    try:
-                        opcao_parsed = json.loads(resposta.resposta_opcoes)
-                        if isinstance(opcao_parsed, list) and len(opcao_parsed) > 0:
-                            opcao_selecionada = str(opcao_parsed[0]).strip()
-                        elif isinstance(opcao_parsed, str):
-                            opcao_selecionada = opcao_parsed.strip()
-                    except (json.JSONDecodeError, TypeError):
-                        # Se não for JSON válido, tratar como string direta
-                        opcao_selecionada = str(resposta.resposta_opcoes).strip()
-                
-                if opcao_selecionada:
-                    contagem[opcao_selecionada] += 1
-            
-            # Preparar dados para gráfico de pizza
-            labels = []
-            data = []
-            
-            # Se houver opções definidas na pergunta, usar essas como base
-            if opcoes_pergunta:
-                cores = FormularioAnalyticsService._gerar_cores(len(opcoes_pergunta))
-                # Incluir todas as opções, mesmo as não selecionadas
-                for opcao in opcoes_pergunta:
-                    labels.append(opcao)
-                    data.append(contagem.get(opcao, 0))
-                
-                # Incluir opções que foram selecionadas mas não estão na lista original
-                for opcao, count in contagem.items():
-                    if opcao not in labels:
-                        labels.append(opcao)
-                        data.append(count)
-                        cores.append('#CCCCCC')  # Cor neutra para opções não listadas
-            else:
-                # Se não houver opções definidas, usar apenas as respostas coletadas
-                cores = FormularioAnalyticsService._gerar_cores(len(contagem))
-                for opcao, count in contagem.items():
-                    labels.append(opcao)
-                    data.append(count)
-            
-            return {
-                "pergunta_id": pergunta.id,
-                "enunciado": pergunta.enunciado,
-                "tipo": pergunta.tipo_pergunta,
-                "tipo_grafico": "pie",  # Pizza para escolha única
-                "tem_respostas": True,
-                "total_respostas": len(respostas),
-                "grafico": {
-                    "labels": labels,
-                    "data": data,
-                    "cores": cores[:len(labels)]
-                }
-            }
+        multipla = pergunta.tipo_pergunta == 'multipla_escolha'
+        labels = []
+        data = []
         
-        elif pergunta.tipo_pergunta == 'multipla_escolha':
-            # Para múltipla escolha, resposta_opcoes contém uma lista de opções
-            contagem = Counter()
-            for resposta in respostas:
-                if resposta.resposta_opcoes:
-                    try:
-                        opcoes_selecionadas = json.loads(resposta.resposta_opcoes)
-                        if isinstance(opcoes_selecionadas, list):
-                            for opcao in opcoes_selecionadas:
-                                contagem[str(opcao)] += 1
-                    except (json.JSONDecodeError, TypeError):
-                        # Se não for JSON válido, tratar como string única
-                        contagem[str(resposta.resposta_opcoes)] += 1
-            
-            # Preparar dados para gráfico de barras (melhor para múltipla escolha)
-            labels = []
-            data = []
+        if opcoes_pergunta or multipla:
+            # Opções definidas na pergunta como base, mesmo as não selecionadas
             cores = FormularioAnalyticsService._gerar_cores(len(opcoes_pergunta))
-            
-            # Incluir todas as opções
             for opcao in opcoes_pergunta:
                 labels.append(opcao)
                 data.append(contagem.get(opcao, 0))
             
-            # Incluir opções não listadas
+            # Incluir opções que foram selecionadas mas não estão na lista original
             for opcao, count in contagem.items():
                 if opcao not in labels:
                     labels.append(opcao)
                     data.append(count)
-                    cores.append('#CCCCCC')
-            
-            return {
-                "pergunta_id": pergunta.id,
-                "enunciado": pergunta.enunciado,
-                "tipo": "multipla_escolha",
-                "tipo_grafico": "bar",  # Barras para múltipla escolha
-                "tem_respostas": True,
-                "total_respostas": len(respostas),
-                "grafico": {
-                    "labels": labels,
-                    "data": data,
-                    "cores": cores[:len(labels)]
-                }
-            }
+                    cores.append('#CCCCCC')  # Cor neutra para opções não listadas
+        else:
+            # Se não houver opções definidas, usar apenas as respostas coletadas
+            cores = FormularioAnalyticsService._gerar_cores(len(contagem))
+            for opcao, count in contagem.items():
+                labels.append(opcao)
+                data.append(count)
         
-        return None
+        return {
+            "pergunta_id": pergunta.id,
+            "enunciado": pergunta.enunciado,
+            "tipo": pergunta.tipo_pergunta,
+            "tipo_grafico": "bar" if multipla else "pie",  # Barras para múltipla escolha, pizza para escolha única
+            "tem_respostas": True,
+            "total_respostas": total_respostas,
+            "grafico": {
+                "labels": labels,
+                "data": data,
+                "cores": cores[:len(labels)]
+            }
+        }
     
     @staticmethod
     def _gerar_cores(quantidade: int) -> List[str]:
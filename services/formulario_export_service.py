@@ -0,0 +1,58 @@
+"""
+Exportação das respostas brutas de um formulário (uma linha por resposta).
+
+As linhas vêm do cursor do servidor em lotes (RespostaFormularioDAO.iterar_para_exportacao),
+então exportar 100 mil respostas não carrega todas na memória. O CSV é enviado em
+blocos à medida que as linhas chegam; o XLSX é gravado num arquivo temporário.
+"""
+from typing import Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from dao.resposta_formulario_dao import RespostaFormularioDAO
+from services.formulario_analytics_service import FormularioAnalyticsService
+
+EXPORTACAO_LOTE = 1000
+
+CABECALHO_EXPORTACAO = [
+    "ID Aluno", "Aluno", "ID Pergunta", "Pergunta", "Tipo", "Resposta", "Data da resposta"
+]
+
+
+class FormularioExportService:
+    @staticmethod
+    def formatar_resposta(tipo_pergunta: str, resposta_texto: Optional[str], resposta_opcoes: Optional[str]) -> str:
+        """Texto da resposta; na múltipla escolha, as opções marcadas separadas por '; '."""
+        if tipo_pergunta == 'multipla_escolha':
+            return "; ".join(FormularioAnalyticsService.opcoes_da_resposta(True, resposta_texto, resposta_opcoes))
+        if resposta_texto:
+            return resposta_texto
+        return "; ".join(FormularioAnalyticsService.opcoes_da_resposta(False, None, resposta_opcoes))
+
+    @staticmethod
+    def linhas(db: Session, formulario_id: int, lote: int = EXPORTACAO_LOTE) -> Iterator[list]:
+        """Linhas da exportação na ordem do CABECALHO_EXPORTACAO."""
+        for (aluno_id, aluno_nome, pergunta_id, enunciado, tipo_pergunta,
+             resposta_texto, resposta_opcoes, data_resposta) in RespostaFormularioDAO.iterar_para_exportacao(
+                db, formulario_id, lote):
+            yield [
+                aluno_id,
+                aluno_nome,
+                pergunta_id,
+                enunciado,
+                tipo_pergunta,
+                FormularioExportService.formatar_resposta(tipo_pergunta, resposta_texto, resposta_opcoes),
+                data_resposta.strftime("%d/%m/%Y %H:%M:%S") if data_resposta else "",
+            ]
+
+    @staticmethod
+    def linhas_em_sessao_propria(bind, formulario_id: int, lote: int = EXPORTACAO_LOTE) -> Iterator[list]:
+        """
+        Como `linhas`, mas numa sessão aberta aqui: o corpo de um StreamingResponse é
+        enviado depois que a sessão da requisição (get_db) já foi fechada.
+        """
+        db = Session(bind=bind)
+        try:
+            yield from FormularioExportService.linhas(db, formulario_id, lote)
+        finally:
+            db.close()
@@ -1,53 +1,21 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct, and_
+from sqlalchemy import func, distinct, and_, case, null
 from models.aluno import Aluno
 from models.prova import Prova
 from models.professor import Professor
 from models.gestor import Gestor
 from models.resultado import Resultado
 from models.gestor import Gestor # Para buscar dados do gestor, se necessário
-import unicodedata
-
-def normalizar_materia(materia: str) -> str:
-    """
-    Normaliza o nome da matéria removendo acentos, convertendo para minúsculas
-    e tratando variações de 'Ciências'
-    """
-    if not materia:
-        return ""
-    
-    # Remove acentos
-    materia_sem_acento = unicodedata.normalize('NFD', materia)
-    materia_sem_acento = ''.join(char for char in materia_sem_acento if unicodedata.category(char) != 'Mn')
-    
-    # Converte para minúsculas
-    materia_lower = materia_sem_acento.lower().strip()
-    
-    # Trata variações de Ciências (incluindo "Ciências da Natureza")
-    if 'ciencias' in materia_lower or 'ciencia' in materia_lower:
-        return 'ciencias'
-    
-    # Trata variações de Português
-    if 'portugues' in materia_lower:
-        return 'portugues'
-    
-    # Trata variações de Matemática
-    if 'matematica' in materia_lower:
-        return 'matematica'
-    
-    return materia_lower
-
-def obter_materia_padrao(materia_normalizada: str) -> str:
-    """
-    Retorna o nome padrão da matéria baseado na versão normalizada
-    """
-    if materia_normalizada == 'ciencias':
-        return 'Ciências'
-    elif materia_normalizada == 'portugues':
-        return 'Português'
-    elif materia_normalizada == 'matematica':
-        return 'Matemática'
-    return materia_normalizada.title()
+from models.materia import Materia
+from services.agregacao_service import AgregacaoService
+from utils.materia_service import normalizar_materia, obter_materia_padrao, MATERIAS_PADRAO  # noqa: F401 - reexportadas
+from utils.cache import cache_relatorios
+
+ALUNOS_POR_PAGINA = 48
+ALUNOS_POR_PAGINA_MAX = 200
+
+# Tabelas das quais os dados do dashboard do gestor dependem
+TABELAS_DASHBOARD_GESTOR = ('resultados', 'alunos', 'provas', 'turmas', 'professores', 'gestores', 'resumos_desempenho')
 
 class AnalyticsService:
     @staticmethod
@@ -60,24 +28,37 @@ class AnalyticsService:
         # Se não houver gestor, você pode decidir como lidar (ex: retornar None, ou raise HTTPException)
         # Para este serviço, assumimos que o gestor_id é válido, pois já foi verificado pelo controller.
 
+        # Os dados agregados são os mesmos para todos os gestores: ficam em cache
+        # até a próxima gravação nas tabelas das quais dependem
+        dados = cache_relatorios.obter_ou_calcular(
+            'dashboard_gestor', 'geral', TABELAS_DASHBOARD_GESTOR,
+            lambda: AnalyticsService._calcular_dashboard_gestor(db)
+        )
+        return {'gestor': gestor, **dados}
+
+    @staticmethod
+    def _calcular_dashboard_gestor(db: Session):
+        """Calcula cards e gráficos do dashboard do gestor (sem cache)."""
+        # Agregações em poucas consultas agrupadas (ver AgregacaoService)
+        usuarios = AgregacaoService.totais_usuarios(db)
+        resumo = AgregacaoService.resumo_resultados(db)
+        distribuicoes = AgregacaoService.distribuicoes_alunos(db)
+        somas = AgregacaoService.somas_por_grupo(db)
+
+        def media(soma, total):
+            return soma / total if total else 0
+
         # Dados para os cards
-        total_alunos = db.query(func.count(Aluno.idAluno)).scalar() or 0
-        total_professores = db.query(func.count(Professor.id)).scalar() or 0
-        total_provas = db.query(func.count(distinct(Resultado.prova_id))).scalar() or 0
-        total_gestores = db.query(func.count(distinct(Gestor.id))).scalar() or 0
+        total_alunos = usuarios['total_alunos']
+        total_professores = usuarios['total_professores']
+        total_gestores = usuarios['total_gestores']
         total_usuarios = total_alunos + total_professores + total_gestores
-        
-        # Calcular média geral
-        resultados_acertos = db.query(Resultado.acertos).all()
-        media_geral = 0
-        total_suficiente = 0
-        if resultados_acertos:
-            media_geral = sum(r.acertos for r in resultados_acertos) / len(resultados_acertos)
-            total_suficiente = sum(1 for r in resultados_acertos if r.acertos >= 7)
-            percentual_suficiente = (total_suficiente / len(resultados_acertos)) * 100
-        else:
-            percentual_suficiente = 0
-            
+        total_provas = resumo['provas_com_resultado']
+
+        # Média geral e percentual com 7 ou mais acertos
+        media_geral = media(resumo['soma_acertos'], resumo['total_resultados'])
+        percentual_suficiente = media(resumo['qtd_acertos_7'], resumo['total_resultados']) * 100
+
         cards = {
             'total_alunos': total_alunos,
             'total_professores': total_professores,
@@ -106,74 +87,38 @@ class AnalyticsService:
 
 
         # Distribuição por zona
+        zonas = dict(distribuicoes['zona'])
         zona_distribuicao = {
             'labels': ['Urbana', 'Rural'],
-            'data': [
-                db.query(Aluno).filter(Aluno.zona == 'urbana').count(),
-                db.query(Aluno).filter(Aluno.zona == 'rural').count()
-            ],
+            'data': [zonas.get('urbana', 0), zonas.get('rural', 0)],
             'cores': [cores_geral['urbana'], cores_geral['rural']]
         }
 
         # Distribuição por município
-        municipios = db.query(Aluno.municipio, func.count(Aluno.idAluno)).group_by(Aluno.municipio).all()
         cidade_distribuicao = {
-            'labels': [m[0] for m in municipios],
-            'data': [m[1] for m in municipios]
+            'labels': [m[0] for m in distribuicoes['municipio']],
+            'data': [m[1] for m in distribuicoes['municipio']]
         }
 
         # Perfil por idade
-        idades = db.query(Aluno.idade, func.count(Aluno.idAluno)).group_by(Aluno.idade).all()
         perfil_idade = {
-            'labels': [str(i[0]) for i in idades],
-            'data': [i[1] for i in idades]
+            'labels': [str(i[0]) for i in distribuicoes['idade']],
+            'data': [i[1] for i in distribuicoes['idade']]
         }
 
-        # Desempenho por disciplina (agrupando variações de capitalização e acentuação)
-        # Buscar todas as matérias distintas das provas
-        materias_distintas = db.query(Prova.materia).distinct().all()
-        materias_dict = {}  # {materia_normalizada: [materias_originais]}
-        
-        for (materia_original,) in materias_distintas:
-            materia_norm = normalizar_materia(materia_original)
-            if materia_norm not in materias_dict:
-                materias_dict[materia_norm] = []
-            materias_dict[materia_norm].append(materia_original)
-        
-        # Calcular média de acertos para cada matéria normalizada
-        desempenho_data = []
+        # Desempenho por disciplina: o resumo já agrupa as variações de escrita pela
+        # chave canônica da matéria. Ordem padrão: Português, Matemática, Ciências
+        ordem_materias = list(MATERIAS_PADRAO) + sorted(
+            chave for chave in somas['materia'] if chave not in MATERIAS_PADRAO
+        )
         desempenho_labels = []
-        
-        # Ordem padrão: Português, Matemática, Ciências
-        ordem_materias = ['portugues', 'matematica', 'ciencias']
-        
-        for materia_norm in ordem_materias:
-            if materia_norm in materias_dict:
-                # Buscar todas as variações desta matéria
-                materias_variacoes = materias_dict[materia_norm]
-                # Calcular média considerando todas as variações
-                media = db.query(func.avg(Resultado.acertos)).join(
-                    Prova, Resultado.prova_id == Prova.id
-                ).filter(
-                    Prova.materia.in_(materias_variacoes)
-                ).scalar() or 0
-                
-                desempenho_labels.append(obter_materia_padrao(materia_norm))
-                desempenho_data.append(float(media))
-        
-        # Adicionar outras matérias que não sejam as três padrão (se houver)
-        for materia_norm, materias_originais in materias_dict.items():
-            if materia_norm not in ordem_materias:
-                media = db.query(func.avg(Resultado.acertos)).join(
-                    Prova, Resultado.prova_id == Prova.id
-                ).filter(
-                    Prova.materia.in_(materias_originais)
-                ).scalar() or 0
-                
-                # Usar a primeira matéria original como label (ou normalizar)
-                desempenho_labels.append(materias_originais[0])
-                desempenho_data.append(float(media))
-        
+        desempenho_data = []
+        for chave in ordem_materias:
+            if chave in somas['materia']:
+                soma, total = somas['materia'][chave]
+                desempenho_labels.append(obter_materia_padrao(chave))
+                desempenho_data.append(float(media(soma, total)))
+
         desempenho_disciplina = {
             'labels': desempenho_labels,
             'data': desempenho_data
@@ -182,113 +127,46 @@ class AnalyticsService:
         # Distribuição das notas (usando a coluna situacao que já está salva no banco)
         distribuicao_notas = {
             'labels': ['Insuficiente', 'Regular', 'Suficiente'],
-            'data': [
-                db.query(func.count(Resultado.id)).filter(Resultado.situacao == 'Insuficiente').scalar() or 0,
-                db.query(func.count(Resultado.id)).filter(Resultado.situacao == 'Regular').scalar() or 0,
-                db.query(func.count(Resultado.id)).filter(Resultado.situacao == 'Suficiente').scalar() or 0
-            ]
+            'data': [resumo['qtd_insuficiente'], resumo['qtd_regular'], resumo['qtd_suficiente']]
         }
 
         # Progressão dos Alunos (média geral por ano)
-        anos = db.query(Aluno.ano).distinct().order_by(Aluno.ano).all()
-        anos_labels = [str(a[0]) for a in anos]
-        progressao_alunos_data = []
-        for ano in anos_labels:
-            alunos_ano = db.query(Aluno.idAluno).filter(Aluno.ano == int(ano)).all()
-            if alunos_ano:
-                ids = [a[0] for a in alunos_ano]
-                resultados_ano = db.query(Resultado.acertos).filter(Resultado.aluno_id.in_(ids)).all()
-                if resultados_ano:
-                    media_ano = sum(r.acertos for r in resultados_ano) / len(resultados_ano)
-                else:
-                    media_ano = 0
-            else:
-                media_ano = 0
-            progressao_alunos_data.append(round(media_ano, 2))
+        anos = sorted(
+            (a[0] for a in distribuicoes['ano']),
+            key=lambda ano: (ano is not None, int(ano) if ano is not None else 0)
+        )
         progressao_alunos = {
-            'labels': anos_labels,
-            'data': progressao_alunos_data
+            'labels': [str(ano) for ano in anos],
+            'data': [round(media(*somas['ano'].get(ano, (0, 0))), 2) for ano in anos]
         }
 
         # Comparação entre Turmas (média geral por curso)
-        cursos = db.query(Aluno.curso).distinct().all()
-        cursos_labels = [c[0] for c in cursos]
-        comparacao_turmas_data = []
-        for curso in cursos_labels:
-            alunos_curso = db.query(Aluno.idAluno).filter(Aluno.curso == curso).all()
-            if alunos_curso:
-                ids = [a[0] for a in alunos_curso]
-                resultados_curso = db.query(Resultado.acertos).filter(Resultado.aluno_id.in_(ids)).all()
-                if resultados_curso:
-                    media_curso = sum(r.acertos for r in resultados_curso) / len(resultados_curso)
-                else:
-                    media_curso = 0
-            else:
-                media_curso = 0
-            comparacao_turmas_data.append(round(media_curso, 2))
+        cursos_labels = [c[0] for c in distribuicoes['curso']]
         comparacao_turmas = {
             'labels': cursos_labels,
-            'data': comparacao_turmas_data
+            'data': [round(media(*somas['curso'].get(curso, (0, 0))), 2) for curso in cursos_labels]
         }
 
+        # Média de acertos por turma cadastrada (dimensão 'turma' do resumo)
+        desempenho_turmas = AgregacaoService.medias_por_turma(db)
+
         # Número de Alunos por Turma
-        alunos_por_turma_data = []
-        for curso in cursos_labels:
-            count = db.query(Aluno).filter(Aluno.curso == curso).count()
-            alunos_por_turma_data.append(count)
         alunos_por_turma = {
             'labels': cursos_labels,
-            'data': alunos_por_turma_data
+            'data': [c[1] for c in distribuicoes['curso']]
         }
 
         # Taxa de Participação
-        total_alunos_in_db = db.query(func.count(Aluno.idAluno)).scalar() or 0
-        alunos_com_resultado = db.query(Resultado.aluno_id).distinct().count()
+        alunos_com_resultado = resumo['alunos_com_resultado']
         taxa_participacao = {
             'labels': ['Participaram', 'Não participaram'],
-            'data': [alunos_com_resultado, max(0, total_alunos_in_db - alunos_com_resultado)]
+            'data': [alunos_com_resultado, max(0, total_alunos - alunos_com_resultado)]
         }
 
         # Top 10 Alunos (maior média)
-        alunos_all = db.query(Aluno).all() # Renomeado para evitar conflito com 'alunos' aliased
-        top_alunos_lista = []
-        for aluno in alunos_all:
-            resultados_aluno = db.query(Resultado).filter(Resultado.aluno_id == aluno.idAluno).all()
-            notas = [r.acertos for r in resultados_aluno]
-            media = sum(notas) / len(notas) if notas else 0
-            
-            # Buscar provas do aluno com suas matérias
-            provas_aluno = {}
-            for resultado in resultados_aluno:
-                prova = db.query(Prova).filter(Prova.id == resultado.prova_id).first()
-                if prova:
-                    materia_norm = normalizar_materia(prova.materia)
-                    # Agrupar por matéria normalizada, pegando o resultado mais recente
-                    if materia_norm not in provas_aluno or resultado.id > provas_aluno[materia_norm]['resultado_id']:
-                        provas_aluno[materia_norm] = {
-                            'acertos': resultado.acertos,
-                            'resultado_id': resultado.id
-                        }
-            
-            # Buscar notas por matéria normalizada
-            nota_portugues = provas_aluno.get('portugues', {}).get('acertos', 0)
-            nota_matematica = provas_aluno.get('matematica', {}).get('acertos', 0)
-            nota_ciencias = provas_aluno.get('ciencias', {}).get('acertos', 0)
-            
-            top_alunos_lista.append({
-                'idAluno': aluno.idAluno,
-                'nome': aluno.nome,
-                'turma': aluno.curso,
-                'nota_portugues': nota_portugues,
-                'nota_matematica': nota_matematica,
-                'nota_ciencias': nota_ciencias,
-                'media': round(media, 2),
-                'foto': aluno.imagem or '/static/img/user.jpg'
-            })
-        top_alunos = sorted(top_alunos_lista, key=lambda x: x['media'], reverse=True)[:10]
+        top_alunos = AnalyticsService.get_top_alunos(db, limite=10)
 
         return {
-            'gestor': gestor, # Retornar o objeto gestor para o template
             'cards': cards,
             'zona_distribuicao': zona_distribuicao,
             'cidade_distribuicao': cidade_distribuicao,
@@ -298,12 +176,186 @@ class AnalyticsService:
             'progressao_alunos': progressao_alunos,
             'comparacao_turmas': comparacao_turmas,
             'alunos_por_turma': alunos_por_turma,
+            'desempenho_turmas': desempenho_turmas,
             'taxa_participacao': taxa_participacao,
             'top_alunos': top_alunos
         }
 
     @staticmethod
-    def get_aluno_profile_data(db: Session, user_id: int):
+    def listar_alunos_com_notas(
+        db: Session,
+        curso: str = None,
+        ano: str = None,
+        situacao: str = None,
+        nome: str = None,
+        idade_min: int = None,
+        idade_max: int = None,
+        municipio: str = None,
+        zona: str = None,
+        origem_escolar: str = None,
+        ordenar: str = "nome",
+        pagina: int = 1,
+        por_pagina: int = ALUNOS_POR_PAGINA
+    ) -> dict:
+        """
+        Listagem paginada de alunos com a nota mais recente de Português,
+        Matemática e Ciências e a média das três.
+        As notas vêm de uma CTE ranqueada (ROW_NUMBER por aluno e matéria)
+        calculada uma vez e unida a alunos; filtros, ordenação e paginação
+        são aplicados no banco.
+        Retorna {'alunos': [(Aluno, nota_portugues, nota_matematica, nota_ciencias, media_geral)],
+        'total', 'pagina', 'por_pagina', 'total_paginas'}.
+        """
+        ranqueados = db.query(
+            Resultado.aluno_id.label('aluno_id'),
+            Resultado.nota.label('nota'),
+            Materia.chave.label('materia'),
+            func.row_number().over(
+                partition_by=(Resultado.aluno_id, Prova.materia_id),
+                order_by=Resultado.id.desc()
+            ).label('posicao')
+        ).join(
+            Prova, Resultado.prova_id == Prova.id
+        ).join(
+            Materia, Prova.materia_id == Materia.id
+        ).filter(Materia.chave.in_(MATERIAS_PADRAO)).cte('notas_ranqueadas')
+
+        def nota_recente(materia):
+            return func.max(case((ranqueados.c.materia == materia, ranqueados.c.nota), else_=null()))
+
+        notas = db.query(
+            ranqueados.c.aluno_id.label('aluno_id'),
+            nota_recente('portugues').label('nota_portugues'),
+            nota_recente('matematica').label('nota_matematica'),
+            nota_recente('ciencias').label('nota_ciencias')
+        ).filter(ranqueados.c.posicao == 1).group_by(ranqueados.c.aluno_id).subquery()
+
+        nota_portugues = func.coalesce(notas.c.nota_portugues, 0)
+        nota_matematica = func.coalesce(notas.c.nota_matematica, 0)
+        nota_ciencias = func.coalesce(notas.c.nota_ciencias, 0)
+        media_geral = (nota_portugues + nota_matematica + nota_ciencias) / 3.0
+
+        query = db.query(Aluno).outerjoin(notas, notas.c.aluno_id == Aluno.idAluno)
+
+        if curso:
+            query = query.filter(Aluno.curso == curso)
+        if ano:
+            query = query.filter(Aluno.ano == ano)
+        if nome:
+            query = query.filter(Aluno.nome.ilike(f"%{nome}%"))
+        if idade_min is not None:
+            query = query.filter(Aluno.idade >= idade_min)
+        if idade_max is not None:
+            query = query.filter(Aluno.idade <= idade_max)
+        if municipio:
+            query = query.filter(Aluno.municipio.ilike(f"%{municipio}%"))
+        if zona:
+            query = query.filter(Aluno.zona == zona)
+        if origem_escolar:
+            query = query.filter(Aluno.origem_escolar == origem_escolar)
+
+        # Situação baseada na média calculada (nota de 0-10)
+        if situacao == "suficiente":
+            query = query.filter(media_geral >= 8)
+        elif situacao == "regular":
+            query = query.filter(media_geral > 5, media_geral < 8)
+        elif situacao == "insuficiente":
+            query = query.filter(media_geral <= 5)
+
+        total = query.count()
+        por_pagina = max(1, min(por_pagina, ALUNOS_POR_PAGINA_MAX))
+        total_paginas = max(1, -(-total // por_pagina))
+        pagina = max(1, min(pagina, total_paginas))
+
+        ordenacoes = {
+            "nome": (Aluno.nome.asc(), Aluno.idAluno),
+            "media_desc": (media_geral.desc(), Aluno.nome.asc(), Aluno.idAluno),
+            "media_asc": (media_geral.asc(), Aluno.nome.asc(), Aluno.idAluno),
+        }
+        alunos = query.add_columns(
+            nota_portugues.label('nota_portugues'),
+            nota_matematica.label('nota_matematica'),
+            nota_ciencias.label('nota_ciencias'),
+            media_geral.label('media_geral')
+        ).order_by(
+            *ordenacoes.get(ordenar, ordenacoes["nome"])
+        ).offset((pagina - 1) * por_pagina).limit(por_pagina).all()
+
+        return {
+            'alunos': alunos,
+            'total': total,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'total_paginas': total_paginas
+        }
+
+    @staticmethod
+    def get_top_alunos(db: Session, limite: int = 10):
+        """
+        Retorna os alunos com maior média de acertos, com a nota mais recente
+        de Português, Matemática e Ciências de cada um.
+        A classificação é feita em uma única consulta agrupada: ROW_NUMBER()
+        escolhe o resultado mais recente por (aluno, matéria) e o LIMIT é
+        aplicado no banco, sem carregar todos os alunos.
+        """
+        ranqueados = db.query(
+            Resultado.aluno_id.label('aluno_id'),
+            Resultado.acertos.label('acertos'),
+            Materia.chave.label('materia'),
+            func.row_number().over(
+                partition_by=(Resultado.aluno_id, Prova.materia_id),
+                order_by=Resultado.id.desc()
+            ).label('posicao')
+        ).outerjoin(
+            Prova, Resultado.prova_id == Prova.id
+        ).outerjoin(
+            Materia, Prova.materia_id == Materia.id
+        ).subquery()
+
+        def nota_recente(materia):
+            return func.max(case(
+                (and_(ranqueados.c.posicao == 1, ranqueados.c.materia == materia), ranqueados.c.acertos),
+                else_=null()
+            ))
+
+        resumo = db.query(
+            ranqueados.c.aluno_id.label('aluno_id'),
+            func.avg(ranqueados.c.acertos).label('media'),
+            nota_recente('portugues').label('nota_portugues'),
+            nota_recente('matematica').label('nota_matematica'),
+            nota_recente('ciencias').label('nota_ciencias')
+        ).group_by(ranqueados.c.aluno_id).subquery()
+
+        media = func.coalesce(resumo.c.media, 0)
+        linhas = db.query(
+            Aluno.idAluno,
+            Aluno.nome,
+            Aluno.curso,
+            Aluno.imagem,
+            media.label('media'),
+            resumo.c.nota_portugues,
+            resumo.c.nota_matematica,
+            resumo.c.nota_ciencias
+        ).outerjoin(
+            resumo, resumo.c.aluno_id == Aluno.idAluno
+        ).order_by(media.desc(), Aluno.idAluno).limit(limite).all()
+
+        return [
+            {
+                'idAluno': linha.idAluno,
+                'nome': linha.nome,
+                'turma': linha.curso,
+                'nota_portugues': linha.nota_portugues or 0,
+                'nota_matematica': linha.nota_matematica or 0,
+                'nota_ciencias': linha.nota_ciencias or 0,
+                'media': round(float(linha.media), 2),
+                'foto': linha.imagem or '/static/img/user.jpg'
+            }
+            for linha in linhas
+        ]
+
+    @staticmethod
+    def get_aluno_profile_data(db: Session, aluno_id: int):
         """
         Coleta e processa os dados para o perfil do aluno.
         Agora busca apenas provas das turmas em que o aluno está matriculado.
@@ -312,7 +364,7 @@ class AnalyticsService:
         from models.prova_turma import ProvaTurma
         from models.prova_questao import ProvaQuestao
         
-        aluno = db.query(Aluno).filter(Aluno.idUser == user_id).first()
+        aluno = db.get(Aluno, aluno_id)
         if not aluno:
             return None
 
@@ -440,7 +492,7 @@ class AnalyticsService:
                     "professor": prova_turma.professor,
                     "data_inicio": prova_turma.data_inicio,
                     "data_expiracao": prova_turma.data_expiracao,
-                    "status": prova_turma.status,
+                    "status": prova_turma.status_efetivo,
                     "resultado": resultado if resultado and resultado.prova_id == prova_turma.prova.id else None
                 })
 
@@ -480,11 +532,15 @@ class AnalyticsService:
 
         # Buscar resultados do aluno por disciplina
         resultados_por_disciplina = db.query(
-            Prova.materia,
+            Materia.nome.label('materia'),
             func.avg(Resultado.acertos).label('media_acertos')
-        ).join(Resultado).filter(
+        ).select_from(Resultado).join(
+            Prova, Resultado.prova_id == Prova.id
+        ).join(
+            Materia, Prova.materia_id == Materia.id
+        ).filter(
             Resultado.aluno_id == aluno_id
-        ).group_by(Prova.materia).all()
+        ).group_by(Materia.id, Materia.nome).all()
 
         # Buscar progressão do aluno
         progressao = db.query(
@@ -0,0 +1,39 @@
+import os
+from fastapi import BackgroundTasks
+from sqlalchemy.orm import Session
+from dao.notificacao_dao import NotificacaoDAO
+
+# NOTIFICACOES_EM_SEGUNDO_PLANO=0 faz o envio dentro da própria requisição
+EM_SEGUNDO_PLANO = os.getenv("NOTIFICACOES_EM_SEGUNDO_PLANO", "1") == "1"
+
+
+class NotificacaoService:
+    """Envio de notificações em lote, opcionalmente fora da requisição HTTP."""
+
+    @staticmethod
+    def _notificar_formulario_com_sessao_propria(formulario_id: int):
+        from dao.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            total = NotificacaoDAO.notificar_novo_formulario(db, formulario_id)
+            print(f"Formulário {formulario_id}: {total} notificação(ões) criada(s).")
+        except Exception as e:
+            db.rollback()
+            print(f"Erro ao notificar alunos do formulário {formulario_id}: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def disparar_novo_formulario(db: Session, background_tasks: BackgroundTasks, formulario_id: int):
+        """
+        Agenda a notificação dos alunos para depois da resposta ao gestor.
+        Sem SessionLocal (testes) ou com o modo em segundo plano desligado,
+        notifica imediatamente usando a sessão da requisição.
+        """
+        from dao.database import SessionLocal
+
+        if EM_SEGUNDO_PLANO and SessionLocal is not None:
+            background_tasks.add_task(NotificacaoService._notificar_formulario_com_sessao_propria, formulario_id)
+            return None
+        return NotificacaoDAO.notificar_novo_formulario(db, formulario_id)
@@ -0,0 +1,155 @@
+"""
+Pedidos de relatório gerados em segundo plano.
+
+O gestor pede o relatório (POST), recebe o id do pedido, consulta a situação e
+baixa o arquivo quando ficar pronto. Os workers do agendador reservam e geram
+os pedidos; o arquivo fica em RELATORIOS_DIR até vencer (RELATORIOS_VALIDADE) e
+então é apagado pela tarefa de limpeza.
+
+Pedidos idênticos (mesmo tipo, parâmetros e solicitante) enquanto o primeiro
+ainda está na fila ou em geração viram o mesmo pedido.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from dao.relatorio_job_dao import RelatorioJobDAO
+from models.relatorio_job import RelatorioJob, StatusRelatorioJob
+
+RELATORIOS_DIR = Path(os.getenv(
+    "RELATORIOS_DIR", Path(__file__).resolve().parent.parent / "relatorios_gerados"
+))
+RELATORIOS_VALIDADE = int(os.getenv("RELATORIOS_VALIDADE", "3600"))
+RELATORIOS_MAX_TENTATIVAS = int(os.getenv("RELATORIOS_MAX_TENTATIVAS", "3"))
+
+
+def _relatorio_dashboard_gestor(db: Session, parametros: dict):
+    from services.relatorios_service import RelatorioService
+    from utils.export_service import DOCX_MEDIA_TYPE
+
+    buffer = RelatorioService.gerar_relatorio_geral_dashboard(db, parametros["gestor_id"])
+    nome = f"relatorio_geral_dashboard_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
+    return buffer.getvalue(), nome, DOCX_MEDIA_TYPE
+
+
+def _relatorio_gestor_docx(db: Session, parametros: dict):
+    from services.relatorios_service import RelatorioService
+    from utils.export_service import DOCX_MEDIA_TYPE, gerar_docx
+
+    dados = RelatorioService.get_gestor_report_data(db)
+    conteudo = gerar_docx("Relatório do Gestor", RelatorioService.secoes_relatorio_gestor(dados))
+    return conteudo, "relatorio_gestor.docx", DOCX_MEDIA_TYPE
+
+
+def _relatorio_gestor_pdf(db: Session, parametros: dict):
+    from app_config import templates
+    from services.relatorios_service import RelatorioService
+    from utils import export_service
+
+    if not export_service.has_weasyprint:
+        raise RuntimeError("WeasyPrint nao instalado.")
+    dados = RelatorioService.get_gestor_report_data(db)
+    # Sem requisição HTTP: o template só usa request.url.path (menu lateral)
+    html = templates.get_template("gestor/relatorios.html").render(
+        request={"url": {"path": "/relatorios"}}, dados=dados
+    )
+    return export_service.gerar_pdf(html, "relatorio_gestor.pdf"), "relatorio_gestor.pdf", "application/pdf"
+
+
+# tipo -> função(db, parametros) que retorna (conteúdo, nome do arquivo, media type)
+GERADORES = {
+    "dashboard_gestor": _relatorio_dashboard_gestor,
+    "relatorio_gestor_docx": _relatorio_gestor_docx,
+    "relatorio_gestor_pdf": _relatorio_gestor_pdf,
+}
+
+
+class RelatorioJobService:
+    @staticmethod
+    def solicitar(db: Session, tipo: str, parametros: dict, solicitante_id: int) -> RelatorioJob:
+        """Cria o pedido (ou devolve o idêntico em andamento). Levanta ValueError para tipo desconhecido."""
+        if tipo not in GERADORES:
+            raise ValueError(f"Tipo de relatório desconhecido: {tipo}")
+        parametros_json = json.dumps(parametros, sort_keys=True, separators=(",", ":"))
+        chave = hashlib.sha256(f"{tipo}|{parametros_json}|{solicitante_id}".encode("utf-8")).hexdigest()
+        return RelatorioJobDAO.criar_ou_reutilizar(db, tipo, parametros_json, solicitante_id, chave)
+
+    @staticmethod
+    def caminho_do_arquivo(job: RelatorioJob) -> Path:
+        return RELATORIOS_DIR / job.arquivo
+
+    @staticmethod
+    def processar_job(db: Session, job: RelatorioJob) -> StatusRelatorioJob:
+        """Gera o arquivo de um pedido reservado e registra o desfecho."""
+        job_id = job.id
+        try:
+            if job.tentativas > RELATORIOS_MAX_TENTATIVAS:
+                raise RuntimeError("Número máximo de tentativas excedido")
+            conteudo, nome_arquivo, media_type = GERADORES[job.tipo](db, json.loads(job.parametros))
+
+            # Grava em arquivo temporário e renomeia: o download nunca vê um arquivo pela metade
+            RELATORIOS_DIR.mkdir(parents=True, exist_ok=True)
+            arquivo = f"{job_id}_{os.urandom(8).hex()}{Path(nome_arquivo).suffix}"
+            descritor, temporario = tempfile.mkstemp(dir=RELATORIOS_DIR, suffix=".parcial")
+            with os.fdopen(descritor, "wb") as saida:
+                saida.write(conteudo)
+            os.replace(temporario, RELATORIOS_DIR / arquivo)
+
+            job = db.get(RelatorioJob, job_id)
+            job.arquivo = arquivo
+            job.nome_arquivo = nome_arquivo
+            job.media_type = media_type
+            RelatorioJobDAO.finalizar(db, job, StatusRelatorioJob.CONCLUIDO)
+            job.expira_em = job.data_conclusao + timedelta(seconds=RELATORIOS_VALIDADE)
+            db.commit()
+            return StatusRelatorioJob.CONCLUIDO
+        except Exception as e:
+            db.rollback()
+            print(f"Erro ao gerar relatório {job_id}: {e}")
+            job = db.get(RelatorioJob, job_id)
+            RelatorioJobDAO.finalizar(db, job, StatusRelatorioJob.ERRO, erro=str(e))
+            db.commit()
+            return StatusRelatorioJob.ERRO
+
+    @staticmethod
+    def processar_pendentes(db: Session, duracao_reserva: int = 300, max_jobs: int = 10) -> int:
+        """Reserva e gera pedidos até esvaziar a fila (ou até `max_jobs`). Retorna quantos processou."""
+        processados = 0
+        for _ in range(max_jobs):
+            job = RelatorioJobDAO.reservar(db, duracao_reserva)
+            if job is None:
+                break
+            RelatorioJobService.processar_job(db, job)
+            processados += 1
+        return processados
+
+    @staticmethod
+    def remover_vencidos(db: Session) -> int:
+        """Apaga os arquivos vencidos e marca os pedidos como expirados."""
+        vencidos = RelatorioJobDAO.get_vencidos(db, datetime.now())
+        for job in vencidos:
+            try:
+                RelatorioJobService.caminho_do_arquivo(job).unlink(missing_ok=True)
+            except OSError as e:
+                print(f"Erro ao remover relatório {job.id}: {e}")
+                continue
+            job.status = StatusRelatorioJob.EXPIRADO
+            job.arquivo = None
+        db.commit()
+        return len(vencidos)
+
+    @staticmethod
+    def como_dict(job: RelatorioJob) -> dict:
+        """Situação do pedido para a consulta periódica da página."""
+        dados = {"id": job.id, "tipo": job.tipo, "status": job.status.value}
+        if job.status == StatusRelatorioJob.CONCLUIDO:
+            dados["download_url"] = f"/gestor/relatorios/jobs/{job.id}/download"
+            dados["expira_em"] = job.expira_em.isoformat() if job.expira_em else None
+        elif job.status == StatusRelatorioJob.ERRO:
+            dados["erro"] = job.erro
+        return dados
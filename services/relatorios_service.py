@@ -11,6 +11,7 @@ import os
 from sqlalchemy.orm import Session
 from sqlalchemy import func, distinct
 from services.graficos_service import AnalyticsService
+from utils.cache import cache_relatorios
 
 
 class RelatorioService:
@@ -326,6 +327,28 @@ class RelatorioService:
                 else:
                     row_cells[1].text = "0"
         
+        # Desempenho por turma cadastrada
+        doc.add_heading('6.3 Desempenho por Turma', level=2)
+        desempenho_turmas = dashboard_data['desempenho_turmas']
+        if desempenho_turmas['labels']:
+            desempenho_table = doc.add_table(rows=1, cols=2)
+            desempenho_table.alignment = WD_TABLE_ALIGNMENT.CENTER
+            
+            hdr_cells = desempenho_table.rows[0].cells
+            hdr_cells[0].text = 'Turma'
+            hdr_cells[1].text = 'Média de Acertos'
+            
+            for cell in hdr_cells:
+                cell.paragraphs[0].runs[0].font.bold = True
+                cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+            
+            for turma, media_turma in zip(desempenho_turmas['labels'], desempenho_turmas['data']):
+                row_cells = desempenho_table.add_row().cells
+                row_cells[0].text = turma
+                row_cells[1].text = f"{media_turma:.2f}"
+        else:
+            doc.add_paragraph("Nenhum resultado de prova nas turmas.")
+        
         # 7. TOP 10 ALUNOS
         doc.add_heading('7. Top 10 Alunos', level=1)
         top_alunos = dashboard_data['top_alunos']
@@ -425,40 +448,75 @@ class RelatorioService:
         
         return buf
 
+    @staticmethod
+    def secoes_relatorio_gestor(dados: dict) -> dict:
+        """Seções do DOCX do relatório do gestor (exportação direta e pedidos em segundo plano)."""
+        secoes = {
+            "Resumo": (
+                f"Alunos: {dados.get('total_alunos', 0)} | Provas com resultado: {dados.get('total_provas', 0)} | "
+                f"Média geral de acertos: {dados.get('media_geral', '0.0')}"
+            ),
+        }
+        # Gráficos presentes apenas quando os dados trazem as séries
+        for titulo, chave in (("Médias por Matéria", "materias"), ("Médias por Curso", "cursos"),
+                              ("Médias por Turma", "turmas"), ("Participação", "participacao")):
+            if chave in dados:
+                secoes[titulo] = dados[chave]
+        if dados.get("data_geracao"):
+            secoes["Gerado em"] = dados["data_geracao"]
+        return secoes
+
     @staticmethod
     def get_gestor_report_data(db: Session):
         """
         Método para compatibilidade com controllers existentes.
         Retorna dados básicos para relatórios do gestor.
+        O resultado fica em cache, então as exportações PDF e DOCX
+        do mesmo relatório não recalculam os dados; a data de geração
+        é a do pedido, não a do cálculo em cache.
         """
-        # Buscar dados básicos
-        from models.aluno import Aluno
-        from models.prova import Prova
-        from models.resultado import Resultado
-        from sqlalchemy import func
-        
-        total_alunos = db.query(func.count(Aluno.idAluno)).scalar() or 0
-        total_provas = db.query(func.count(distinct(Resultado.prova_id))).scalar() or 0
-        
+        dados = cache_relatorios.obter_ou_calcular(
+            'relatorio_gestor', 'geral', ('resultados', 'alunos', 'turmas', 'resumos_desempenho'),
+            lambda: RelatorioService._calcular_gestor_report_data(db)
+        )
+        return {**dados, 'data_geracao': datetime.now().strftime('%d/%m/%Y às %H:%M')}
+
+    @staticmethod
+    def _calcular_gestor_report_data(db: Session):
+        # Buscar dados básicos (consultas agrupadas, sem carregar os resultados)
+        from services.agregacao_service import AgregacaoService
+
+        total_alunos = AgregacaoService.totais_usuarios(db)['total_alunos']
+        resumo = AgregacaoService.resumo_resultados(db)
+        total_provas = resumo['provas_com_resultado']
+
         # Calcular média geral
-        resultados_acertos = db.query(Resultado.acertos).all()
         media_geral = 0
-        if resultados_acertos:
-            media_geral = sum(r.acertos for r in resultados_acertos) / len(resultados_acertos)
+        if resumo['total_resultados']:
+            media_geral = resumo['soma_acertos'] / resumo['total_resultados']
 
         return {
             'total_alunos': total_alunos,
             'total_provas': total_provas,
             'media_geral': f"{media_geral:.1f}",
-            'data_geracao': datetime.now().strftime('%d/%m/%Y às %H:%M')
+            'turmas': AgregacaoService.medias_por_turma(db)
         }
 
     @staticmethod
     def get_professor_report_data(db: Session, professor_id: int):
         """
         Método para compatibilidade com controllers existentes.
-        Retorna dados básicos para relatórios do professor.
+        Retorna dados básicos para relatórios do professor (em cache por professor,
+        com a data de geração do pedido).
         """
+        dados = cache_relatorios.obter_ou_calcular(
+            'relatorio_professor', professor_id, ('turmas', 'provas', 'banco_questoes'),
+            lambda: RelatorioService._calcular_professor_report_data(db, professor_id)
+        )
+        return {**dados, 'data_geracao': datetime.now().strftime('%d/%m/%Y às %H:%M')}
+
+    @staticmethod
+    def _calcular_professor_report_data(db: Session, professor_id: int):
         from models.prova import Prova
         from models.resultado import Resultado
         from models.turma import Turma
@@ -474,6 +532,5 @@ class RelatorioService:
         return {
             'turmas_count': turmas_count,
             'questoes_count': questoes_count,
-            'provas_count': provas_count,
-            'data_geracao': datetime.now().strftime('%d/%m/%Y às %H:%M')
+            'provas_count': provas_count
         }
\ No newline at end of file
@@ -0,0 +1,211 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, union_all, literal, cast, case, insert, update, delete, exists, String
+from sqlalchemy.exc import IntegrityError
+from models.resumo_desempenho import ResumoDesempenho
+from models.resultado import Resultado
+from models.aluno import Aluno
+from models.prova import Prova
+from models.materia import Materia
+from models.prova_turma import ProvaTurma
+from models.aluno_turma import AlunoTurma, StatusAlunoTurma
+
+CAMPOS_RESUMO = (
+    'total_resultados', 'soma_acertos', 'soma_notas', 'qtd_acertos_7',
+    'qtd_insuficiente', 'qtd_regular', 'qtd_suficiente'
+)
+DIMENSOES = ('prova', 'turma', 'materia', 'curso_ano', 'municipio')
+
+
+class ResumoService:
+    """
+    Mantém a tabela resumos_desempenho, que guarda somas e contagens de
+    resultados por prova, turma, matéria, curso/ano e município.
+    Os dashboards leem essas linhas (uma por grupo) em vez de varrer resultados.
+
+    Um resultado entra no grupo da turma quando a prova foi disponibilizada
+    para a turma (ProvaTurma) e o aluno está ativo nela (AlunoTurma): os
+    vínculos são mantidos por vincular_turma/desvincular_turma.
+    """
+
+    @staticmethod
+    def _consulta_grupos(filtro=None, dimensoes=DIMENSOES):
+        """
+        UNION ALL com as métricas das dimensões pedidas, opcionalmente restrito
+        aos resultados que satisfazem `filtro`.
+        """
+        def metricas():
+            return (
+                func.count(Resultado.id).label('total_resultados'),
+                func.coalesce(func.sum(Resultado.acertos), 0).label('soma_acertos'),
+                func.coalesce(func.sum(Resultado.nota), 0).label('soma_notas'),
+                func.sum(case((Resultado.acertos >= 7, 1), else_=0)).label('qtd_acertos_7'),
+                func.sum(case((Resultado.situacao == 'Insuficiente', 1), else_=0)).label('qtd_insuficiente'),
+                func.sum(case((Resultado.situacao == 'Regular', 1), else_=0)).label('qtd_regular'),
+                func.sum(case((Resultado.situacao == 'Suficiente', 1), else_=0)).label('qtd_suficiente')
+            )
+
+        def grupo(dimensao, chave, *joins):
+            consulta = select(
+                literal(dimensao).label('dimensao'),
+                chave.label('chave'),
+                *metricas()
+            ).select_from(Resultado)
+            for alvo, condicao in joins:
+                consulta = consulta.join(alvo, condicao)
+            if filtro is not None:
+                consulta = consulta.where(filtro)
+            return consulta.group_by(chave)
+
+        com_aluno = (Aluno, Resultado.aluno_id == Aluno.idAluno)
+        curso_ano = Aluno.curso + literal('|') + func.coalesce(cast(Aluno.ano, String(255)), '')
+
+        # EXISTS em prova_turmas: a mesma prova disponibilizada duas vezes para a turma conta uma vez só
+        na_turma = (
+            AlunoTurma,
+            (AlunoTurma.aluno_id == Resultado.aluno_id) & (AlunoTurma.status == StatusAlunoTurma.ATIVO)
+            & exists().where(ProvaTurma.prova_id == Resultado.prova_id, ProvaTurma.turma_id == AlunoTurma.turma_id)
+        )
+        grupos = {
+            'prova': lambda: grupo('prova', cast(Resultado.prova_id, String(255))),
+            'turma': lambda: grupo('turma', cast(AlunoTurma.turma_id, String(255)), na_turma),
+            'materia': lambda: grupo(
+                'materia', Materia.chave, (Prova, Resultado.prova_id == Prova.id), (Materia, Prova.materia_id == Materia.id)
+            ),
+            'curso_ano': lambda: grupo('curso_ano', curso_ano, com_aluno),
+            'municipio': lambda: grupo('municipio', Aluno.municipio, com_aluno)
+        }
+        return union_all(*(grupos[dimensao]() for dimensao in dimensoes))
+
+    @staticmethod
+    def _aplicar(db: Session, linhas, sinal: int):
+        """Soma (sinal=1) ou subtrai (sinal=-1) as métricas nas linhas do resumo."""
+        for linha in linhas:
+            valores = {campo: (linha[campo] or 0) * sinal for campo in CAMPOS_RESUMO}
+            filtro = (ResumoDesempenho.dimensao == linha['dimensao']) & (ResumoDesempenho.chave == linha['chave'])
+            incremento = update(ResumoDesempenho).where(filtro).values({
+                getattr(ResumoDesempenho, campo): getattr(ResumoDesempenho, campo) + valor
+                for campo, valor in valores.items()
+            }).execution_options(synchronize_session=False)
+
+            if db.execute(incremento).rowcount or sinal < 0:
+                continue
+            try:
+                with db.begin_nested():
+                    db.execute(insert(ResumoDesempenho).values(
+                        dimensao=linha['dimensao'], chave=linha['chave'], **valores
+                    ))
+            except IntegrityError:
+                # Outra transação criou a linha ao mesmo tempo: basta incrementar
+                db.execute(incremento)
+
+    @staticmethod
+    def acumular(db: Session, filtro, dimensoes=DIMENSOES):
+        """Adiciona ao resumo os resultados que satisfazem `filtro` (sem commit)."""
+        linhas = db.execute(ResumoService._consulta_grupos(filtro, dimensoes)).mappings().all()
+        ResumoService._aplicar(db, linhas, 1)
+
+    @staticmethod
+    def descontar(db: Session, filtro, dimensoes=DIMENSOES):
+        """
+        Remove do resumo os resultados que satisfazem `filtro` (sem commit).
+        Deve ser chamado antes de excluir ou alterar esses resultados/alunos.
+        """
+        linhas = db.execute(ResumoService._consulta_grupos(filtro, dimensoes)).mappings().all()
+        ResumoService._aplicar(db, linhas, -1)
+
+    @staticmethod
+    def registrar_resultado(db: Session, resultado: Resultado):
+        """Atualiza o resumo com um Resultado recém-adicionado à sessão (sem commit)."""
+        db.flush()
+        ResumoService.acumular(db, Resultado.id == resultado.id)
+
+    @staticmethod
+    def atualizar_grupos_aluno(db: Session, aluno: Aluno, **novos_valores):
+        """
+        Atribui curso/ano/município ao aluno mantendo o resumo coerente:
+        os resultados saem dos grupos antigos e entram nos novos.
+        """
+        mudou = any(getattr(aluno, campo) != valor for campo, valor in novos_valores.items())
+        if mudou:
+            ResumoService.descontar(db, Resultado.aluno_id == aluno.idAluno)
+        for campo, valor in novos_valores.items():
+            setattr(aluno, campo, valor)
+        if mudou:
+            db.flush()
+            ResumoService.acumular(db, Resultado.aluno_id == aluno.idAluno)
+
+    @staticmethod
+    def atualizar_materia_prova(db: Session, prova: Prova, materia: str):
+        """
+        Atribui a matéria à prova mantendo o resumo coerente: os resultados da
+        prova saem do grupo da matéria antiga e entram no da nova.
+        """
+        mudou = prova.materia != materia
+        if mudou:
+            ResumoService.descontar(db, Resultado.prova_id == prova.id)
+        prova.materia = materia
+        if mudou:
+            db.flush()  # o before_update de Prova recalcula materia_id
+            ResumoService.acumular(db, Resultado.prova_id == prova.id)
+
+    @staticmethod
+    def vincular_turma(db: Session, filtro):
+        """
+        Soma no grupo da turma os resultados do vínculo que acabou de valer
+        (aluno ativo na turma ou prova disponibilizada para ela), após o flush.
+        `filtro` restringe por AlunoTurma/Resultado (ex.: AlunoTurma.id == x). Sem commit.
+        """
+        ResumoService.acumular(db, filtro, ('turma',))
+
+    @staticmethod
+    def desvincular_turma(db: Session, filtro):
+        """Tira do grupo da turma os resultados do vínculo, antes de removê-lo ou inativá-lo (sem commit)."""
+        ResumoService.descontar(db, filtro, ('turma',))
+
+    @staticmethod
+    def atualizar_status_aluno_turma(db: Session, aluno_turma: AlunoTurma, status: StatusAlunoTurma):
+        """
+        Atribui o status à matrícula mantendo o resumo coerente: os resultados
+        do aluno nas provas da turma saem do grupo dela ao sair do status ATIVO
+        e voltam ao ser reativados.
+        """
+        filtro = AlunoTurma.id == aluno_turma.id
+        if aluno_turma.id is not None and aluno_turma.status == StatusAlunoTurma.ATIVO:
+            ResumoService.desvincular_turma(db, filtro)
+        aluno_turma.status = status
+        db.flush()
+        if status == StatusAlunoTurma.ATIVO:
+            ResumoService.vincular_turma(db, AlunoTurma.id == aluno_turma.id)
+
+    @staticmethod
+    def alterar_prova_turma(db: Session, prova_id: int, turma_id: int, alteracao):
+        """
+        Executa `alteracao` (adicionar ou remover uma ProvaTurma) mantendo o
+        grupo da turma coerente. Desconta e soma de novo os resultados da prova
+        na turma, então outra disponibilização da mesma prova não conta duas vezes.
+        """
+        filtro = (Resultado.prova_id == prova_id) & (AlunoTurma.turma_id == turma_id)
+        ResumoService.desvincular_turma(db, filtro)
+        alteracao()
+        db.flush()
+        ResumoService.vincular_turma(db, filtro)
+
+    @staticmethod
+    def reconstruir(db: Session, dimensoes=DIMENSOES) -> int:
+        """Recalcula o resumo (todas as dimensões ou só as pedidas) a partir de resultados (backfill/correção)."""
+        db.execute(delete(ResumoDesempenho).where(ResumoDesempenho.dimensao.in_(dimensoes)))
+        db.execute(insert(ResumoDesempenho).from_select(
+            ['dimensao', 'chave', *CAMPOS_RESUMO],
+            ResumoService._consulta_grupos(dimensoes=dimensoes)
+        ))
+        db.commit()
+        return db.query(func.count(ResumoDesempenho.id)).scalar()
+
+    @staticmethod
+    def por_dimensao(db: Session, *dimensoes) -> dict:
+        """Retorna {dimensao: {chave: {campo: valor}}} para as dimensões pedidas."""
+        linhas = db.query(ResumoDesempenho).filter(ResumoDesempenho.dimensao.in_(dimensoes)).all()
+        resumo = {dimensao: {} for dimensao in dimensoes}
+        for linha in linhas:
+            resumo[linha.dimensao][linha.chave] = {campo: getattr(linha, campo) for campo in CAMPOS_RESUMO}
+        return resumo
@@ -0,0 +1,195 @@
+"""
+Teste de carga do envio de provas: N alunos enviando a mesma prova ao mesmo tempo,
+como no fim do prazo de uma disponibilização.
+
+Compara o envio direto (correção dentro da requisição) com o modo fila
+(PROVAS_ENVIO_EM_FILA): no modo fila mede a latência do envio e, separadamente,
+o tempo que os workers levam para esvaziar a fila.
+
+Usa um arquivo SQLite temporário (cada thread com sua conexão), o que serializa as
+gravações; os números servem para comparar os modos, não para dimensionar o MySQL.
+
+Uso: python teste/benchmarks/bench_envio_concorrente.py [--alunos 300] [--concorrencia 50]
+                                                         [--questoes 20] [--workers 4]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils_benchmark  # noqa: F401 - configura path e TESTING
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, event
+from sqlalchemy.orm import sessionmaker
+
+
+def argumento(nome, padrao):
+    return int(sys.argv[sys.argv.index(nome) + 1]) if nome in sys.argv else padrao
+
+
+def criar_banco(caminho):
+    from dao.database import Base
+    import models  # noqa: F401 - registra todos os modelos no metadata
+
+    engine = create_engine(f"sqlite:///{caminho}", connect_args={"check_same_thread": False, "timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def _wal(conexao, _):
+        conexao.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def popular(fabrica, total_alunos, total_questoes):
+    from models.usuario import Usuario
+    from models.aluno import Aluno
+    from models.professor import Professor
+    from models.campus import Campus
+    from models.prova import Prova
+    from models.banco_questoes import BancoQuestoes
+    from models.prova_questao import ProvaQuestao
+
+    db = fabrica()
+    db.execute(insert(Usuario), [
+        {"id": i, "email": f"aluno{i}@teste.com", "senha_hash": "x", "tipo": "aluno"}
+        for i in range(1, total_alunos + 2)
+    ])
+    db.execute(insert(Campus), [{"id": 1, "nome": "Campus"}])
+    db.execute(insert(Professor), [{"id": total_alunos + 1, "nome": "Professor", "campus_id": 1}])
+    db.execute(insert(Aluno), [
+        {"idAluno": i, "idUser": i, "nome": f"Aluno {i}", "ano": 1, "curso": "Informática", "idade": 16,
+         "municipio": "Fortaleza", "zona": "urbana", "origem_escolar": "pública"}
+        for i in range(1, total_alunos + 1)
+    ])
+    prova = Prova(titulo="Simulado", materia="Matemática", professor_id=total_alunos + 1)
+    db.add(prova)
+    db.flush()
+    for ordem in range(1, total_questoes + 1):
+        questao = BancoQuestoes(
+            professor_id=total_alunos + 1, enunciado=f"Questão {ordem}", opcao_a="a", opcao_b="b",
+            opcao_c="c", opcao_d="d", opcao_e="e", resposta_correta="ABCDE"[ordem % 5], materia="Matemática"
+        )
+        db.add(questao)
+        db.flush()
+        db.add(ProvaQuestao(prova_id=prova.id, questao_banco_id=questao.id, ordem=ordem))
+    db.commit()
+    questao_ids = [pq.questao_banco_id for pq in db.query(ProvaQuestao).filter_by(prova_id=prova.id)]
+    db.close()
+    return prova.id, questao_ids
+
+
+def criar_app(fabrica):
+    from dao.database import get_db
+    from controllers.aluno_controller import router as aluno_router
+
+    app = FastAPI()
+    app.include_router(aluno_router)
+
+    def override_get_db():
+        db = fabrica()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return app
+
+
+def disparar(app, prova_id, questao_ids, total_alunos, concorrencia):
+    """Envia a prova por todos os alunos com `concorrencia` threads; retorna latências (ms) e tempo total (s)."""
+    from utils.sessao import Principal, COOKIE_SESSAO, criar_token
+
+    locais = threading.local()
+
+    def enviar(aluno_id):
+        if not hasattr(locais, "cliente"):
+            locais.cliente = TestClient(app)
+        dados = {f"questao_{q}": "ABCDE"[(q + aluno_id) % 5] for q in questao_ids}
+        dados["token_submissao"] = f"carga-{aluno_id}"
+        inicio = time.perf_counter()
+        resposta = locais.cliente.post(
+            f"/aluno/prova/{prova_id}/responder", data=dados,
+            cookies={COOKIE_SESSAO: criar_token(Principal(aluno_id, "aluno", aluno_id))}, follow_redirects=False
+        )
+        assert resposta.status_code == 303, resposta.text
+        return (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        latencias = list(executor.map(enviar, range(1, total_alunos + 1)))
+    return latencias, time.perf_counter() - inicio
+
+
+def esvaziar_fila(fabrica, workers):
+    """Processa a fila com `workers` threads, cada uma com sua sessão; retorna o tempo (s)."""
+    from services.correcao_service import CorrecaoService
+
+    def worker(_):
+        db = fabrica()
+        try:
+            total = 0
+            while processadas := CorrecaoService.processar_fila(db, tamanho_lote=25):
+                total += processadas
+            return total
+        finally:
+            db.close()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        total = sum(executor.map(worker, range(workers)))
+    return total, time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    from services import correcao_service
+    from models.resultado import Resultado
+
+    total_alunos = argumento("--alunos", 300)
+    concorrencia = argumento("--concorrencia", 50)
+    total_questoes = argumento("--questoes", 20)
+    workers = argumento("--workers", 4)
+
+    linhas = []
+    for modo in ("direto", "fila"):
+        correcao_service.ENVIO_EM_FILA = modo == "fila"
+        correcao_service.cache_gabaritos.limpar()
+        with tempfile.TemporaryDirectory() as pasta:
+            engine, fabrica = criar_banco(os.path.join(pasta, "carga.db"))
+            prova_id, questao_ids = popular(fabrica, total_alunos, total_questoes)
+            app = criar_app(fabrica)
+
+            latencias, duracao = disparar(app, prova_id, questao_ids, total_alunos, concorrencia)
+            drenagem = None
+            if modo == "fila":
+                processadas, drenagem = esvaziar_fila(fabrica, workers)
+                assert processadas == total_alunos
+
+            db = fabrica()
+            assert db.query(Resultado).count() == total_alunos
+            db.close()
+            engine.dispose()
+        linhas.append((modo, statistics.median(latencias), percentil(latencias, 0.95),
+                       total_alunos / duracao, drenagem))
+
+    print(f"\nEnvio de prova: {total_alunos} alunos, {concorrencia} simultâneos, {total_questoes} questões")
+    print(f"{'modo':<8} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'envios/s':>9} | {'fila (s)':>9}")
+    print("-" * 56)
+    for modo, p50, p95, vazao, drenagem in linhas:
+        fila = f"{drenagem:>9.2f}" if drenagem is not None else f"{'-':>9}"
+        print(f"{modo:<8} | {p50:>9.1f} | {p95:>9.1f} | {vazao:>9.1f} | {fila}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark de login por worker: logins/s e latência de uma rota leve (/healthz)
+disparada ao mesmo tempo, num único event loop como um worker do uvicorn.
+
+Compara a verificação antiga (bcrypt síncrono dentro da rota async, travando o
+event loop) com a rota atual (utils/senha_service, pool de threads).
+
+Uso: python teste/benchmarks/bench_login.py [--logins 40] [--concorrencia 20] [--rounds 12]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import utils_benchmark  # noqa: F401 - configura path e TESTING
+from utils_benchmark import criar_sessao
+
+import httpx
+from fastapi import FastAPI, Form, Depends
+from fastapi.responses import RedirectResponse
+from passlib.hash import bcrypt as bcrypt_passlib
+
+
+def argumento(nome, padrao):
+    return int(sys.argv[sys.argv.index(nome) + 1]) if nome in sys.argv else padrao
+
+
+def criar_app(db, legado: bool):
+    from dao.database import get_db
+    from models.usuario import Usuario
+    from controllers.usuario_controller import router as usuario_router
+
+    app = FastAPI()
+
+    @app.get("/healthz")
+    def health_check():
+        return {"status": "ok"}
+
+    if legado:
+        @app.post("/login")
+        async def login_legado(email: str = Form(...), senha: str = Form(...), db=Depends(get_db)):
+            """Reprodução da rota original, mantida apenas para comparação."""
+            usuario = db.query(Usuario).filter(Usuario.email == email).first()
+            if not usuario or not bcrypt_passlib.verify(senha, usuario.senha_hash):
+                return {"erro": "Email ou senha inválidos"}
+            return RedirectResponse(url="/perfil", status_code=303)
+    else:
+        app.include_router(usuario_router)
+
+    app.dependency_overrides[get_db] = lambda: db
+    return app
+
+
+async def medir(app, emails, concorrencia):
+    """Dispara os logins com `concorrencia` simultâneos e, em paralelo, pings em /healthz."""
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+        limite = asyncio.Semaphore(concorrencia)
+        pings = []
+        terminou = asyncio.Event()
+
+        async def logar(email):
+            async with limite:
+                resposta = await cliente.post("/login", data={"email": email, "senha": "senha123"})
+                assert resposta.status_code == 303, resposta.text
+
+        async def pingar():
+            while not terminou.is_set():
+                inicio = time.perf_counter()
+                await cliente.get("/healthz")
+                pings.append((time.perf_counter() - inicio) * 1000)
+                await asyncio.sleep(0.01)
+
+        tarefa_ping = asyncio.create_task(pingar())
+        inicio = time.perf_counter()
+        await asyncio.gather(*(logar(email) for email in emails))
+        duracao = time.perf_counter() - inicio
+        terminou.set()
+        await tarefa_ping
+    return len(emails) / duracao, statistics.median(pings), max(pings)
+
+
+def main():
+    from utils import senha_service
+    from models.usuario import Usuario
+
+    total = argumento("--logins", 40)
+    concorrencia = argumento("--concorrencia", 20)
+    senha_service.BCRYPT_ROUNDS = argumento("--rounds", senha_service.BCRYPT_ROUNDS)
+
+    db = criar_sessao()
+    senha_hash = senha_service.gerar_hash("senha123")
+    db.add_all([Usuario(email=f"u{i}@teste.com", senha_hash=senha_hash, tipo="professor") for i in range(total)])
+    db.commit()
+    emails = [f"u{i}@teste.com" for i in range(total)]
+
+    print(f"\nLogin: {total} logins, {concorrencia} simultâneos, custo {senha_service.BCRYPT_ROUNDS}, "
+          f"{senha_service.SENHA_THREADS} thread(s) de senha")
+    print(f"{'variante':<10} | {'logins/s':>9} | {'ping p50 (ms)':>13} | {'ping máx (ms)':>13}")
+    print("-" * 56)
+    for variante, legado in (("legado", True), ("pool", False)):
+        vazao, p50, maximo = asyncio.run(medir(criar_app(db, legado), emails, concorrencia))
+        print(f"{variante:<10} | {vazao:>9.1f} | {p50:>13.1f} | {maximo:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark das notificações de formulários pendentes carregadas em /perfil.
+
+Compara a varredura antiga (todos os alunos × formulários a cada acesso) com
+FormularioDAO.get_pendentes_for_aluno, única consulta que o /perfil faz agora
+(só leitura). O custo por acesso não deve crescer com o total de alunos.
+Também mede NotificacaoDAO.sincronizar_pendentes_aluno (cadastro e entrada em
+turma) e a reconciliação global feita pelo agendador.
+
+Uso: python teste/benchmarks/bench_perfil_pendentes.py [--tamanhos 1000,10000,100000]
+                                                       [--legado-max 1000]
+"""
+import sys
+
+from utils_benchmark import criar_sessao, medir, ler_tamanhos, imprimir_tabela
+
+from sqlalchemy import insert, and_
+from models.aluno import Aluno
+from models.formulario import Formulario
+from models.notificacao import Notificacao
+from models.pergunta_formulario import PerguntaFormulario
+from models.resposta_formulario import RespostaFormulario
+from dao.formulario_dao import FormularioDAO
+from dao.notificacao_dao import NotificacaoDAO
+from dao.resposta_formulario_dao import RespostaFormularioDAO
+
+CURSOS = ["Redes de Computadores", "Agropecuária", "Partiu IF"]
+TOTAL_FORMULARIOS = 12
+
+
+def popular(db, total_alunos):
+    db.execute(insert(Aluno), [
+        {"idAluno": i, "idUser": i, "nome": f"Aluno {i}", "ano": 1, "curso": CURSOS[i % len(CURSOS)],
+         "idade": 16, "municipio": "Fortaleza", "zona": "urbana", "origem_escolar": "pública"}
+        for i in range(1, total_alunos + 1)
+    ])
+    # Metade dos formulários é para todos, a outra metade direcionada a um curso
+    db.execute(insert(Formulario), [
+        {"id": i, "titulo": f"Formulário {i}", "curso": CURSOS[i % len(CURSOS)] if i % 2 else None}
+        for i in range(1, TOTAL_FORMULARIOS + 1)
+    ])
+    db.execute(insert(PerguntaFormulario), [
+        {"id": i, "formulario_id": i, "tipo_pergunta": "texto", "enunciado": "Pergunta"}
+        for i in range(1, TOTAL_FORMULARIOS + 1)
+    ])
+    # Cada aluno já respondeu um dos formulários gerais
+    db.execute(insert(RespostaFormulario), [
+        {"aluno_id": i, "formulario_id": 2 * (1 + i % (TOTAL_FORMULARIOS // 2)),
+         "pergunta_id": 2 * (1 + i % (TOTAL_FORMULARIOS // 2)), "resposta_texto": "ok"}
+        for i in range(1, total_alunos + 1)
+    ])
+    db.commit()
+
+
+def verificar_legado(db):
+    """Reprodução da varredura original, mantida apenas para comparação."""
+    for aluno in db.query(Aluno).all():
+        for formulario in FormularioDAO.get_for_aluno(db, aluno.idAluno):
+            if not RespostaFormularioDAO.has_aluno_responded_formulario(db, aluno.idAluno, formulario.id):
+                link = f"/aluno/formularios/{formulario.id}"
+                existente = db.query(Notificacao).filter(and_(
+                    Notificacao.aluno_id == aluno.idAluno, Notificacao.link == link, Notificacao.lida == False
+                )).first()
+                if not existente:
+                    NotificacaoDAO.create_notificacao(db, aluno.idAluno, f"Formulário Pendente: {formulario.titulo}", link=link)
+
+
+def main():
+    tamanhos = ler_tamanhos([1000, 10000, 100000])
+    legado_max = int(sys.argv[sys.argv.index("--legado-max") + 1]) if "--legado-max" in sys.argv else 1000
+    linhas = []
+    for tamanho in tamanhos:
+        db = criar_sessao()
+        popular(db, tamanho)
+        aluno_id = tamanho // 2
+
+        with medir(db) as perfil:
+            FormularioDAO.get_pendentes_for_aluno(db, aluno_id)
+        linhas.append((tamanho, "perfil", perfil["consultas"], perfil["ms"]))
+
+        with medir(db) as novo:
+            NotificacaoDAO.sincronizar_pendentes_aluno(db, aluno_id)
+        linhas.append((tamanho, "por aluno", novo["consultas"], novo["ms"]))
+
+        with medir(db) as repetido:
+            NotificacaoDAO.sincronizar_pendentes_aluno(db, aluno_id)
+        linhas.append((tamanho, "por aluno*", repetido["consultas"], repetido["ms"]))
+
+        with medir(db) as global_:
+            NotificacaoDAO.verificar_formularios_nao_respondidos(db)
+        linhas.append((tamanho, "reconciliar", global_["consultas"], global_["ms"]))
+
+        if tamanho <= legado_max:
+            db.query(Notificacao).delete()
+            db.commit()
+            with medir(db) as antigo:
+                verificar_legado(db)
+            linhas.append((tamanho, "legado", antigo["consultas"], antigo["ms"]))
+        db.close()
+
+    imprimir_tabela("Formulários pendentes em /perfil (* = notificações já existentes)", linhas)
+
+
+if __name__ == "__main__":
+    main()
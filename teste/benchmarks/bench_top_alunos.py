@@ -0,0 +1,89 @@
+"""
+Benchmark do bloco "Top 10 Alunos" do dashboard do gestor.
+
+Compara o laço antigo (uma consulta de resultados por aluno e uma de prova por
+resultado) com AnalyticsService.get_top_alunos (consulta única com ROW_NUMBER).
+
+Uso: python teste/benchmarks/bench_top_alunos.py [--tamanhos 1000,10000,100000]
+                                                 [--legado-max 1000]
+"""
+import random
+import sys
+
+from utils_benchmark import criar_sessao, medir, ler_tamanhos, imprimir_tabela
+
+from sqlalchemy import insert
+from models.aluno import Aluno
+from models.prova import Prova
+from models.resultado import Resultado
+from services.graficos_service import AnalyticsService, normalizar_materia
+from dao.migrar_banco import preencher_materia_id
+
+MATERIAS = ["Português", "portugues", "Matemática", "Ciências da Natureza"]
+RESULTADOS_POR_ALUNO = 3
+
+
+def popular(db, total_alunos):
+    random.seed(42)
+    db.execute(insert(Prova), [
+        {"id": i + 1, "titulo": f"Prova {i}", "materia": materia, "professor_id": 1}
+        for i, materia in enumerate(MATERIAS)
+    ])
+    preencher_materia_id(db)
+    db.execute(insert(Aluno), [
+        {"idAluno": i, "idUser": i, "nome": f"Aluno {i}", "ano": 1 + i % 3, "curso": "Informática",
+         "idade": 15 + i % 4, "municipio": "Fortaleza", "zona": "urbana", "origem_escolar": "pública"}
+        for i in range(1, total_alunos + 1)
+    ])
+    db.execute(insert(Resultado), [
+        {"aluno_id": aluno_id, "prova_id": random.randint(1, len(MATERIAS)), "acertos": random.randint(0, 10),
+         "situacao": "Regular", "nota": 5.0, "total_questoes": 10}
+        for aluno_id in range(1, total_alunos + 1)
+        for _ in range(RESULTADOS_POR_ALUNO)
+    ])
+    db.commit()
+
+
+def top_alunos_legado(db):
+    """Reprodução do laço original, mantida apenas para comparação."""
+    lista = []
+    for aluno in db.query(Aluno).all():
+        resultados_aluno = db.query(Resultado).filter(Resultado.aluno_id == aluno.idAluno).all()
+        notas = [r.acertos for r in resultados_aluno]
+        media = sum(notas) / len(notas) if notas else 0
+        provas_aluno = {}
+        for resultado in resultados_aluno:
+            prova = db.query(Prova).filter(Prova.id == resultado.prova_id).first()
+            if prova:
+                materia_norm = normalizar_materia(prova.materia)
+                if materia_norm not in provas_aluno or resultado.id > provas_aluno[materia_norm]['resultado_id']:
+                    provas_aluno[materia_norm] = {'acertos': resultado.acertos, 'resultado_id': resultado.id}
+        lista.append({'idAluno': aluno.idAluno, 'media': round(media, 2)})
+    return sorted(lista, key=lambda x: x['media'], reverse=True)[:10]
+
+
+def main():
+    tamanhos = ler_tamanhos([1000, 10000, 100000])
+    legado_max = int(sys.argv[sys.argv.index("--legado-max") + 1]) if "--legado-max" in sys.argv else 1000
+    linhas = []
+    for tamanho in tamanhos:
+        db = criar_sessao()
+        popular(db, tamanho)
+
+        with medir(db) as novo:
+            top = AnalyticsService.get_top_alunos(db)
+        linhas.append((tamanho, "agrupada", novo["consultas"], novo["ms"]))
+
+        if tamanho <= legado_max:
+            db.expunge_all()
+            with medir(db) as antigo:
+                top_legado = top_alunos_legado(db)
+            linhas.append((tamanho, "legado", antigo["consultas"], antigo["ms"]))
+            assert [a['media'] for a in top] == [a['media'] for a in top_legado]
+        db.close()
+
+    imprimir_tabela("Top 10 alunos (dashboard do gestor)", linhas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Utilitários compartilhados pelos scripts de benchmark.
+Os benchmarks usam SQLite (em memória por padrão) e não são coletados pelo pytest.
+
+Uso: python teste/benchmarks/<script>.py [--tamanhos 1000,10000]
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Permite executar os scripts a partir da raiz do projeto
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.environ.setdefault("TESTING", "1")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+def criar_sessao(url: str = "sqlite:///:memory:"):
+    """Cria engine e sessão com todas as tabelas dos modelos."""
+    from dao.database import Base
+    import models  # noqa: F401 - registra todos os modelos no metadata
+
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+class ContadorConsultas:
+    """Conta os comandos SQL emitidos por uma engine enquanto estiver ativo."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.total = 0
+
+    def _contar(self, *args, **kwargs):
+        self.total += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._contar)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._contar)
+
+
+@contextmanager
+def medir(db):
+    """Mede tempo (ms) e número de consultas de um bloco."""
+    resultado = {}
+    with ContadorConsultas(db.get_bind()) as contador:
+        inicio = time.perf_counter()
+        yield resultado
+        resultado["ms"] = (time.perf_counter() - inicio) * 1000
+    resultado["consultas"] = contador.total
+
+
+def ler_tamanhos(padrao):
+    """Lê --tamanhos 1000,10000 da linha de comando."""
+    if "--tamanhos" in sys.argv:
+        valor = sys.argv[sys.argv.index("--tamanhos") + 1]
+        return [int(v) for v in valor.split(",")]
+    return padrao
+
+
+def imprimir_tabela(titulo, linhas):
+    print(f"\n{titulo}")
+    print(f"{'alunos':>10} | {'variante':<12} | {'consultas':>9} | {'tempo (ms)':>10}")
+    print("-" * 52)
+    for tamanho, variante, consultas, ms in linhas:
+        print(f"{tamanho:>10} | {variante:<12} | {consultas:>9} | {ms:>10.1f}")
@@ -20,6 +20,17 @@ from sqlalchemy.pool import StaticPool
 # Configurar banco de dados de teste (SQLite em memória)
 TEST_DATABASE_URL = "sqlite:///:memory:"
 
+@pytest.fixture(autouse=True)
+def limpar_cache_relatorios():
+    """Cada teste usa um banco novo: os caches de relatórios, gabaritos e sessões não podem vazar entre testes."""
+    from utils.cache import cache_relatorios
+    from utils import sessao
+    from services.correcao_service import cache_gabaritos
+    cache_relatorios.limpar()
+    cache_gabaritos.limpar()
+    sessao._versoes.limpar()
+    yield
+
 @pytest.fixture(scope="function")
 def db_session():
     """Cria uma sessão de banco de dados de teste isolada para cada teste."""
@@ -32,7 +43,8 @@ def db_session():
     from models import formulario, banco_questoes, prova, questao, resposta
     from models import resultado, notificacao, notificacao_professor
     from models import aluno_turma, prova_turma, prova_questao
-    from models import pergunta_formulario, resposta_formulario
+    from models import pergunta_formulario, resposta_formulario, resposta_formulario_opcao
+    from models import resumo_desempenho, materia, submissao_prova, relatorio_job, contagem_formulario
     
     # Criar engine de teste com SQLite em memória
     engine = create_engine(
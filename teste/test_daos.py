@@ -65,6 +65,101 @@ class TestFormularioDAO:
         assert formulario_geral.id in ids_formularios
         assert formulario_curso.id in ids_formularios
 
+class TestNotificacaoDAO:
+    """Testes para NotificacaoDAO."""
+
+    def test_notificar_novo_formulario_em_lote(self, db_session, aluno_completo):
+        """Notifica de uma vez apenas os alunos do curso alvo."""
+        from dao.formulario_dao import FormularioDAO
+        from dao.notificacao_dao import NotificacaoDAO
+        from models.aluno import Aluno
+        from models.notificacao import Notificacao
+
+        outro = Aluno(
+            idUser=aluno_completo.idUser, nome="Aluno Outro Curso", curso="Agropecuária",
+            idade=17, municipio="Caucaia", zona="rural", origem_escolar="pública"
+        )
+        db_session.add(outro)
+        db_session.commit()
+
+        formulario = FormularioDAO.create(
+            db=db_session,
+            titulo="Pesquisa do Curso",
+            descricao="Teste",
+            curso=aluno_completo.curso
+        )
+
+        assert NotificacaoDAO.notificar_novo_formulario(db_session, formulario.id) == 1
+        notificacoes = db_session.query(Notificacao).all()
+        assert [n.aluno_id for n in notificacoes] == [aluno_completo.idAluno]
+        assert notificacoes[0].titulo == "Novo Formulário: Pesquisa do Curso"
+        assert notificacoes[0].link == f"/aluno/formularios/{formulario.id}"
+        assert notificacoes[0].lida is False
+
+    def test_sincronizar_formularios_pendentes(self, db_session, aluno_completo):
+        """Cria uma notificação por formulário pendente, sem duplicar e ignorando os respondidos."""
+        from dao.formulario_dao import FormularioDAO
+        from dao.notificacao_dao import NotificacaoDAO
+        from dao.pergunta_formulario_dao import PerguntaFormularioDAO
+        from models.notificacao import Notificacao
+        from models.resposta_formulario import RespostaFormulario
+
+        pendente = FormularioDAO.create(db=db_session, titulo="Pendente", descricao=None)
+        respondido = FormularioDAO.create(db=db_session, titulo="Respondido", descricao=None)
+        FormularioDAO.create(db=db_session, titulo="Outro Curso", descricao=None, curso="Agropecuária")
+        pergunta = PerguntaFormularioDAO.create_pergunta(db_session, respondido.id, "texto", "Pergunta?")
+        db_session.add(RespostaFormulario(
+            aluno_id=aluno_completo.idAluno, formulario_id=respondido.id,
+            pergunta_id=pergunta.id, resposta_texto="Sim"
+        ))
+        db_session.commit()
+
+        assert [f.id for f in FormularioDAO.get_pendentes_for_aluno(db_session, aluno_completo.idAluno)] == [pendente.id]
+        assert NotificacaoDAO.sincronizar_pendentes_aluno(db_session, aluno_completo.idAluno) == 1
+        assert NotificacaoDAO.sincronizar_pendentes_aluno(db_session, aluno_completo.idAluno) == 0
+
+        # Notificação lida de formulário ainda pendente é recriada pela reconciliação global
+        NotificacaoDAO.marcar_todas_notificacoes_como_lidas(db_session, aluno_completo.idAluno)
+        assert NotificacaoDAO.verificar_formularios_nao_respondidos(db_session) == 1
+        notificacoes = db_session.query(Notificacao).all()
+        assert len(notificacoes) == 1
+        assert notificacoes[0].lida is False
+        assert notificacoes[0].titulo == "Formulário Pendente: Pendente"
+        assert notificacoes[0].link == f"/aluno/formularios/{pendente.id}"
+
+    def test_paginas_do_aluno_nao_gravam_notificacoes(self, client_com_auth, db_session, aluno_completo):
+        """GET /perfil e /aluno/formularios só leem; as notificações pendentes vêm do agendador."""
+        from dao.formulario_dao import FormularioDAO
+        from models.notificacao import Notificacao
+        from services.agendador_service import tarefa_notificar_formularios_pendentes
+
+        FormularioDAO.create(db=db_session, titulo="Pendente", descricao=None)
+        for rota in ("/perfil", "/aluno/formularios"):
+            assert client_com_auth.get(rota).status_code == 200
+        assert db_session.query(Notificacao).count() == 0
+
+        tarefa_notificar_formularios_pendentes(db_session)
+        assert db_session.query(Notificacao).count() == 1
+
+    def test_notificacoes_de_formulario_obsoleto(self, db_session, aluno_completo):
+        """A leitura ignora notificações de formulários excluídos; a limpeza fica com o agendador."""
+        from dao.formulario_dao import FormularioDAO
+        from dao.notificacao_dao import NotificacaoDAO
+        from models.notificacao import Notificacao
+
+        formulario = FormularioDAO.create(db=db_session, titulo="Temporário", descricao=None)
+        NotificacaoDAO.notificar_novo_formulario(db_session, formulario.id)
+        geral = NotificacaoDAO.create_notificacao(db_session, aluno_completo.idAluno, "Aviso geral")
+        assert len(NotificacaoDAO.get_notificacoes_by_aluno(db_session, aluno_completo.idAluno)) == 2
+
+        FormularioDAO.delete(db_session, formulario.id)
+        notificacoes = NotificacaoDAO.get_notificacoes_by_aluno(db_session, aluno_completo.idAluno)
+        assert [n.id for n in notificacoes] == [geral.id]
+        assert db_session.query(Notificacao).count() == 2
+
+        assert NotificacaoDAO.remover_notificacoes_obsoletas(db_session) == 1
+        assert [n.id for n in db_session.query(Notificacao).all()] == [geral.id]
+
 class TestBancoQuestoesDAO:
     """Testes para BancoQuestoesDAO."""
     
@@ -179,3 +274,37 @@ class TestBancoQuestoesDAO:
         assert questao_propria.id in ids_questoes
         assert questao_publica_outro.id in ids_questoes
 
+
+class TestProvaTurmaDAO:
+    """Testes para ProvaTurmaDAO (expiração de disponibilizações)."""
+
+    def test_expiracao_sem_escrita_e_em_lote(self, db_session, professor_completo):
+        """Prazo vencido já conta como expirada; o agendador grava o status em lote."""
+        from datetime import datetime, timedelta
+        from dao.prova_turma_dao import ProvaTurmaDAO
+        from models.prova import Prova
+        from models.turma import Turma
+        from models.prova_turma import StatusProvaTurma
+
+        prova = Prova(titulo="Prova Prazo", materia="Matemática", professor_id=professor_completo.id)
+        turma = Turma(nome="Turma Prazo", codigo="PRZ001", professor_id=professor_completo.id,
+                      campus_id=professor_completo.campus_id)
+        db_session.add_all([prova, turma])
+        db_session.commit()
+
+        agora = datetime.now()
+        vencida = ProvaTurmaDAO.create(db_session, prova.id, turma.id, professor_completo.id,
+                                       agora - timedelta(days=2), agora - timedelta(hours=1))
+        vigente = ProvaTurmaDAO.create(db_session, prova.id, turma.id, professor_completo.id,
+                                       agora, agora + timedelta(days=1))
+
+        # Leitura não altera o banco, mas já enxerga o prazo
+        assert vencida.status == StatusProvaTurma.ATIVA
+        assert vencida.status_efetivo == StatusProvaTurma.EXPIRADA
+        assert [pt.id for pt in ProvaTurmaDAO.get_active_by_turma(db_session, turma.id)] == [vigente.id]
+        assert [pt.id for pt in ProvaTurmaDAO.get_expired_by_professor(db_session, professor_completo.id)] == [vencida.id]
+
+        assert ProvaTurmaDAO.check_and_update_expired(db_session) == 1
+        db_session.refresh(vencida)
+        assert vencida.status == StatusProvaTurma.EXPIRADA
+        assert ProvaTurmaDAO.get_proxima_expiracao(db_session) == vigente.data_expiracao
@@ -52,6 +52,103 @@ class TestLogin:
         assert response.status_code in [200, 303]
         assert response.status_code != 500
 
+    def test_login_refaz_hash_com_custo_antigo(self, client, db_session, usuario_aluno, monkeypatch):
+        """Testa se o login bem-sucedido refaz o hash gerado com outro BCRYPT_ROUNDS."""
+        from utils import senha_service
+
+        usuario_aluno.senha_hash = senha_service.gerar_hash("senha123", rounds=4)
+        db_session.commit()
+        monkeypatch.setattr(senha_service, "BCRYPT_ROUNDS", 5)
+
+        response = client.post(
+            "/login",
+            data={"email": usuario_aluno.email, "senha": "senha123"},
+            follow_redirects=False
+        )
+        assert response.status_code == 303
+        db_session.refresh(usuario_aluno)
+        assert senha_service.custo_do_hash(usuario_aluno.senha_hash) == 5
+        assert senha_service.verificar_senha("senha123", usuario_aluno.senha_hash)
+        assert not senha_service.verificar_senha("senha123", "hash-invalido")
+
+class TestSessaoAssinada:
+    """Testes para o token de sessão assinado."""
+
+    def test_token_valido_adulterado_e_expirado(self, monkeypatch):
+        """Testa a leitura do token, a rejeição de assinatura inválida e a expiração."""
+        from utils import sessao
+        from utils.sessao import Principal, criar_token, ler_token
+
+        token = criar_token(Principal(7, "aluno", 3))
+        assert ler_token(token) == Principal(7, "aluno", 3)
+
+        corpo, assinatura = token.split(".")
+        outro = criar_token(Principal(1, "gestor", 1)).split(".")[0]
+        assert ler_token(f"{outro}.{assinatura}") is None
+        assert ler_token("7") is None  # cookie antigo, só com o id
+
+        monkeypatch.setattr(sessao, "SESSAO_MAX_IDADE", -1)
+        assert ler_token(criar_token(Principal(8, "aluno", 4))) is None
+
+    def test_dependencias_de_papel_sem_consultas(self, client, usuario_gestor, db_session):
+        """Testa se as rotas protegidas resolvem o papel sem consultar o banco (versão em cache), e o logout."""
+        from fastapi import HTTPException
+        from sqlalchemy import event
+        from starlette.requests import Request
+        from utils.auth import verificar_gestor_sessao, verificar_professor_sessao
+        from utils.sessao import COOKIE_SESSAO
+
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        token = client.cookies.get(COOKIE_SESSAO)
+        requisicao = Request({"type": "http", "headers": [(b"cookie", f"{COOKIE_SESSAO}={token}".encode())]})
+
+        consultas = []
+        def contar(conn, cursor, statement, *args):
+            consultas.append(statement)
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", contar)
+        try:
+            gestor_id = verificar_gestor_sessao(requisicao, db_session)
+            with pytest.raises(HTTPException) as erro:
+                verificar_professor_sessao(requisicao, db_session)
+        finally:
+            event.remove(engine, "before_cursor_execute", contar)
+
+        assert consultas == []
+        assert erro.value.status_code == 303
+        assert gestor_id == usuario_gestor.id
+
+        client.post("/sair", follow_redirects=False)
+        response = client.get("/gestor/dashboard", follow_redirects=False)
+        assert response.status_code == 303
+
+    def test_logout_e_exclusao_revogam_token(self, client, usuario_gestor, usuario_professor, professor_completo,
+                                             db_session):
+        """Testa se uma cópia do cookie deixa de valer após o logout e após a exclusão do usuário."""
+        from utils import sessao
+        from utils.sessao import COOKIE_SESSAO
+
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        copia = client.cookies.get(COOKIE_SESSAO)
+        assert client.get("/gestor/dashboard", follow_redirects=False).status_code == 200
+
+        client.post("/sair", follow_redirects=False)
+        client.cookies.set(COOKIE_SESSAO, copia)
+        assert client.get("/gestor/dashboard", follow_redirects=False).status_code == 303
+
+        # Outro processo: sem a versão em cache, a consulta ao banco também recusa o token
+        sessao._versoes.limpar()
+        assert client.get("/gestor/dashboard", follow_redirects=False).status_code == 303
+
+        client.cookies.clear()
+        client.post("/login", data={"email": usuario_professor.email, "senha": "senha123"}, follow_redirects=False)
+        token_professor = client.cookies.get(COOKIE_SESSAO)
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        response = client.post(f"/gestor/excluir-professor/{usuario_professor.id}", follow_redirects=False)
+        assert response.status_code == 303
+        client.cookies.set(COOKIE_SESSAO, token_professor)
+        assert client.get("/professor/dashboard", follow_redirects=False).status_code == 303
+
 class TestLogout:
     """Testes para logout."""
     
@@ -0,0 +1,139 @@
+"""
+Testes para as migrações versionadas e os índices dos caminhos críticos.
+Verifica, com EXPLAIN QUERY PLAN do SQLite, se as consultas mais frequentes usam os índices.
+"""
+
+
+def plano_de_execucao(db_session, consulta) -> str:
+    """Retorna o EXPLAIN QUERY PLAN (SQLite) de uma consulta SQLAlchemy."""
+    dialeto = db_session.get_bind().dialect
+    compilada = consulta.compile(dialect=dialeto)
+    parametros = []
+    for nome in compilada.positiontup:
+        processador = compilada.binds[nome].type._cached_bind_processor(dialeto)
+        valor = compilada.params[nome]
+        parametros.append(processador(valor) if processador else valor)
+    linhas = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compilada}", tuple(parametros)).all()
+    return " | ".join(linha[-1] for linha in linhas)
+
+
+class TestIndicesCaminhosCriticos:
+    """Testes de uso dos índices compostos pelas consultas frequentes."""
+
+    def test_resultado_do_aluno_na_prova(self, db_session):
+        """Testa busca de resultado por aluno e prova (envio de prova e perfil)."""
+        from sqlalchemy import select
+        from models.resultado import Resultado
+
+        consulta = select(Resultado).where(Resultado.aluno_id == 1, Resultado.prova_id == 2)
+        assert "uq_resultados_aluno_prova" in plano_de_execucao(db_session, consulta)
+
+    def test_resposta_do_aluno_na_questao(self, db_session):
+        """Testa busca de resposta por aluno e questão (correção)."""
+        from sqlalchemy import select
+        from models.resposta import Resposta
+
+        consulta = select(Resposta).where(Resposta.aluno_id == 1, Resposta.questao_id == 2)
+        assert "uq_respostas_aluno_questao" in plano_de_execucao(db_session, consulta)
+
+    def test_varredura_de_expiracao(self, db_session):
+        """Testa a condição de expiração usada pelo agendador."""
+        from datetime import datetime
+        from sqlalchemy import select
+        from models.prova_turma import ProvaTurma, StatusProvaTurma
+
+        consulta = select(ProvaTurma.id).where(
+            ProvaTurma.status == StatusProvaTurma.ATIVA,
+            ProvaTurma.data_expiracao < datetime.now()
+        )
+        assert "ix_prova_turmas_status_expiracao" in plano_de_execucao(db_session, consulta)
+
+    def test_notificacoes_nao_lidas(self, db_session):
+        """Testa a listagem de notificações não lidas, mais recentes primeiro."""
+        from sqlalchemy import select
+        from models.notificacao import Notificacao
+
+        consulta = select(Notificacao).where(
+            Notificacao.aluno_id == 1, Notificacao.lida == False
+        ).order_by(Notificacao.data_criacao.desc())
+        plano = plano_de_execucao(db_session, consulta)
+        assert "ix_notificacoes_aluno_lida_data" in plano
+        assert "TEMP B-TREE" not in plano  # ordenação resolvida pelo índice
+
+    def test_respostas_por_pergunta(self, db_session):
+        """Testa a busca de respostas por formulário e pergunta (análises)."""
+        from sqlalchemy import select
+        from models.resposta_formulario import RespostaFormulario
+
+        consulta = select(RespostaFormulario).where(
+            RespostaFormulario.formulario_id == 1, RespostaFormulario.pergunta_id == 2
+        )
+        assert "ix_respostas_formulario_formulario_pergunta" in plano_de_execucao(db_session, consulta)
+
+
+class TestMigracoesVersionadas:
+    """Testes para dao/migrar_banco.aplicar_migracoes_versionadas."""
+
+    def test_aplica_uma_vez_e_cria_indices_ausentes(self, db_session):
+        """Testa se os passos são registrados e não são reaplicados."""
+        from sqlalchemy import inspect, text
+        from dao.migrar_banco import aplicar_migracoes_versionadas, MIGRACOES
+
+        db_session.execute(text("DROP INDEX ix_prova_turmas_status_expiracao"))
+
+        assert aplicar_migracoes_versionadas(db_session) == [versao for versao, _, _ in MIGRACOES]
+        indices = {i["name"] for i in inspect(db_session.connection()).get_indexes("prova_turmas")}
+        assert "ix_prova_turmas_status_expiracao" in indices
+
+        assert aplicar_migracoes_versionadas(db_session) == []
+
+    def test_envio_unico_remove_duplicados(self, db_session, aluno_completo, professor_completo):
+        """Testa a deduplicação de resultados/respostas antes de criar os índices únicos."""
+        from sqlalchemy import inspect, text
+        from models.prova import Prova
+        from models.resultado import Resultado
+        from models.resposta import Resposta
+        from dao.migrar_banco import aplicar_migracoes_versionadas
+
+        db_session.execute(text("DROP INDEX uq_resultados_aluno_prova"))
+        db_session.execute(text("DROP INDEX uq_respostas_aluno_questao"))
+        prova = Prova(titulo="P", materia="Matemática", professor_id=professor_completo.id)
+        db_session.add(prova)
+        db_session.flush()
+        for acertos in (7, 3):
+            db_session.add(Resultado(aluno_id=aluno_completo.idAluno, prova_id=prova.id, acertos=acertos,
+                                     situacao="Regular", nota=float(acertos), total_questoes=10))
+        for resposta in ("A", "B"):
+            db_session.add(Resposta(aluno_id=aluno_completo.idAluno, questao_id=1, resposta=resposta))
+        db_session.commit()
+
+        aplicar_migracoes_versionadas(db_session)
+
+        assert [r.acertos for r in db_session.query(Resultado).all()] == [7]  # vale o primeiro envio
+        assert [r.resposta for r in db_session.query(Resposta).all()] == ["B"]  # vale a última resposta
+        indices = {i["name"]: i["unique"] for i in inspect(db_session.connection()).get_indexes("resultados")}
+        assert indices.get("uq_resultados_aluno_prova") and "ix_resultados_aluno_prova" not in indices
+
+    def test_materia_id_preenchido_e_resumo_por_materia(self, db_session, aluno_completo, professor_completo):
+        """Testa se o passo de materia_id preenche provas antigas e recalcula o resumo por matéria."""
+        from sqlalchemy import inspect, text
+        from models.prova import Prova
+        from models.resultado import Resultado
+        from dao.migrar_banco import aplicar_migracoes_versionadas
+        from services.resumo_service import ResumoService
+
+        prova = Prova(titulo="P", materia="Matemática", professor_id=professor_completo.id)
+        db_session.add(prova)
+        db_session.flush()
+        db_session.add(Resultado(aluno_id=aluno_completo.idAluno, prova_id=prova.id, acertos=6,
+                                 situacao="Regular", nota=6.0, total_questoes=10))
+        db_session.execute(text("UPDATE provas SET materia_id = NULL"))  # prova anterior à coluna
+        db_session.execute(text("DROP INDEX ix_provas_materia_id"))
+        db_session.commit()
+
+        aplicar_migracoes_versionadas(db_session)
+        db_session.expire_all()
+
+        assert db_session.get(Prova, prova.id).materia_id is not None
+        assert "ix_provas_materia_id" in {i["name"] for i in inspect(db_session.connection()).get_indexes("provas")}
+        assert ResumoService.por_dimensao(db_session, 'materia')['materia']['matematica']['soma_acertos'] == 6
@@ -162,3 +162,40 @@ class TestModeloBancoQuestoes:
         
         assert questao.publica == True
 
+
+class TestModeloMateria:
+    """Testes para a dimensão de matérias."""
+
+    def test_materia_id_mantido_na_gravacao(self, db_session, professor_completo):
+        """Variações de escrita apontam para a mesma matéria e alterações atualizam materia_id."""
+        from models.prova import Prova
+        from models.materia import Materia
+
+        p1 = Prova(titulo="P1", materia="Português", professor_id=professor_completo.id)
+        p2 = Prova(titulo="P2", materia="portugues ", professor_id=professor_completo.id)
+        db_session.add_all([p1, p2])
+        db_session.commit()
+
+        assert p1.materia_id is not None
+        assert p1.materia_id == p2.materia_id
+        materia = db_session.query(Materia).filter(Materia.id == p1.materia_id).one()
+        assert (materia.chave, materia.nome) == ("portugues", "Português")
+
+        p2.materia = "Matemática"
+        db_session.commit()
+        assert p2.materia_id != p1.materia_id
+        assert db_session.query(Materia).count() == 2
+
+    def test_backfill_materia_id(self, db_session, professor_completo):
+        """Registros antigos sem materia_id são preenchidos pela migração."""
+        from sqlalchemy import insert
+        from models.prova import Prova
+        from dao.migrar_banco import preencher_materia_id
+
+        db_session.execute(insert(Prova), [
+            {"titulo": "Antiga 1", "materia": "Ciências da Natureza", "professor_id": professor_completo.id},
+            {"titulo": "Antiga 2", "materia": "ciencias", "professor_id": professor_completo.id},
+        ])
+        assert preencher_materia_id(db_session) == 2
+        materia_ids = {p.materia_id for p in db_session.query(Prova).all()}
+        assert len(materia_ids) == 1 and None not in materia_ids
@@ -72,6 +72,24 @@ class TestRotasAluno:
         assert response.status_code in [303, 401, 403]
         assert response.status_code != 500
 
+    @pytest.mark.parametrize("rota", ["/aluno/turmas", "/aluno/provas", "/aluno/formularios"])
+    def test_rotas_do_aluno_nao_buscam_aluno_pelo_usuario(self, client_com_auth, db_session, rota):
+        """Testa se as rotas do aluno tiram o idAluno do token, sem buscar o aluno pelo idUser."""
+        from sqlalchemy import event
+
+        consultas = []
+        def contar(conn, cursor, statement, *args):
+            consultas.append(statement)
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", contar)
+        try:
+            response = client_com_auth.get(rota, follow_redirects=False)
+        finally:
+            event.remove(engine, "before_cursor_execute", contar)
+
+        assert response.status_code == 200
+        assert not [sql for sql in consultas if "idUser" in sql]
+
 class TestRotasProfessor:
     """Testes para rotas de professor."""
     
@@ -204,3 +222,31 @@ class TestRotasInvalidas:
         assert response.status_code in [303, 400, 404, 422]
         assert response.status_code != 500
 
+
+class TestRotasAsync:
+    """Rotas `async def` rodam no event loop: não podem usar a Session síncrona."""
+
+    def test_rotas_async_nao_usam_sessao_do_banco(self, client):
+        """Falha se uma rota (ou dependência) async depender de get_db."""
+        import inspect
+        from fastapi.routing import APIRoute
+        from dao.database import get_db
+
+        def usa_banco(dependant):
+            return any(dep.call is get_db or usa_banco(dep) for dep in dependant.dependencies)
+
+        def async_com_banco(dependant):
+            for dep in dependant.dependencies:
+                if inspect.iscoroutinefunction(dep.call) and usa_banco(dep):
+                    yield dep.call.__name__
+                yield from async_com_banco(dep)
+
+        bloqueantes = []
+        for rota in client.app.routes:
+            if not isinstance(rota, APIRoute):
+                continue
+            if inspect.iscoroutinefunction(rota.endpoint) and usa_banco(rota.dependant):
+                bloqueantes.append(f"{rota.path} ({rota.endpoint.__name__})")
+            bloqueantes.extend(f"{rota.path} (dependência {nome})" for nome in async_com_banco(rota.dependant))
+
+        assert bloqueantes == [], "Rotas async com acesso síncrono ao banco: " + ", ".join(bloqueantes)
@@ -0,0 +1,1048 @@
+"""
+Testes para os serviços de analytics.
+Verifica os dados agregados usados nos dashboards.
+"""
+import pytest
+
+
+@pytest.fixture
+def resultados_dashboard(db_session, aluno_completo, professor_completo):
+    """Cria provas de matérias variadas e resultados para dois alunos."""
+    from models.aluno import Aluno
+    from models.prova import Prova
+    from models.resultado import Resultado
+    from services.resumo_service import ResumoService
+
+    outro_aluno = Aluno(
+        idUser=aluno_completo.idUser,
+        nome="Outro Aluno",
+        curso="Informática",
+        ano=2,
+        idade=17,
+        municipio="Caucaia",
+        zona="rural",
+        origem_escolar="privada"
+    )
+    db_session.add(outro_aluno)
+
+    provas = [
+        Prova(titulo="P1", materia="Português", professor_id=professor_completo.id),
+        Prova(titulo="P2", materia="portugues", professor_id=professor_completo.id),
+        Prova(titulo="M1", materia="Matemática", professor_id=professor_completo.id),
+        Prova(titulo="C1", materia="Ciências da Natureza", professor_id=professor_completo.id),
+    ]
+    db_session.add_all(provas)
+    db_session.commit()
+
+    def resultado(aluno, prova, acertos):
+        novo = Resultado(
+            aluno_id=aluno.idAluno, prova_id=prova.id, acertos=acertos,
+            situacao="Regular", nota=float(acertos), total_questoes=10
+        )
+        db_session.add(novo)
+        ResumoService.registrar_resultado(db_session, novo)
+        db_session.commit()
+
+    resultado(aluno_completo, provas[0], 4)
+    resultado(aluno_completo, provas[1], 8)  # mais recente de português
+    resultado(aluno_completo, provas[2], 6)
+    resultado(outro_aluno, provas[3], 9)
+    return aluno_completo, outro_aluno
+
+
+@pytest.fixture
+def gestor_dashboard(db_session, usuario_gestor):
+    """Cria o gestor que consulta o dashboard."""
+    from models.gestor import Gestor
+
+    gestor = Gestor(id=usuario_gestor.id, nome="Gestor Dashboard")
+    db_session.add(gestor)
+    db_session.commit()
+    return gestor
+
+
+class TestTopAlunos:
+    """Testes para o ranking de alunos do dashboard do gestor."""
+
+    def test_top_alunos_ordenado_por_media(self, db_session, resultados_dashboard):
+        """Testa se o ranking ordena pela média e usa a nota mais recente de cada matéria."""
+        from services.graficos_service import AnalyticsService
+
+        aluno, outro_aluno = resultados_dashboard
+        top = AnalyticsService.get_top_alunos(db_session)
+
+        assert [a['idAluno'] for a in top] == [outro_aluno.idAluno, aluno.idAluno]
+        assert top[0]['media'] == 9.0
+        assert top[0]['nota_ciencias'] == 9
+        assert top[1]['media'] == 6.0
+        assert top[1]['nota_portugues'] == 8
+        assert top[1]['nota_matematica'] == 6
+        assert top[1]['nota_ciencias'] == 0
+        assert top[1]['turma'] == aluno.curso
+
+    def test_top_alunos_respeita_limite(self, db_session, resultados_dashboard):
+        """Testa se o limite é aplicado na consulta."""
+        from services.graficos_service import AnalyticsService
+
+        top = AnalyticsService.get_top_alunos(db_session, limite=1)
+        assert len(top) == 1
+
+
+class TestListagemAlunos:
+    """Testes para a listagem paginada de alunos do gestor."""
+
+    def test_notas_recentes_e_ordenacao(self, db_session, resultados_dashboard):
+        """Testa notas mais recentes por matéria, ordenação por média e paginação."""
+        from services.graficos_service import AnalyticsService
+
+        aluno, outro_aluno = resultados_dashboard
+        listagem = AnalyticsService.listar_alunos_com_notas(db_session, ordenar="media_desc", por_pagina=1)
+
+        assert listagem['total'] == 2
+        assert listagem['total_paginas'] == 2
+        (primeiro, nota_portugues, nota_matematica, nota_ciencias, media), = listagem['alunos']
+        assert primeiro.idAluno == aluno.idAluno
+        assert (nota_portugues, nota_matematica, nota_ciencias) == (8, 6, 0)
+        assert round(media, 2) == 4.67
+
+        segunda = AnalyticsService.listar_alunos_com_notas(db_session, ordenar="media_desc", por_pagina=1, pagina=2)
+        assert [linha[0].idAluno for linha in segunda['alunos']] == [outro_aluno.idAluno]
+
+    def test_filtros(self, db_session, resultados_dashboard):
+        """Testa filtros por atributos do aluno e por situação."""
+        from services.graficos_service import AnalyticsService
+
+        aluno, outro_aluno = resultados_dashboard
+        rural = AnalyticsService.listar_alunos_com_notas(db_session, zona="rural")
+        assert [linha[0].idAluno for linha in rural['alunos']] == [outro_aluno.idAluno]
+        assert AnalyticsService.listar_alunos_com_notas(db_session, situacao="suficiente")['total'] == 0
+        assert AnalyticsService.listar_alunos_com_notas(db_session, situacao="insuficiente")['total'] == 2
+
+
+class TestDashboardGestor:
+    """Testes para os dados agregados do dashboard do gestor."""
+
+    def test_cards_e_distribuicoes(self, db_session, gestor_dashboard, resultados_dashboard):
+        """Testa cards, distribuições e médias calculados pelas consultas agrupadas."""
+        from services.graficos_service import AnalyticsService
+
+        dados = AnalyticsService.get_dashboard_data_for_gestor(db_session, gestor_dashboard.id)
+
+        assert dados['cards']['total_alunos'] == 2
+        assert dados['cards']['total_provas'] == 4
+        assert dados['cards']['media_geral'] == "6.8"
+        assert dados['cards']['percentual_suficiente'] == "50.0"
+        assert dados['zona_distribuicao']['data'] == [1, 1]
+        assert dados['desempenho_disciplina']['labels'] == ['Português', 'Matemática', 'Ciências']
+        assert dados['desempenho_disciplina']['data'] == [6.0, 6.0, 9.0]
+        assert dados['progressao_alunos'] == {'labels': ['1', '2'], 'data': [6.0, 9.0]}
+        assert dados['taxa_participacao']['data'] == [2, 0]
+
+    def test_numero_de_consultas_fixo(self, db_session, gestor_dashboard, resultados_dashboard):
+        """Testa se o dashboard não emite consultas proporcionais ao número de resultados."""
+        from sqlalchemy import event
+        from services.graficos_service import AnalyticsService
+
+        consultas = []
+        engine = db_session.get_bind()
+        contar = lambda *args, **kwargs: consultas.append(1)
+        event.listen(engine, "before_cursor_execute", contar)
+        try:
+            AnalyticsService.get_dashboard_data_for_gestor(db_session, gestor_dashboard.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", contar)
+
+        assert len(consultas) <= 8
+
+
+class TestResumoDesempenho:
+    """Testes para o resumo materializado de resultados."""
+
+    def test_incremental_igual_a_reconstrucao(self, db_session, resultados_dashboard):
+        """Testa se o resumo mantido a cada resultado coincide com o recalculado do zero."""
+        from services.resumo_service import ResumoService
+
+        dimensoes = ('prova', 'turma', 'materia', 'curso_ano', 'municipio')
+        incremental = ResumoService.por_dimensao(db_session, *dimensoes)
+        ResumoService.reconstruir(db_session)
+        reconstruido = ResumoService.por_dimensao(db_session, *dimensoes)
+
+        assert incremental == reconstruido
+        assert incremental['municipio']['Fortaleza']['soma_acertos'] == 18
+        assert incremental['curso_ano']['Informática|2']['total_resultados'] == 1
+
+    def test_descontar_ao_mudar_curso(self, db_session, resultados_dashboard):
+        """Testa se mudar o curso do aluno move seus resultados para o novo grupo."""
+        from services.resumo_service import ResumoService
+
+        aluno, _ = resultados_dashboard
+        ResumoService.atualizar_grupos_aluno(db_session, aluno, curso="Agropecuária")
+        db_session.commit()
+
+        curso_ano = ResumoService.por_dimensao(db_session, 'curso_ano')['curso_ano']
+        assert curso_ano['Redes de Computadores|1']['total_resultados'] == 0
+        assert curso_ano['Agropecuária|1']['total_resultados'] == 3
+
+    def test_grupo_da_turma_acompanha_vinculos(self, db_session, resultados_dashboard, professor_completo,
+                                               campus_teste):
+        """Testa se matrículas e disponibilizações movem os resultados no grupo da turma."""
+        from datetime import datetime, timedelta
+        from dao.aluno_turma_dao import AlunoTurmaDAO
+        from dao.prova_turma_dao import ProvaTurmaDAO
+        from dao.turma_dao import TurmaDAO
+        from models.prova import Prova
+        from models.turma import Turma
+        from services.agregacao_service import AgregacaoService
+        from services.resumo_service import ResumoService
+
+        aluno, _ = resultados_dashboard
+        turma = Turma(nome="Turma A", codigo="TURMAA", professor_id=professor_completo.id, campus_id=campus_teste.id)
+        db_session.add(turma)
+        db_session.commit()
+        p1, m1 = (db_session.query(Prova).filter_by(titulo=titulo).one() for titulo in ("P1", "M1"))
+        inicio, fim = datetime.now(), datetime.now() + timedelta(days=7)
+
+        def grupo():
+            linha = ResumoService.por_dimensao(db_session, 'turma')['turma'].get(str(turma.id), {})
+            return linha.get('total_resultados', 0), linha.get('soma_acertos', 0)
+
+        ProvaTurmaDAO.create(db_session, p1.id, turma.id, professor_completo.id, inicio, fim)
+        assert grupo() == (0, 0)  # aluno ainda fora da turma
+        AlunoTurmaDAO.create(db_session, aluno.idAluno, turma.id)
+        assert grupo() == (1, 4)
+        ProvaTurmaDAO.create(db_session, m1.id, turma.id, professor_completo.id, inicio, fim)
+        repetida = ProvaTurmaDAO.create(db_session, m1.id, turma.id, professor_completo.id, inicio, fim)
+        assert grupo() == (2, 10)  # disponibilizar de novo não conta duas vezes
+        ProvaTurmaDAO.delete(db_session, repetida.id)
+        assert grupo() == (2, 10)
+        assert AgregacaoService.medias_por_turma(db_session) == {'labels': ["Turma A"], 'data': [5.0]}
+
+        AlunoTurmaDAO.remove_aluno_from_turma(db_session, aluno.idAluno, turma.id)
+        assert grupo() == (0, 0)
+        AlunoTurmaDAO.create(db_session, aluno.idAluno, turma.id)
+        assert grupo() == (2, 10)
+        incremental = ResumoService.por_dimensao(db_session, 'turma')
+        ResumoService.reconstruir(db_session)
+        assert ResumoService.por_dimensao(db_session, 'turma') == incremental
+
+        TurmaDAO.delete(db_session, turma.id)
+        assert grupo() == (0, 0)
+
+    def test_mudar_materia_da_prova(self, client, db_session, resultados_dashboard, professor_completo,
+                                    usuario_professor):
+        """Testa se editar a matéria da prova move seus resultados para o grupo da nova matéria."""
+        from models.banco_questoes import BancoQuestoes
+        from models.prova import Prova
+        from services.resumo_service import ResumoService
+
+        prova = db_session.query(Prova).filter_by(titulo="M1").one()
+        questao = BancoQuestoes(
+            professor_id=professor_completo.id, enunciado="Questão", opcao_a="a", opcao_b="b",
+            opcao_c="c", opcao_d="d", opcao_e="e", resposta_correta="A", materia="Português"
+        )
+        db_session.add(questao)
+        db_session.commit()
+
+        client.post("/login", data={"email": usuario_professor.email, "senha": "senha123"}, follow_redirects=False)
+        response = client.post(
+            f"/professor/prova/{prova.id}/editar",
+            data={"titulo": "M1", "materia": "Português", "questoes_selecionadas": [questao.id]},
+            follow_redirects=False
+        )
+        assert response.status_code == 303
+        db_session.expire_all()
+
+        incremental = ResumoService.por_dimensao(db_session, 'materia')['materia']
+        assert incremental['matematica']['total_resultados'] == 0
+        assert incremental['portugues']['total_resultados'] == 3
+        ResumoService.reconstruir(db_session)
+        reconstruido = ResumoService.por_dimensao(db_session, 'materia')['materia']
+        assert {chave: valores for chave, valores in incremental.items() if valores['total_resultados']} == reconstruido
+
+
+class TestCacheRelatorios:
+    """Testes para o cache de dados de relatórios."""
+
+    def test_cache_reutiliza_e_invalida_apos_gravacao(self, db_session, gestor_dashboard, resultados_dashboard):
+        """Testa se o dashboard vem do cache e é recalculado após gravar em alunos."""
+        from services.graficos_service import AnalyticsService
+        from utils.cache import cache_relatorios
+
+        primeiro = AnalyticsService.get_dashboard_data_for_gestor(db_session, gestor_dashboard.id)
+        AnalyticsService.get_dashboard_data_for_gestor(db_session, gestor_dashboard.id)
+        estatisticas = cache_relatorios.estatisticas()['por_tipo']['dashboard_gestor']
+        assert estatisticas == {'acertos': 1, 'falhas': 1}
+
+        aluno, _ = resultados_dashboard
+        aluno.zona = "rural"
+        db_session.commit()
+
+        atualizado = AnalyticsService.get_dashboard_data_for_gestor(db_session, gestor_dashboard.id)
+        assert primeiro['zona_distribuicao']['data'] == [1, 1]
+        assert atualizado['zona_distribuicao']['data'] == [0, 2]
+        assert atualizado['gestor'].id == gestor_dashboard.id
+
+    def test_data_de_geracao_nao_vem_do_cache(self, db_session, professor_completo, monkeypatch):
+        """Testa se o relatório em cache sai com a data do pedido, não a do cálculo."""
+        from datetime import datetime
+        from services import relatorios_service
+        from services.relatorios_service import RelatorioService
+        from utils.cache import cache_relatorios
+
+        class Relogio(datetime):
+            agora = datetime(2025, 3, 1, 8, 0)
+
+            @classmethod
+            def now(cls, tz=None):
+                return cls.agora
+
+        monkeypatch.setattr(relatorios_service, "datetime", Relogio)
+        primeiro = RelatorioService.get_professor_report_data(db_session, professor_completo.id)
+        Relogio.agora = datetime(2025, 3, 1, 9, 30)
+        segundo = RelatorioService.get_professor_report_data(db_session, professor_completo.id)
+
+        assert cache_relatorios.estatisticas()['por_tipo']['relatorio_professor'] == {'acertos': 1, 'falhas': 1}
+        assert primeiro['data_geracao'] == "01/03/2025 às 08:00"
+        assert segundo['data_geracao'] == "01/03/2025 às 09:30"
+
+    def test_lru_respeita_ttl_e_tamanho(self):
+        """Testa expiração por TTL e descarte do item menos usado."""
+        import time
+        from utils.cache import CacheLRU
+
+        cache = CacheLRU(max_itens=2, ttl=60)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")
+        cache.set("c", b"3")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+
+        cache.set("d", b"4", ttl=0.01)
+        time.sleep(0.02)
+        assert cache.get("d") is None
+
+
+class TestExportacaoPdf:
+    """Testes para o cache e o limite de exportações em PDF (utils/export_service.py)."""
+
+    def test_pdf_repetido_vem_do_cache_e_excedente_recebe_503(self, monkeypatch):
+        """Testa se o mesmo HTML é renderizado uma vez e se o limite de simultâneos recusa o excedente."""
+        import threading
+        from fastapi import HTTPException
+        from utils import export_service
+
+        renderizados = []
+        monkeypatch.setattr(export_service, "_renderizar_no_pool", lambda html: renderizados.append(html) or b"%PDF")
+        export_service.cache_pdfs.limpar()
+        export_service.limpar_estatisticas_pdf()
+
+        assert export_service.gerar_pdf("<p>relatorio</p>", "r.pdf") == b"%PDF"
+        assert export_service.gerar_pdf("<p>relatorio</p>", "r.pdf") == b"%PDF"
+        export_service.gerar_pdf("<p>outro</p>", "r.pdf")
+        assert len(renderizados) == 2
+
+        monkeypatch.setattr(export_service, "_vagas", threading.BoundedSemaphore(1))
+        monkeypatch.setattr(export_service, "PDF_ESPERA", 0.01)
+        export_service._vagas.acquire()
+        with pytest.raises(HTTPException) as erro:
+            export_service.gerar_pdf("<p>novo</p>", "r.pdf")
+        assert erro.value.status_code == 503
+
+        metricas = export_service.estatisticas_pdf()["por_arquivo"]["r.pdf"]
+        assert (metricas["renderizados"], metricas["cache"], metricas["recusados"]) == (2, 1, 1)
+
+    def test_tempo_esgotado_recicla_o_pool(self, monkeypatch):
+        """Testa se a renderização que estoura o tempo descarta o pool e mata os processos filhos."""
+        import multiprocessing
+        import time
+        from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as TempoEsgotado
+        from utils import export_service
+
+        class PoolTravado:
+            def submit(self, *args):
+                return Future()  # nunca termina
+        reciclados = []
+        monkeypatch.setattr(export_service, "_obter_pool", lambda: PoolTravado())
+        monkeypatch.setattr(export_service, "_reciclar_pool", lambda: reciclados.append(1))
+        monkeypatch.setattr(export_service, "PDF_TIMEOUT", 0.01)
+        with pytest.raises(TempoEsgotado):
+            export_service._renderizar_no_pool("<p>lento</p>")
+        assert reciclados == [1]
+        monkeypatch.undo()
+
+        pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        pool.submit(time.sleep, 60)
+        processos = list(pool._processes.values())
+        assert processos
+        monkeypatch.setattr(export_service, "_pool", pool)
+        export_service._reciclar_pool()
+        assert export_service._pool is None
+        for processo in processos:
+            processo.join(10)
+            assert not processo.is_alive()
+
+
+
+class TestRelatorioJobs:
+    """Testes para os pedidos de relatório gerados em segundo plano."""
+
+    def test_pedido_deduplicado_gerado_baixado_e_expirado(self, client, db_session, usuario_gestor,
+                                                          gestor_dashboard, tmp_path, monkeypatch):
+        """Testa deduplicação, geração pelo worker, download e remoção após a validade."""
+        from datetime import datetime, timedelta
+        from models.relatorio_job import RelatorioJob, StatusRelatorioJob
+        from services import relatorio_jobs_service
+        from services.relatorio_jobs_service import RelatorioJobService
+
+        monkeypatch.setattr(relatorio_jobs_service, "RELATORIOS_DIR", tmp_path)
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+
+        primeiro = client.post("/gestor/relatorios/jobs", data={"tipo": "relatorio_gestor_docx"})
+        repetido = client.post("/gestor/relatorios/jobs", data={"tipo": "relatorio_gestor_docx"})
+        assert primeiro.status_code == 202
+        assert primeiro.json()["id"] == repetido.json()["id"]
+        assert client.post("/gestor/relatorios/jobs", data={"tipo": "inexistente"}).status_code == 400
+
+        job_id = primeiro.json()["id"]
+        assert client.get(f"/gestor/relatorios/jobs/{job_id}/download").status_code == 404
+        assert RelatorioJobService.processar_pendentes(db_session) == 1
+
+        status = client.get(f"/gestor/relatorios/jobs/{job_id}").json()
+        assert status["status"] == "concluido"
+        download = client.get(status["download_url"])
+        assert download.status_code == 200
+        assert download.content[:2] == b"PK"  # DOCX é um zip
+
+        # Concluído o pedido, um novo pedido igual gera outro arquivo
+        novo = client.post("/gestor/relatorios/jobs", data={"tipo": "relatorio_gestor_docx"}).json()
+        assert novo["id"] != job_id
+
+        job = db_session.get(RelatorioJob, job_id)
+        arquivo = RelatorioJobService.caminho_do_arquivo(job)
+        job.expira_em = datetime.now() - timedelta(seconds=1)
+        db_session.commit()
+        assert RelatorioJobService.remover_vencidos(db_session) == 1
+        assert not arquivo.exists()
+        assert db_session.get(RelatorioJob, job_id).status == StatusRelatorioJob.EXPIRADO
+        assert client.get(f"/gestor/relatorios/jobs/{job_id}/download").status_code == 404
+
+    def test_pedido_identico_concluido_durante_a_criacao(self, db_session, usuario_gestor, monkeypatch):
+        """Testa se o pedido é criado quando o idêntico em andamento termina entre o INSERT e a leitura."""
+        from dao import relatorio_job_dao
+        from models.relatorio_job import RelatorioJob
+        from services.relatorio_jobs_service import RelatorioJobService
+
+        inserir = relatorio_job_dao.inserir_se_ausente
+        chamadas = []
+        def conflito_na_primeira(*args, **kwargs):
+            chamadas.append(1)
+            return False if len(chamadas) == 1 else inserir(*args, **kwargs)
+        monkeypatch.setattr(relatorio_job_dao, "inserir_se_ausente", conflito_na_primeira)
+
+        job = RelatorioJobService.solicitar(db_session, "dashboard_gestor", {"gestor_id": usuario_gestor.id},
+                                            usuario_gestor.id)
+        assert job is not None and len(chamadas) == 2
+        assert db_session.query(RelatorioJob).count() == 1
+
+    def test_relatorio_do_dashboard_enfileirado(self, client, db_session, usuario_gestor, gestor_dashboard,
+                                                tmp_path, monkeypatch):
+        """Testa se /gestor/dashboard/relatorio só cria o pedido e leva à página que o acompanha."""
+        from models.relatorio_job import RelatorioJob
+        from services import relatorio_jobs_service
+        from services.relatorio_jobs_service import RelatorioJobService
+
+        monkeypatch.setattr(relatorio_jobs_service, "RELATORIOS_DIR", tmp_path)
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+
+        response = client.get("/gestor/dashboard/relatorio", follow_redirects=False)
+        assert response.status_code == 303
+        job = db_session.query(RelatorioJob).one()
+        assert job.tipo == "dashboard_gestor"
+        assert response.headers["location"] == f"/relatorios?relatorio={job.id}"
+
+        assert RelatorioJobService.processar_pendentes(db_session) == 1
+        status = client.get(f"/gestor/relatorios/jobs/{job.id}").json()
+        assert status["status"] == "concluido"
+        assert client.get(status["download_url"]).content[:2] == b"PK"
+
+@pytest.fixture
+def formulario_respondido(db_session, aluno_completo):
+    """Cria um formulário com perguntas de escolha e respostas nos formatos novo e antigo."""
+    import json
+    from models.formulario import Formulario
+    from models.pergunta_formulario import PerguntaFormulario
+    from models.resposta_formulario import RespostaFormulario
+
+    formulario = Formulario(titulo="Questionário")
+    db_session.add(formulario)
+    db_session.flush()
+    unica = PerguntaFormulario(formulario_id=formulario.id, tipo_pergunta="escolha_unica",
+                               enunciado="Turno?", opcoes=json.dumps(["Manhã", "Tarde"]))
+    multipla = PerguntaFormulario(formulario_id=formulario.id, tipo_pergunta="multipla_escolha",
+                                  enunciado="Interesses?", opcoes=json.dumps(["Música", "Esporte", "Leitura"]))
+    texto = PerguntaFormulario(formulario_id=formulario.id, tipo_pergunta="texto", enunciado="Comentário")
+    db_session.add_all([unica, multipla, texto])
+    db_session.flush()
+
+    respostas = [
+        (unica, " Manhã ", None), (unica, "Tarde", None), (unica, "Manhã", None), (unica, "   ", None),
+        (unica, None, json.dumps(["Tarde", "Manhã"])), (unica, None, json.dumps("Noite")),
+        (unica, None, "Integral"),  # JSON inválido: a própria string
+        (multipla, None, json.dumps(["Música", "Esporte"])), (multipla, None, json.dumps(["Música"])),
+        (multipla, None, json.dumps(["Outro"])), (multipla, None, "texto solto"),
+        (multipla, None, json.dumps({"a": 1})), (multipla, None, None),
+        (texto, "Gostei", None),
+    ]
+    for pergunta, resposta_texto, resposta_opcoes in respostas:
+        db_session.add(RespostaFormulario(
+            aluno_id=aluno_completo.idAluno, formulario_id=formulario.id, pergunta_id=pergunta.id,
+            resposta_texto=resposta_texto, resposta_opcoes=resposta_opcoes
+        ))
+    db_session.commit()
+    return formulario, unica, multipla
+
+
+class TestFormularioAnalytics:
+    """Testes para a contagem de opções das perguntas de formulário."""
+
+    def test_backfill_e_contagem_agrupada(self, db_session, formulario_respondido, aluno_completo):
+        """Testa o backfill das respostas antigas, a gravação no envio e a reconstrução dos contadores em uma consulta."""
+        from collections import Counter
+        from sqlalchemy import event
+        from models.resposta_formulario import RespostaFormulario
+        from dao.resposta_formulario_dao import RespostaFormularioDAO
+        from services.formulario_analytics_service import FormularioAnalyticsService
+        from services.contagem_formulario_service import ContagemFormularioService
+
+        formulario, unica, multipla = formulario_respondido
+        esperado = {}
+        for resposta in db_session.query(RespostaFormulario).filter_by(formulario_id=formulario.id):
+            if resposta.pergunta_id in (unica.id, multipla.id):
+                esperado.setdefault(resposta.pergunta_id, Counter()).update(
+                    FormularioAnalyticsService.opcoes_da_resposta(
+                        resposta.pergunta_id == multipla.id, resposta.resposta_texto, resposta.resposta_opcoes
+                    )
+                )
+
+        assert RespostaFormularioDAO.preencher_opcoes(db_session, lote=4) == sum(sum(c.values()) for c in esperado.values())
+        assert RespostaFormularioDAO.preencher_opcoes(db_session) == 0
+
+        consultas = []
+        def contar(conn, cursor, statement, *args):
+            if "respostas_formulario" in statement:
+                consultas.append(statement)
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", contar)
+        try:
+            ContagemFormularioService.reconstruir(db_session)
+        finally:
+            event.remove(engine, "before_cursor_execute", contar)
+
+        # A reconstrução é um único INSERT ... SELECT agrupado sobre as respostas
+        assert len(consultas) == 1
+        _, totais, contagens = ContagemFormularioService.por_formulario(db_session, formulario.id)
+        assert contagens == esperado
+        assert contagens[unica.id] == Counter({"Manhã": 2, "Tarde": 2, "Noite": 1, "Integral": 1})
+        assert contagens[multipla.id] == Counter({"Música": 2, "Esporte": 1, "Outro": 1, "texto solto": 1})
+        assert totais[unica.id] == 7 and totais[multipla.id] == 6
+
+        # Novo envio grava as opções com o índice na lista da pergunta
+        resposta = RespostaFormularioDAO.create_resposta(
+            db_session, aluno_completo.idAluno, formulario.id, multipla.id,
+            resposta_opcoes='["Leitura", "Música"]', pergunta=multipla
+        )
+        db_session.commit()
+        assert [(o.opcao_index, o.opcao) for o in resposta.opcoes_marcadas] == [(2, "Leitura"), (0, "Música")]
+
+        ContagemFormularioService.reconstruir(db_session)
+
+        dados = FormularioAnalyticsService.get_formulario_analytics(db_session, formulario.id)
+        grafico = next(g for g in dados["graficos_perguntas"] if g["pergunta_id"] == multipla.id)
+        assert grafico["grafico"]["labels"][:3] == ["Música", "Esporte", "Leitura"]
+        assert grafico["grafico"]["data"][:3] == [3, 1, 1]
+        assert grafico["total_respostas"] == 7
+
+
+class TestContagemFormulario:
+    """Testes para os contadores incrementais do painel de resultados de formulário."""
+
+    def test_envio_incrementa_e_exclusao_desconta(self, client, db_session, formulario_respondido, usuario_gestor,
+                                                  monkeypatch):
+        """Testa o incremento no envio, o endpoint JSON, o stream SSE e o desconto ao excluir respostas."""
+        import json
+        from controllers import formulario_controller
+        from dao.resposta_formulario_dao import RespostaFormularioDAO
+        from dao.senhaHash import criptografar_senha
+        from models.aluno import Aluno
+        from models.usuario import Usuario
+        from services.contagem_formulario_service import ContagemFormularioService
+
+        formulario, unica, multipla = formulario_respondido
+        RespostaFormularioDAO.preencher_opcoes(db_session)
+        ContagemFormularioService.reconstruir(db_session)
+        respondedores, totais, contagens = ContagemFormularioService.por_formulario(db_session, formulario.id)
+        assert respondedores == 1 and totais[unica.id] == 7
+
+        # Outro aluno responde pela rota: contadores atualizados na mesma transação
+        usuario = Usuario(email="outro_aluno@teste.com", senha_hash=criptografar_senha("senha123"), tipo="aluno")
+        db_session.add(usuario)
+        db_session.flush()
+        outro = Aluno(idUser=usuario.id, nome="Outro", curso="Informática", ano=1, idade=16,
+                      municipio="Fortaleza", zona="urbana", origem_escolar="publica")
+        db_session.add(outro)
+        db_session.commit()
+        client.post("/login", data={"email": usuario.email, "senha": "senha123"}, follow_redirects=False)
+        response = client.post(
+            f"/aluno/formularios/{formulario.id}/enviar-respostas",
+            data={f"resposta_{unica.id}": "Tarde", f"resposta_{multipla.id}": ["Música", "Leitura"]},
+            follow_redirects=False
+        )
+        assert response.status_code == 303
+
+        respondedores, totais, contagens = ContagemFormularioService.por_formulario(db_session, formulario.id)
+        assert respondedores == 2
+        assert totais[unica.id] == 8 and totais[multipla.id] == 7
+        assert contagens[unica.id]["Tarde"] == 3
+        assert contagens[multipla.id]["Leitura"] == 1 and contagens[multipla.id]["Música"] == 3
+
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        dados = client.get(f"/gestor/formularios/{formulario.id}/resultados/contagens").json()
+        assert dados["total_respondedores"] == 2
+        assert dados["total_respostas"] == sum(totais.values())
+
+        monkeypatch.setattr(formulario_controller, "CONTAGENS_SSE_DURACAO", 0.05)
+        monkeypatch.setattr(formulario_controller, "CONTAGENS_SSE_INTERVALO", 0.01)
+        response = client.get(f"/gestor/formularios/{formulario.id}/resultados/stream")
+        assert response.headers["content-type"].startswith("text/event-stream")
+        eventos = [linha[len("data: "):] for linha in response.text.split("\n") if linha.startswith("data: ")]
+        assert len(eventos) == 1  # só reenviado quando as contagens mudam
+        assert json.loads(eventos[0]) == dados
+
+        RespostaFormularioDAO.delete_respostas_from_formulario_by_aluno(db_session, outro.idAluno, formulario.id)
+        db_session.commit()
+        respondedores, totais, contagens = ContagemFormularioService.por_formulario(db_session, formulario.id)
+        assert respondedores == 1 and totais[unica.id] == 7
+        assert "Leitura" not in contagens[multipla.id]
+
+        # Excluir o formulário apaga opções marcadas e contadores junto
+        from dao.formulario_dao import FormularioDAO
+        from models.resposta_formulario_opcao import RespostaFormularioOpcao
+        FormularioDAO.delete(db_session, formulario.id)
+        assert ContagemFormularioService.por_formulario(db_session, formulario.id) == (0, {}, {})
+        assert db_session.query(RespostaFormularioOpcao).filter_by(formulario_id=formulario.id).count() == 0
+
+    @pytest.mark.parametrize("rota,campo", [("enviar-respostas", "resposta"), ("responder", "pergunta")])
+    def test_envio_repetido_nao_conta_duas_vezes(self, client, db_session, formulario_respondido, rota, campo):
+        """Testa se um segundo envio do mesmo aluno (duplo clique) não grava nem conta de novo."""
+        from dao.resposta_formulario_dao import RespostaFormularioDAO
+        from dao.senhaHash import criptografar_senha
+        from models.aluno import Aluno
+        from models.resposta_formulario import RespostaFormulario
+        from models.usuario import Usuario
+        from services.contagem_formulario_service import ContagemFormularioService
+
+        formulario, unica, multipla = formulario_respondido
+        RespostaFormularioDAO.preencher_opcoes(db_session)
+        ContagemFormularioService.reconstruir(db_session)
+
+        usuario = Usuario(email="duplo@teste.com", senha_hash=criptografar_senha("senha123"), tipo="aluno")
+        db_session.add(usuario)
+        db_session.flush()
+        aluno = Aluno(idUser=usuario.id, nome="Duplo", curso="Informática", ano=1, idade=16,
+                      municipio="Fortaleza", zona="urbana", origem_escolar="publica")
+        db_session.add(aluno)
+        db_session.commit()
+        client.post("/login", data={"email": usuario.email, "senha": "senha123"}, follow_redirects=False)
+
+        dados = {f"{campo}_{unica.id}": "Tarde", f"{campo}_{multipla.id}": ["Música"]}
+        primeiro = client.post(f"/aluno/formularios/{formulario.id}/{rota}", data=dados, follow_redirects=False)
+        segundo = client.post(f"/aluno/formularios/{formulario.id}/{rota}", data=dados, follow_redirects=False)
+        assert primeiro.status_code == 303
+        assert segundo.status_code in (303, 400)
+
+        assert db_session.query(RespostaFormulario).filter_by(aluno_id=aluno.idAluno).count() == 2
+        respondedores, totais, contagens = ContagemFormularioService.por_formulario(db_session, formulario.id)
+        assert respondedores == 2
+        assert totais[unica.id] == 8 and contagens[unica.id]["Tarde"] == 3
+
+
+    @pytest.mark.parametrize("rota", ["/gestor/alunos/{id}/remover", "/gestor/excluir-aluno/{id}"])
+    def test_exclusao_do_aluno_desconta(self, client, db_session, formulario_respondido, aluno_completo,
+                                        usuario_gestor, rota):
+        """Testa se excluir o aluno pelas rotas do gestor tira suas respostas dos contadores."""
+        from dao.resposta_formulario_dao import RespostaFormularioDAO
+        from models.resposta_formulario import RespostaFormulario
+        from models.resposta_formulario_opcao import RespostaFormularioOpcao
+        from services.contagem_formulario_service import ContagemFormularioService
+
+        formulario, unica, multipla = formulario_respondido
+        RespostaFormularioDAO.preencher_opcoes(db_session)
+        ContagemFormularioService.reconstruir(db_session)
+        assert ContagemFormularioService.por_formulario(db_session, formulario.id)[0] == 1
+
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        response = client.post(rota.format(id=aluno_completo.idAluno), follow_redirects=False)
+        assert response.status_code == 303
+        db_session.expire_all()
+
+        assert db_session.query(RespostaFormulario).count() == 0
+        assert db_session.query(RespostaFormularioOpcao).count() == 0
+        respondedores, totais, contagens = ContagemFormularioService.por_formulario(db_session, formulario.id)
+        assert respondedores == 0
+        assert not any(totais.values()) and contagens == {}
+
+
+class TestExportacaoRespostas:
+    """Testes para a exportação das respostas brutas de formulário."""
+
+    def test_csv_em_blocos(self, client, db_session, formulario_respondido, aluno_completo, usuario_gestor, monkeypatch):
+        """Testa o CSV enviado em blocos com uma linha por resposta e os formatos inválido/ausente."""
+        import csv
+        import io
+        from utils import export_service
+
+        formulario, unica, multipla = formulario_respondido
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        monkeypatch.setattr(export_service, "CSV_LINHAS_POR_BLOCO", 3)
+
+        response = client.get(f"/gestor/formularios/{formulario.id}/exportar")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        linhas = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+        assert linhas[0][:3] == ["ID Aluno", "Aluno", "ID Pergunta"]
+        assert len(linhas) == 1 + 14
+        assert all(linha[1] == aluno_completo.nome for linha in linhas[1:])
+        multiplas = [linha[5] for linha in linhas[1:] if linha[2] == str(multipla.id)]
+        assert multiplas[:2] == ["Música; Esporte", "Música"]
+        assert linhas[-1][3:6] == ["Comentário", "texto", "Gostei"]
+
+        assert client.get(f"/gestor/formularios/{formulario.id}/exportar?formato=ods").status_code == 400
+        assert client.get("/gestor/formularios/9999/exportar").status_code == 404
+        response = client.get(f"/gestor/formularios/{formulario.id}/exportar?formato=xlsx")
+        if export_service.has_xlsxwriter:
+            assert response.status_code == 200
+            assert response.headers["content-type"] == export_service.XLSX_MEDIA_TYPE
+        else:
+            assert response.status_code == 501
+
+
+    def test_texto_do_aluno_nao_vira_formula(self, tmp_path):
+        """Testa se respostas começando com = + - @ saem como texto no CSV e no XLSX."""
+        import csv
+        import io
+        import zipfile
+        from utils import export_service
+
+        perigosas = ['=HYPERLINK("http://x","clique")', "+1", "-2+3", "@SOMA(A1)"]
+        conteudo = b"".join(export_service.csv_em_blocos(["Resposta", "Nota"], [[texto, -1] for texto in perigosas]))
+        linhas = list(csv.reader(io.StringIO(conteudo.decode("utf-8-sig"))))
+        assert [linha[0] for linha in linhas[1:]] == ["'" + texto for texto in perigosas]
+        assert linhas[1][1] == "-1"  # números não são alterados
+
+        if not export_service.has_xlsxwriter:
+            pytest.skip("xlsxwriter não instalado")
+        caminho = tmp_path / "respostas.xlsx"
+        export_service.gravar_xlsx(str(caminho), ["Resposta"], [[texto] for texto in perigosas + ["http://x"]])
+        with zipfile.ZipFile(caminho) as arquivo:
+            planilha = arquivo.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        assert "<f>" not in planilha and "<hyperlink" not in planilha
+        assert "=HYPERLINK(" in planilha  # gravado como texto (inlineStr no modo constant_memory)
+
+
+class TestRespondedoresFormulario:
+    """Testes para a listagem paginada (keyset) de alunos que responderam a um formulário."""
+
+    def test_paginas_busca_e_total(self, client, db_session, formulario_respondido, aluno_completo, usuario_gestor):
+        """Testa a navegação por páginas, a busca por nome e o endpoint de contagem."""
+        from models.aluno import Aluno
+        from models.resposta_formulario import RespostaFormulario
+        from dao.resposta_formulario_dao import RespostaFormularioDAO
+
+        formulario, unica, multipla = formulario_respondido
+        for nome in ("Bruno Lima", "Carla Lima", "Davi Souza"):
+            aluno = Aluno(idUser=aluno_completo.idUser, nome=nome, curso="Informática", ano=1, idade=16,
+                          municipio="Fortaleza", zona="urbana", origem_escolar="publica")
+            db_session.add(aluno)
+            db_session.flush()
+            db_session.add_all([
+                RespostaFormulario(aluno_id=aluno.idAluno, formulario_id=formulario.id, pergunta_id=pergunta.id,
+                                   resposta_texto="Manhã")
+                for pergunta in (unica, multipla)
+            ])
+        db_session.commit()
+
+        primeira, proximo = RespostaFormularioDAO.listar_respondedores(db_session, formulario.id, limite=2)
+        segunda, fim = RespostaFormularioDAO.listar_respondedores(db_session, formulario.id, apos_aluno_id=proximo, limite=2)
+        ids = [aluno.idAluno for aluno, _ in primeira + segunda]
+        assert ids == sorted(ids) and len(ids) == 4
+        assert proximo == ids[1] and fim is None
+        assert all(data is not None for _, data in primeira)
+
+        lima, _ = RespostaFormularioDAO.listar_respondedores(db_session, formulario.id, busca="lima")
+        assert [aluno.nome for aluno, _ in lima] == ["Bruno Lima", "Carla Lima"]
+
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        assert client.get(f"/gestor/formularios/{formulario.id}/respostas/total").json() == {"total": 4}
+        assert client.get(f"/gestor/formularios/{formulario.id}/respostas/total?busca=Lima").json() == {"total": 2}
+        response = client.get(f"/gestor/formularios/{formulario.id}/respostas?busca=Lima")
+        assert response.status_code == 200
+        assert "Carla Lima" in response.text and "Davi Souza" not in response.text
+
+
+@pytest.fixture
+def prova_com_gabarito(db_session, professor_completo):
+    """Cria uma prova com quatro questões do banco (gabarito A, B, C, D)."""
+    from models.prova import Prova
+    from models.banco_questoes import BancoQuestoes
+    from models.prova_questao import ProvaQuestao
+
+    prova = Prova(titulo="Simulado", materia="Matemática", professor_id=professor_completo.id)
+    db_session.add(prova)
+    db_session.flush()
+    questoes = []
+    for ordem, correta in enumerate("ABCD", start=1):
+        questao = BancoQuestoes(
+            professor_id=professor_completo.id, enunciado=f"Questão {ordem}",
+            opcao_a="a", opcao_b="b", opcao_c="c", opcao_d="d", opcao_e="e",
+            resposta_correta=correta, materia="Matemática"
+        )
+        db_session.add(questao)
+        db_session.flush()
+        db_session.add(ProvaQuestao(prova_id=prova.id, questao_banco_id=questao.id, ordem=ordem))
+        questoes.append(questao)
+    db_session.commit()
+    return prova, questoes
+
+
+class TestCorrecaoService:
+    """Testes para a correção em lote das provas."""
+
+    def test_grava_respostas_e_resultado_em_lote(self, db_session, aluno_completo, prova_com_gabarito):
+        """Testa correção, upsert de resposta existente e número fixo de comandos."""
+        from sqlalchemy import event
+        from models.resposta import Resposta
+        from services.correcao_service import CorrecaoService
+
+        prova, questoes = prova_com_gabarito
+        db_session.add(Resposta(aluno_id=aluno_completo.idAluno, questao_id=questoes[0].id, resposta="E"))
+        db_session.commit()
+
+        gabarito = CorrecaoService.gabarito_da_prova(db_session, prova.id)
+        respostas = {questoes[0].id: "A", questoes[1].id: "b", questoes[2].id: "E", 9999: "A"}
+
+        comandos = []
+        engine = db_session.get_bind()
+        contar = lambda conn, cursor, sql, *args: comandos.append(sql)
+        event.listen(engine, "before_cursor_execute", contar)
+        try:
+            resultado = CorrecaoService.registrar_envio(
+                db_session, aluno_completo.idAluno, prova.id, gabarito, respostas, len(gabarito)
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", contar)
+
+        assert (resultado.acertos, resultado.total_questoes, resultado.nota) == (2, 4, 5.0)
+        gravadas = {r.questao_id: r.resposta for r in db_session.query(Resposta).all()}
+        assert gravadas == {questoes[0].id: "A", questoes[1].id: "b", questoes[2].id: "E"}
+        # Um único upsert em lote, independente do número de questões
+        em_respostas = [sql.split()[0] for sql in comandos if " respostas " in f"{sql} ".replace("\n", " ")]
+        assert em_respostas == ["INSERT"]
+
+        assert CorrecaoService.registrar_envio(
+            db_session, aluno_completo.idAluno, prova.id, gabarito, respostas, len(gabarito)
+        ) is None
+
+    def test_reenvio_com_mesmo_token(self, db_session, aluno_completo, prova_com_gabarito):
+        """Testa se o reenvio do mesmo formulário devolve o resultado sem duplicar o resumo."""
+        from models.resultado import Resultado
+        from models.resumo_desempenho import ResumoDesempenho
+        from services.correcao_service import CorrecaoService
+
+        prova, questoes = prova_com_gabarito
+        gabarito = CorrecaoService.gabarito_da_prova(db_session, prova.id)
+        respostas = {questoes[0].id: "A"}
+        enviar = lambda token: CorrecaoService.registrar_envio(
+            db_session, aluno_completo.idAluno, prova.id, gabarito, respostas, len(gabarito), token=token
+        )
+
+        primeiro = enviar("token-1")
+        assert enviar("token-1").id == primeiro.id
+        assert enviar("outro-token") is None
+        assert db_session.query(Resultado).count() == 1
+        resumo_prova = db_session.query(ResumoDesempenho).filter_by(dimensao="prova", chave=str(prova.id)).one()
+        assert resumo_prova.total_resultados == 1
+
+    def test_rota_de_envio(self, client_com_auth, db_session, aluno_completo, prova_com_gabarito):
+        """Testa o envio pela rota do aluno."""
+        from models.resultado import Resultado
+
+        prova, questoes = prova_com_gabarito
+        dados = {f"questao_{q.id}": c for q, c in zip(questoes, "ABCA")}
+        response = client_com_auth.post(f"/aluno/prova/{prova.id}/responder", data=dados, follow_redirects=False)
+
+        assert response.status_code == 303
+        resultado = db_session.query(Resultado).filter_by(aluno_id=aluno_completo.idAluno, prova_id=prova.id).one()
+        assert (resultado.acertos, resultado.situacao) == (3, "Regular")
+
+    def test_gabarito_em_cache_e_invalidado_na_edicao(self, db_session, prova_com_gabarito):
+        """Testa se o gabarito vem do cache sem consultas e é descartado ao editar a questão."""
+        from sqlalchemy import event
+        from dao.banco_questoes_dao import BancoQuestoesDAO
+        from services.correcao_service import CorrecaoService
+
+        prova, questoes = prova_com_gabarito
+        CorrecaoService.compilar_gabarito(db_session, prova.id)
+
+        consultas = []
+        engine = db_session.get_bind()
+        contar = lambda *args, **kwargs: consultas.append(1)
+        event.listen(engine, "before_cursor_execute", contar)
+        try:
+            gabarito = CorrecaoService.gabarito_da_prova(db_session, prova.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", contar)
+        assert consultas == []
+        assert gabarito == {q.id: c for q, c in zip(questoes, "ABCD")}
+
+        BancoQuestoesDAO.update(db_session, questoes[0].id, resposta_correta="E")
+        assert CorrecaoService.gabarito_da_prova(db_session, prova.id)[questoes[0].id] == "E"
+
+    def test_inserir_se_ausente_so_ignora_chave_duplicada(self, db_session, aluno_completo, prova_com_gabarito,
+                                                          monkeypatch):
+        """Testa o caminho do MySQL: só o conflito de índice único vira "já existe"; outros erros sobem."""
+        from sqlalchemy.dialects.sqlite import insert
+        from sqlalchemy.exc import IntegrityError
+        from dao import upsert
+        from models.resultado import Resultado
+
+        monkeypatch.setattr(upsert, "_insert", lambda db, modelo: ("mysql", insert(modelo)))
+        monkeypatch.setattr(upsert, "_chave_duplicada", lambda erro: "UNIQUE" in str(erro.orig))
+        prova, _ = prova_com_gabarito
+        valores = {"aluno_id": aluno_completo.idAluno, "prova_id": prova.id, "acertos": 1,
+                   "situacao": "Regular", "nota": 2.5, "total_questoes": 4}
+        chaves = ["aluno_id", "prova_id"]
+
+        assert upsert.inserir_se_ausente(db_session, Resultado, valores, chaves) is True
+        assert upsert.inserir_se_ausente(db_session, Resultado, valores, chaves) is False
+        with pytest.raises(IntegrityError):
+            upsert.inserir_se_ausente(db_session, Resultado, {**valores, "prova_id": prova.id + 1, "nota": None}, chaves)
+        db_session.rollback()
+
+    def test_rota_de_envio_ignora_gabarito_desatualizado_em_memoria(self, client_com_auth, db_session,
+                                                                     aluno_completo, prova_com_gabarito):
+        """Testa se o envio direto corrige com o gabarito do banco mesmo com o cache em memória desatualizado."""
+        from models.resultado import Resultado
+        from services.correcao_service import CorrecaoService
+
+        prova, questoes = prova_com_gabarito
+        CorrecaoService.compilar_gabarito(db_session, prova.id)
+        # Edição feita em outro processo: o cache deste processo não foi invalidado
+        questoes[0].resposta_correta = "E"
+        db_session.commit()
+
+        response = client_com_auth.post(f"/aluno/prova/{prova.id}/responder",
+                                        data={f"questao_{questoes[0].id}": "E"}, follow_redirects=False)
+        assert response.status_code == 303
+        assert db_session.query(Resultado.acertos).filter(Resultado.prova_id == prova.id).scalar() == 1
+
+
+class TestFilaSubmissoes:
+    """Testes para a fila de envios de prova (modo PROVAS_ENVIO_EM_FILA)."""
+
+    def test_enfileirar_reservar_e_processar(self, db_session, aluno_completo, prova_com_gabarito):
+        """Testa idempotência do enfileiramento, reservas disjuntas e o desfecho de cada envio."""
+        from dao.submissao_prova_dao import SubmissaoProvaDAO
+        from models.submissao_prova import SubmissaoProva, StatusSubmissao
+        from services.correcao_service import CorrecaoService
+
+        prova, questoes = prova_com_gabarito
+        respostas = {questoes[0].id: "A", questoes[1].id: "C"}
+        primeira = SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, respostas, "tk-1")
+        repetida = SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, respostas, "tk-1")
+        outra = SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, respostas, "tk-2")
+        assert repetida.id == primeira.id
+        assert db_session.query(SubmissaoProva).count() == 2
+
+        lote_a = SubmissaoProvaDAO.reservar_lote(db_session, limite=1, duracao_reserva=60)
+        lote_b = SubmissaoProvaDAO.reservar_lote(db_session, limite=5, duracao_reserva=60)
+        assert [s.id for s in lote_a] == [primeira.id]
+        assert [s.id for s in lote_b] == [outra.id]
+        assert SubmissaoProvaDAO.reservar_lote(db_session, limite=5, duracao_reserva=60) == []
+
+        assert CorrecaoService.processar_submissao(db_session, lote_a[0]) == StatusSubmissao.CONCLUIDA
+        assert CorrecaoService.processar_submissao(db_session, lote_b[0]) == StatusSubmissao.RECUSADA
+        concluida = db_session.get(SubmissaoProva, primeira.id)
+        assert concluida.resultado_id is not None and concluida.reservada_ate is None
+
+    def test_fila_ignora_gabarito_desatualizado_em_memoria(self, db_session, aluno_completo, prova_com_gabarito):
+        """Testa se o worker corrige com o gabarito do banco mesmo com o cache em memória desatualizado."""
+        from dao.submissao_prova_dao import SubmissaoProvaDAO
+        from models.resultado import Resultado
+        from services.correcao_service import CorrecaoService
+
+        prova, questoes = prova_com_gabarito
+        CorrecaoService.compilar_gabarito(db_session, prova.id)
+        # Edição feita em outro processo: o cache deste processo não foi invalidado
+        questoes[0].resposta_correta = "E"
+        db_session.commit()
+        assert CorrecaoService.gabarito_da_prova(db_session, prova.id)[questoes[0].id] == "A"
+
+        SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, {questoes[0].id: "E"}, "tk-gab")
+        assert CorrecaoService.processar_fila(db_session) == 1
+        assert db_session.query(Resultado.acertos).filter(Resultado.prova_id == prova.id).scalar() == 1
+
+    def test_envio_em_fila_e_status(self, client_com_auth, db_session, aluno_completo, prova_com_gabarito, monkeypatch):
+        """Testa o envio pela rota no modo fila e a consulta de status até a conclusão."""
+        from services import correcao_service
+        from services.correcao_service import CorrecaoService
+
+        monkeypatch.setattr(correcao_service, "ENVIO_EM_FILA", True)
+        prova, questoes = prova_com_gabarito
+        dados = {f"questao_{q.id}": c for q, c in zip(questoes, "ABCD")}
+        dados["token_submissao"] = "tk-rota"
+        response = client_com_auth.post(f"/aluno/prova/{prova.id}/responder", data=dados, follow_redirects=False)
+        assert response.status_code == 303
+        submissao_id = int(response.headers["location"].split("submissao=")[1])
+
+        assert client_com_auth.get(f"/aluno/submissoes/{submissao_id}/status").json()["status"] == "pendente"
+        assert CorrecaoService.processar_fila(db_session) == 1
+        status = client_com_auth.get(f"/aluno/submissoes/{submissao_id}/status").json()
+        assert status["status"] == "concluida"
+        assert status["resultado"]["acertos"] == 4
+
+    @pytest.mark.parametrize("rota", ["/gestor/alunos/{aluno}/remover", "/gestor/excluir-aluno/{aluno}",
+                                      "/provas/excluir/{prova}"])
+    def test_exclusao_apaga_envios(self, client, db_session, aluno_completo, prova_com_gabarito, usuario_gestor, rota):
+        """Testa se excluir o aluno ou a prova apaga os envios da fila que os referenciam."""
+        from dao.submissao_prova_dao import SubmissaoProvaDAO
+        from models.submissao_prova import SubmissaoProva
+
+        prova, questoes = prova_com_gabarito
+        SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, {questoes[0].id: "A"}, "tk-excl")
+
+        client.post("/login", data={"email": usuario_gestor.email, "senha": "senha123"}, follow_redirects=False)
+        response = client.post(rota.format(aluno=aluno_completo.idAluno, prova=prova.id), follow_redirects=False)
+        assert response.status_code == 303
+        db_session.expire_all()
+        assert db_session.query(SubmissaoProva).count() == 0
+
+    def test_remover_finalizadas(self, db_session, aluno_completo, prova_com_gabarito):
+        """Testa a retenção: só os envios processados antes do corte são apagados."""
+        from datetime import datetime, timedelta
+        from dao.submissao_prova_dao import SubmissaoProvaDAO
+        from models.submissao_prova import SubmissaoProva, StatusSubmissao
+
+        prova, questoes = prova_com_gabarito
+        respostas = {questoes[0].id: "A"}
+        antiga = SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, respostas, "tk-antiga")
+        recente = SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, respostas, "tk-recente")
+        pendente = SubmissaoProvaDAO.enfileirar(db_session, aluno_completo.idAluno, prova.id, respostas, "tk-pendente")
+        SubmissaoProvaDAO.finalizar(db_session, antiga, StatusSubmissao.CONCLUIDA)
+        SubmissaoProvaDAO.finalizar(db_session, recente, StatusSubmissao.RECUSADA)
+        antiga.data_processamento = datetime.now() - timedelta(days=30)
+        db_session.commit()
+
+        assert SubmissaoProvaDAO.remover_finalizadas(db_session, datetime.now() - timedelta(days=7)) == 1
+        restantes = {s.id for s in db_session.query(SubmissaoProva).all()}
+        assert restantes == {recente.id, pendente.id}
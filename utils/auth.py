@@ -1,20 +1,36 @@
-from fastapi import HTTPException, Request, Depends
+from fastapi import Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from dao.database import get_db
-from models.usuario import Usuario
-from controllers.usuario_controller import verificar_sessao
+from utils.sessao import Principal, obter_principal
+
+# As dependências abaixo leem o papel direto do token assinado (utils/sessao.py);
+# o banco só é consultado para conferir a versão de sessão quando ela sai do cache.
+
+def _exigir_tipo(request: Request, db: Session, tipo: str, detalhe: str) -> Principal:
+    principal = obter_principal(request, db)
+    if principal.tipo != tipo or principal.papel_id is None:
+        raise HTTPException(
+            status_code=303,
+            detail=detalhe,
+            headers={"Location": "/login?erro=Acesso nao autorizado"},
+        )
+    return principal
 
 def verificar_gestor_sessao(request: Request, db: Session = Depends(get_db)):
     """
     Dependência para verificar se o usuário na sessão é um gestor.
     Redireciona para a página de login se não for.
     """
-    session_user_id = verificar_sessao(request)  # Reutiliza a verificação de sessão básica
-    usuario = db.query(Usuario).filter(Usuario.id == int(session_user_id)).first()
-    if not usuario or usuario.tipo != "gestor":
-        raise HTTPException(
-            status_code=303,
-            detail="Acesso não autorizado para gestores",
-            headers={"Location": "/login?erro=Acesso nao autorizado"},
-        )
-    return usuario.id 
\ No newline at end of file
+    return _exigir_tipo(request, db, "gestor", "Acesso não autorizado para gestores").usuario_id
+
+def verificar_professor_sessao(request: Request, db: Session = Depends(get_db)):
+    """
+    Dependência para verificar se o usuário na sessão é um professor.
+    """
+    return _exigir_tipo(request, db, "professor", "Acesso não autorizado para professores").usuario_id
+
+def verificar_aluno_sessao(request: Request, db: Session = Depends(get_db)) -> Principal:
+    """
+    Dependência para rotas do aluno: retorna o principal, com o idAluno em `papel_id`.
+    """
+    return _exigir_tipo(request, db, "aluno", "Acesso não autorizado para alunos")
@@ -0,0 +1,239 @@
+"""
+Cache dos dados de relatórios e dashboards.
+
+Backend padrão: LRU em memória com TTL (por processo).
+Backend opcional: Redis (CACHE_BACKEND=redis, REDIS_URL=redis://localhost:6379/0),
+compartilhado entre os workers do uvicorn.
+
+As entradas são chaveadas por tipo de relatório, escopo e pela versão de cada
+tabela de que dependem. Um commit que grava numa tabela monitorada incrementa
+a versão dela, e as entradas antigas deixam de ser encontradas (expiram pelo
+TTL ou pelo LRU).
+
+As versões de tabela ficam no próprio backend. No LRU em memória elas são do
+processo: com vários workers, um commit só invalida o cache do worker que o
+fez, e os demais podem servir dados antigos até o TTL (CACHE_RELATORIOS_TTL).
+A invalidação imediata entre processos exige o backend Redis.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import redis
+    has_redis = True
+except ImportError:
+    has_redis = False
+
+CACHE_TTL = int(os.getenv("CACHE_RELATORIOS_TTL", "300"))
+CACHE_MAX_ITENS = int(os.getenv("CACHE_RELATORIOS_MAX", "256"))
+
+# Tabelas cujas gravações invalidam relatórios em cache
+TABELAS_MONITORADAS = {
+    "resultados", "alunos", "provas", "turmas",
+    "professores", "gestores", "banco_questoes", "resumos_desempenho",
+}
+
+
+class CacheLRU:
+    """
+    LRU em memória com TTL por entrada. Seguro para uso entre threads.
+    Itens e contadores são do processo (não compartilhados entre workers).
+    """
+
+    def __init__(self, max_itens: int = CACHE_MAX_ITENS, ttl: int = CACHE_TTL):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._contadores = {}  # versões de tabela: nunca são removidas pelo LRU
+        self._lock = threading.Lock()
+
+    def get(self, chave: str):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave: str, valor: bytes, ttl: int = None):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + (ttl or self.ttl))
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def delete(self, chave: str):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def contador(self, chave: str) -> int:
+        return self._contadores.get(chave, 0)
+
+    def incrementar(self, chave: str) -> int:
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + 1
+            return self._contadores[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._contadores.clear()
+
+
+class CacheRedis:
+    """Backend Redis (ou compatível) com a mesma interface do CacheLRU."""
+
+    def __init__(self, url: str, ttl: int = CACHE_TTL, prefixo: str = "dipe:"):
+        if not has_redis:
+            raise RuntimeError("Pacote 'redis' não instalado. Instale com: pip install redis")
+        self.cliente = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefixo = prefixo
+
+    def get(self, chave: str):
+        return self.cliente.get(self.prefixo + chave)
+
+    def set(self, chave: str, valor: bytes, ttl: int = None):
+        self.cliente.set(self.prefixo + chave, valor, ex=ttl or self.ttl)
+
+    def delete(self, chave: str):
+        self.cliente.delete(self.prefixo + chave)
+
+    def contador(self, chave: str) -> int:
+        return int(self.cliente.get(self.prefixo + "contador:" + chave) or 0)
+
+    def incrementar(self, chave: str) -> int:
+        return self.cliente.incr(self.prefixo + "contador:" + chave)
+
+    def limpar(self):
+        for chave in self.cliente.scan_iter(self.prefixo + "*"):
+            self.cliente.delete(chave)
+
+
+def criar_backend(prefixo: str = "dipe:", max_itens: int = CACHE_MAX_ITENS, ttl: int = CACHE_TTL):
+    """Escolhe o backend pela variável CACHE_BACKEND ('memoria' ou 'redis')."""
+    if os.getenv("CACHE_BACKEND", "memoria").lower() == "redis":
+        try:
+            return CacheRedis(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl=ttl, prefixo=prefixo)
+        except Exception as e:
+            print(f"Cache Redis indisponível ({e}), usando cache em memória.")
+    return CacheLRU(max_itens=max_itens, ttl=ttl)
+
+
+class CacheRelatorios:
+    """Cache de dados de relatórios serializáveis em JSON, com contadores de acerto."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.acertos = {}
+        self.falhas = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, tipo: str, escopo, tabelas) -> str:
+        versoes = ",".join(f"{t}={self.backend.contador('versao:' + t)}" for t in sorted(tabelas))
+        return f"relatorio:{tipo}:{escopo}:{versoes}"
+
+    def _contar(self, contadores: dict, tipo: str):
+        with self._lock:
+            contadores[tipo] = contadores.get(tipo, 0) + 1
+
+    def obter_ou_calcular(self, tipo: str, escopo, tabelas, calcular):
+        """
+        Retorna o valor em cache para (tipo, escopo) ou chama `calcular()`
+        e guarda o resultado. `tabelas` são as tabelas das quais o valor depende.
+        """
+        chave = self._chave(tipo, escopo, tabelas)
+        try:
+            valor = self.backend.get(chave)
+        except Exception as e:
+            print(f"Erro ao ler cache: {e}")
+            valor = None
+        if valor is not None:
+            self._contar(self.acertos, tipo)
+            return json.loads(valor)
+
+        self._contar(self.falhas, tipo)
+        dados = calcular()
+        try:
+            self.backend.set(chave, json.dumps(dados).encode("utf-8"))
+        except Exception as e:
+            print(f"Erro ao gravar cache: {e}")
+        return dados
+
+    def invalidar_tabelas(self, tabelas):
+        for tabela in tabelas:
+            try:
+                self.backend.incrementar("versao:" + tabela)
+            except Exception as e:
+                print(f"Erro ao invalidar cache da tabela {tabela}: {e}")
+
+    def estatisticas(self) -> dict:
+        tipos = sorted(set(self.acertos) | set(self.falhas))
+        return {
+            "backend": type(self.backend).__name__,
+            "acertos": sum(self.acertos.values()),
+            "falhas": sum(self.falhas.values()),
+            "por_tipo": {
+                tipo: {"acertos": self.acertos.get(tipo, 0), "falhas": self.falhas.get(tipo, 0)}
+                for tipo in tipos
+            },
+        }
+
+    def limpar(self):
+        self.backend.limpar()
+        with self._lock:
+            self.acertos.clear()
+            self.falhas.clear()
+
+
+cache_relatorios = CacheRelatorios(criar_backend())
+
+if isinstance(cache_relatorios.backend, CacheLRU) and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    print(
+        "Aviso: cache de relatórios em memória com vários workers; gravações feitas em um worker "
+        f"só aparecem nos outros após o TTL ({CACHE_TTL}s). Use CACHE_BACKEND=redis."
+    )
+
+
+# --- Invalidação automática por gravações nas tabelas monitoradas ---
+
+def _registrar_tabelas(session, tabelas):
+    alteradas = session.info.setdefault("tabelas_alteradas", set())
+    alteradas.update(t for t in tabelas if t in TABELAS_MONITORADAS)
+
+
+@event.listens_for(Session, "after_flush")
+def _coletar_tabelas_flush(session, flush_context):
+    objetos = list(session.new) + list(session.dirty) + list(session.deleted)
+    _registrar_tabelas(session, {obj.__table__.name for obj in objetos if hasattr(obj, "__table__")})
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _coletar_tabelas_execute(orm_execute_state):
+    # Cobre query.update()/delete() e insert()/update() executados pela sessão
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        tabela = getattr(orm_execute_state.statement, "table", None)
+        if tabela is not None:
+            _registrar_tabelas(orm_execute_state.session, {tabela.name})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_apos_commit(session):
+    tabelas = session.info.pop("tabelas_alteradas", None)
+    if tabelas:
+        cache_relatorios.invalidar_tabelas(tabelas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_apos_rollback(session):
+    session.info.pop("tabelas_alteradas", None)
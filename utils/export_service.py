@@ -1,5 +1,34 @@
+"""
+Exportação de relatórios em PDF (WeasyPrint) e DOCX.
+
+O WeasyPrint é pesado em CPU e segura o GIL; por isso a renderização roda num
+pool de processos dedicado, com um limite de exportações simultâneas por worker
+e um cache pelo sha256 do HTML (o mesmo relatório não é renderizado de novo).
+
+Configuração:
+- PDF_PROCESSOS: processos do pool (padrão 2).
+- PDF_SIMULTANEOS: exportações simultâneas por worker; as excedentes esperam até
+  PDF_ESPERA segundos e depois recebem 503 (padrões: PDF_PROCESSOS e 10).
+- PDF_TIMEOUT: tempo máximo de uma renderização, em segundos (padrão 60).
+- PDF_CACHE_MAX / PDF_CACHE_TTL: tamanho e validade do cache de PDFs (padrões 32 e 600 s).
+
+Exportações tabulares (respostas brutas): CSV gerado em blocos para um
+StreamingResponse e XLSX opcional (XlsxWriter em modo constant_memory, que grava
+linha a linha num arquivo temporário).
+"""
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, Any
-from fastapi import Response
+from fastapi import HTTPException, Response
+
+from utils.cache import criar_backend
 
 try:
 	from weasyprint import HTML
@@ -7,6 +36,149 @@ try:
 except Exception:
 	has_weasyprint = False
 
+try:
+	import xlsxwriter
+	has_xlsxwriter = True
+except ImportError:
+	has_xlsxwriter = False
+
+PDF_PROCESSOS = int(os.getenv("PDF_PROCESSOS", "2"))
+PDF_SIMULTANEOS = int(os.getenv("PDF_SIMULTANEOS", str(PDF_PROCESSOS)))
+PDF_ESPERA = float(os.getenv("PDF_ESPERA", "10"))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "60"))
+
+cache_pdfs = criar_backend(
+	prefixo="dipe-pdfs:",
+	max_itens=int(os.getenv("PDF_CACHE_MAX", "32")),
+	ttl=int(os.getenv("PDF_CACHE_TTL", "600"))
+)
+
+_vagas = threading.BoundedSemaphore(PDF_SIMULTANEOS)
+_pool = None
+_pool_lock = threading.Lock()
+_metricas = {}
+_metricas_lock = threading.Lock()
+
+
+def _renderizar_pdf(html_content: str) -> bytes:
+	"""Executada nos processos do pool."""
+	return HTML(string=html_content).write_pdf()
+
+
+def _obter_pool() -> ProcessPoolExecutor:
+	global _pool
+	with _pool_lock:
+		if _pool is None:
+			# spawn: os filhos não herdam threads nem conexões abertas do worker
+			_pool = ProcessPoolExecutor(
+				max_workers=PDF_PROCESSOS, mp_context=multiprocessing.get_context("spawn")
+			)
+		return _pool
+
+
+def encerrar_pool_pdf():
+	"""Encerra o pool de processos (desligamento da aplicação)."""
+	global _pool
+	with _pool_lock:
+		if _pool is not None:
+			_pool.shutdown(wait=False, cancel_futures=True)
+			_pool = None
+
+
+def _reciclar_pool():
+	"""
+	Descarta o pool e mata os processos filhos: shutdown(wait=False) não interrompe
+	uma renderização em andamento. O próximo PDF cria um pool novo.
+	"""
+	global _pool
+	with _pool_lock:
+		pool, _pool = _pool, None
+	if pool is None:
+		return
+	processos = list((getattr(pool, "_processes", None) or {}).values())
+	pool.shutdown(wait=False, cancel_futures=True)
+	for processo in processos:
+		if processo.is_alive():
+			processo.terminate()
+
+
+def _renderizar_no_pool(html_content: str) -> bytes:
+	try:
+		return _obter_pool().submit(_renderizar_pdf, html_content).result(timeout=PDF_TIMEOUT)
+	except (TempoEsgotado, BrokenProcessPool):
+		# Renderização travada (o filho continuaria ocupando o processo) ou um processo
+		# morreu (ex.: falta de memória): recria o pool na próxima exportação
+		_reciclar_pool()
+		raise
+
+
+def _registrar(nome: str, campo: str, duracao_ms: float = None):
+	with _metricas_lock:
+		item = _metricas.setdefault(nome, {
+			"renderizados": 0, "cache": 0, "recusados": 0, "erros": 0,
+			"tempo_total_ms": 0.0, "tempo_max_ms": 0.0,
+		})
+		item[campo] += 1
+		if duracao_ms is not None:
+			item["tempo_total_ms"] += duracao_ms
+			item["tempo_max_ms"] = max(item["tempo_max_ms"], duracao_ms)
+
+
+def estatisticas_pdf() -> dict:
+	"""Contadores e tempos de renderização por arquivo exportado."""
+	with _metricas_lock:
+		return {
+			"processos": PDF_PROCESSOS,
+			"simultaneos": PDF_SIMULTANEOS,
+			"por_arquivo": {
+				nome: dict(item, tempo_medio_ms=round(item["tempo_total_ms"] / item["renderizados"], 1)
+							if item["renderizados"] else 0.0)
+				for nome, item in _metricas.items()
+			},
+		}
+
+
+def limpar_estatisticas_pdf():
+	with _metricas_lock:
+		_metricas.clear()
+
+
+def gerar_pdf(html_content: str, nome: str = "relatorio.pdf") -> bytes:
+	"""
+	PDF do HTML, do cache ou renderizado no pool de processos.
+	Levanta HTTPException 503 se o limite de exportações simultâneas não liberar a tempo.
+	"""
+	chave = hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+	pdf_bytes = cache_pdfs.get(chave)
+	if pdf_bytes is not None:
+		_registrar(nome, "cache")
+		return pdf_bytes
+
+	if not _vagas.acquire(timeout=PDF_ESPERA):
+		_registrar(nome, "recusados")
+		raise HTTPException(status_code=503, detail="Muitas exportações em andamento. Tente novamente em instantes.")
+	try:
+		# Outra requisição pode ter renderizado o mesmo HTML enquanto esta esperava
+		pdf_bytes = cache_pdfs.get(chave)
+		if pdf_bytes is not None:
+			_registrar(nome, "cache")
+			return pdf_bytes
+		inicio = time.perf_counter()
+		try:
+			pdf_bytes = _renderizar_no_pool(html_content)
+		except (TempoEsgotado, BrokenProcessPool) as e:
+			_registrar(nome, "erros")
+			print(f"Erro ao gerar PDF {nome}: {e!r}")
+			raise HTTPException(status_code=504, detail="Tempo esgotado ao gerar o PDF.")
+		duracao_ms = (time.perf_counter() - inicio) * 1000
+	finally:
+		_vagas.release()
+
+	_registrar(nome, "renderizados", duracao_ms)
+	print(f"PDF {nome} gerado em {duracao_ms:.0f} ms ({len(pdf_bytes)} bytes)")
+	cache_pdfs.set(chave, pdf_bytes)
+	return pdf_bytes
+
 from docx import Document
 from docx.shared import Pt
 
@@ -14,12 +186,20 @@ from docx.shared import Pt
 def pdf_response_from_html(html_content: str, filename: str = "relatorio.pdf") -> Response:
 	if not has_weasyprint:
 		return Response(content=b"WeasyPrint nao instalado.", media_type="text/plain", status_code=500)
-	pdf_bytes = HTML(string=html_content).write_pdf()
+	pdf_bytes = gerar_pdf(html_content, filename)
 	headers = {"Content-Disposition": f"attachment; filename={filename}"}
 	return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
 
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
 def docx_response_from_data(title: str, sections: Dict[str, Any], filename: str = "relatorio.docx") -> Response:
+	headers = {"Content-Disposition": f"attachment: filename={filename}"}
+	return Response(content=gerar_docx(title, sections), media_type=DOCX_MEDIA_TYPE, headers=headers)
+
+
+def gerar_docx(title: str, sections: Dict[str, Any]) -> bytes:
 	doc = Document()
 	doc.add_heading(title, level=1)
 	for section_title, section_data in sections.items():
@@ -42,8 +222,49 @@ def docx_response_from_data(title: str, sections: Dict[str, Any], filename: str
 	from io import BytesIO
 	buf = BytesIO()
 	doc.save(buf)
-	buf.seek(0)
-	headers = {"Content-Disposition": f"attachment: filename={filename}"}
-	return Response(content=buf.read(), media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document", headers=headers)
+	return buf.getvalue()
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_LINHAS_POR_BLOCO = 500
+# Texto digitado pelo aluno que o Excel/LibreOffice interpretariam como fórmula
+PREFIXOS_FORMULA = ("=", "+", "-", "@")
+
+
+def _celula_csv(valor):
+	"""Neutraliza a injeção de fórmula: texto começando com = + - @ ganha um apóstrofo na frente."""
+	if isinstance(valor, str) and valor.startswith(PREFIXOS_FORMULA):
+		return "'" + valor
+	return valor
+
+
+def csv_em_blocos(cabecalho, linhas, linhas_por_bloco: int = CSV_LINHAS_POR_BLOCO):
+	"""Gera o CSV em blocos de bytes, sem montar o arquivo inteiro. UTF-8 com BOM para o Excel abrir os acentos."""
+	buffer = io.StringIO()
+	escritor = csv.writer(buffer)
+	buffer.write("\ufeff")
+	escritor.writerow(cabecalho)
+	for contador, linha in enumerate(linhas, 1):
+		escritor.writerow([_celula_csv(valor) for valor in linha])
+		if contador % linhas_por_bloco == 0:
+			yield buffer.getvalue().encode("utf-8")
+			buffer.seek(0)
+			buffer.truncate()
+	yield buffer.getvalue().encode("utf-8")
 
 
+def gravar_xlsx(caminho: str, cabecalho, linhas, planilha: str = "Respostas"):
+	"""
+	Grava a planilha linha a linha (constant_memory): a memória não cresce com o número de linhas.
+	Texto é sempre gravado como texto: nada vira fórmula nem link.
+	"""
+	livro = xlsxwriter.Workbook(caminho, {
+		"constant_memory": True, "strings_to_formulas": False, "strings_to_urls": False
+	})
+	try:
+		folha = livro.add_worksheet(planilha[:31])
+		folha.write_row(0, 0, cabecalho, livro.add_format({"bold": True}))
+		for numero, linha in enumerate(linhas, 1):
+			folha.write_row(numero, 0, linha)
+	finally:
+		livro.close()
@@ -0,0 +1,93 @@
+"""
+Normalização de matérias e manutenção da dimensão `materias`.
+
+Prova e BancoQuestoes guardam o texto digitado em `materia` e a chave
+canônica em `materia_id` (indexada). O materia_id é preenchido
+automaticamente ao inserir ou alterar a matéria (eventos de mapper
+registrados em models/prova.py e models/banco_questoes.py), de modo que as
+consultas analíticas filtram e agrupam por inteiro, sem ILIKE nem
+normalização de acentos linha a linha.
+"""
+import unicodedata
+
+from sqlalchemy import inspect, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models.materia import Materia
+
+# Matérias fixas, na ordem usada pelos painéis
+MATERIAS_PADRAO = ('portugues', 'matematica', 'ciencias')
+
+
+def normalizar_materia(materia: str) -> str:
+    """
+    Normaliza o nome da matéria removendo acentos, convertendo para minúsculas
+    e tratando variações de 'Ciências'
+    """
+    if not materia:
+        return ""
+    
+    # Remove acentos
+    materia_sem_acento = unicodedata.normalize('NFD', materia)
+    materia_sem_acento = ''.join(char for char in materia_sem_acento if unicodedata.category(char) != 'Mn')
+    
+    # Converte para minúsculas
+    materia_lower = materia_sem_acento.lower().strip()
+    
+    # Trata variações de Ciências (incluindo "Ciências da Natureza")
+    if 'ciencias' in materia_lower or 'ciencia' in materia_lower:
+        return 'ciencias'
+    
+    # Trata variações de Português
+    if 'portugues' in materia_lower:
+        return 'portugues'
+    
+    # Trata variações de Matemática
+    if 'matematica' in materia_lower:
+        return 'matematica'
+    
+    return materia_lower
+
+def obter_materia_padrao(materia_normalizada: str) -> str:
+    """
+    Retorna o nome padrão da matéria baseado na versão normalizada
+    """
+    if materia_normalizada == 'ciencias':
+        return 'Ciências'
+    elif materia_normalizada == 'portugues':
+        return 'Português'
+    elif materia_normalizada == 'matematica':
+        return 'Matemática'
+    return materia_normalizada.title()
+
+
+def obter_ou_criar_materia_id(connection, materia: str):
+    """Id da matéria canônica de `materia`, criando a linha em `materias` se preciso."""
+    chave = normalizar_materia(materia)
+    if not chave:
+        return None
+    consulta = select(Materia.id).where(Materia.chave == chave)
+    materia_id = connection.execute(consulta).scalar()
+    if materia_id is not None:
+        return materia_id
+    try:
+        with connection.begin_nested():
+            return connection.execute(
+                insert(Materia).values(chave=chave, nome=obter_materia_padrao(chave))
+            ).inserted_primary_key[0]
+    except IntegrityError:
+        # Criada por outra transação ao mesmo tempo
+        return connection.execute(consulta).scalar()
+
+
+def sincronizar_materia_id(mapper, connection, target):
+    """Evento before_insert/before_update: mantém materia_id coerente com materia."""
+    if target.materia_id is None or inspect(target).attrs.materia.history.has_changes():
+        target.materia_id = obter_ou_criar_materia_id(connection, target.materia)
+
+
+def filtro_materia(coluna_materia_id, materia: str):
+    """Condição SQL: `coluna_materia_id` aponta para a matéria canônica de `materia`."""
+    return coluna_materia_id == select(Materia.id).where(
+        Materia.chave == normalizar_materia(materia)
+    ).scalar_subquery()
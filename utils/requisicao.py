@@ -0,0 +1,14 @@
+"""
+Dependências para ler o corpo da requisição em rotas síncronas.
+
+Rotas que usam a Session do SQLAlchemy são `def` (o FastAPI as executa no pool
+de threads); o `await request.form()` fica numa dependência async, resolvida no
+event loop antes da rota.
+"""
+from fastapi import Request
+from starlette.datastructures import FormData
+
+
+async def ler_formulario(request: Request) -> FormData:
+    """Formulário completo da requisição, para campos com nomes dinâmicos (questao_<id>, pergunta_<id>)."""
+    return await request.form()
@@ -0,0 +1,69 @@
+"""
+Hash e verificação de senhas com bcrypt fora do event loop.
+
+O bcrypt leva de 100 a 300 ms por senha (custo 12) e, chamado direto numa rota
+async, trava todas as outras requisições do worker nesse intervalo. As versões
+`*_no_pool` rodam o cálculo num pool de threads limitado (a biblioteca bcrypt
+libera o GIL): rotas síncronas esperam o resultado sem ocupar mais que
+SENHA_THREADS núcleos com bcrypt, e as versões async liberam o event loop.
+
+Configuração:
+- BCRYPT_ROUNDS: custo dos novos hashes (padrão 12). Hashes com outro custo são
+  refeitos no próximo login bem-sucedido (precisa_rehash).
+- SENHA_THREADS: máximo de cálculos simultâneos por processo (padrão: nº de CPUs, até 4).
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+SENHA_THREADS = int(os.getenv("SENHA_THREADS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=SENHA_THREADS, thread_name_prefix="senha")
+
+
+def gerar_hash(senha: str, rounds: int = None) -> str:
+    """Gera o hash bcrypt da senha com o custo configurado."""
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
+    return bcrypt.hashpw(senha.encode("utf-8"), salt).decode("utf-8")
+
+
+def verificar_senha(senha: str, senha_hash: str) -> bool:
+    """Confere a senha com o hash; hashes vazios ou malformados não conferem."""
+    if not senha_hash:
+        return False
+    try:
+        return bcrypt.checkpw(senha.encode("utf-8"), senha_hash.encode("utf-8"))
+    except ValueError:
+        return False
+
+
+def custo_do_hash(senha_hash: str):
+    """Custo (rounds) de um hash no formato $2b$12$..., ou None se não for bcrypt."""
+    partes = (senha_hash or "").split("$")
+    if len(partes) < 4 or not partes[2].isdigit():
+        return None
+    return int(partes[2])
+
+
+def precisa_rehash(senha_hash: str) -> bool:
+    """True se o hash foi gerado com custo diferente de BCRYPT_ROUNDS."""
+    return custo_do_hash(senha_hash) != BCRYPT_ROUNDS
+
+
+def gerar_hash_no_pool(senha: str) -> str:
+    return _executor.submit(gerar_hash, senha).result()
+
+
+def verificar_senha_no_pool(senha: str, senha_hash: str) -> bool:
+    return _executor.submit(verificar_senha, senha, senha_hash).result()
+
+
+async def gerar_hash_async(senha: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, gerar_hash, senha)
+
+
+async def verificar_senha_async(senha: str, senha_hash: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_executor, verificar_senha, senha, senha_hash)
@@ -0,0 +1,164 @@
+"""
+Sessão assinada (HMAC-SHA256) no cookie `session_user`.
+
+O token carrega o id do usuário, o tipo (aluno/professor/gestor), o id do papel
+(idAluno; para professor e gestor é o próprio id do usuário) e a versão de sessão
+do usuário (usuarios.versao_sessao). Tokens já validados ficam num cache em
+memória do processo.
+
+Revogação: logout e exclusão do usuário incrementam versao_sessao, o que invalida
+todos os tokens emitidos antes. A versão e o tipo atuais de cada usuário ficam em
+cache por SESSAO_VERSAO_TTL segundos, então as dependências de autenticação só
+consultam o banco uma vez a cada intervalo por usuário; em outros processos a
+revogação vale em até esse intervalo.
+
+Configuração:
+- SESSAO_SEGREDO: chave de assinatura, igual em todos os workers. Sem ela, uma
+  chave aleatória é gerada uma vez e guardada em SESSAO_ARQUIVO_SEGREDO.
+- SESSAO_MAX_IDADE: validade do token em segundos (padrão 12 h).
+- SESSAO_VERSAO_TTL: segundos de cache da versão de sessão (padrão 30).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from dao.database import get_db
+from utils.cache import CacheLRU
+
+COOKIE_SESSAO = "session_user"
+SESSAO_MAX_IDADE = int(os.getenv("SESSAO_MAX_IDADE", str(12 * 3600)))
+SESSAO_VERSAO_TTL = int(os.getenv("SESSAO_VERSAO_TTL", "30"))
+SESSAO_ARQUIVO_SEGREDO = Path(os.getenv(
+    "SESSAO_ARQUIVO_SEGREDO", Path(__file__).resolve().parent.parent / ".sessao_segredo"
+))
+
+
+class Principal(NamedTuple):
+    usuario_id: int
+    tipo: str
+    papel_id: Optional[int]
+    versao: int = 0
+
+
+def _carregar_segredo() -> bytes:
+    segredo = os.getenv("SESSAO_SEGREDO")
+    if segredo:
+        return segredo.encode("utf-8")
+    try:
+        # O_EXCL: entre workers iniciando juntos, só um cria o arquivo
+        descritor = os.open(SESSAO_ARQUIVO_SEGREDO, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descritor, "w") as arquivo:
+            arquivo.write(secrets.token_hex(32))
+    except FileExistsError:
+        pass
+    return SESSAO_ARQUIVO_SEGREDO.read_text().strip().encode("utf-8")
+
+
+_segredo = _carregar_segredo()
+_principais = CacheLRU(max_itens=int(os.getenv("SESSAO_CACHE_MAX", "10000")), ttl=300)
+# usuario_id -> (versao_sessao, tipo) atuais; (None, None) para usuário excluído
+_versoes = CacheLRU(max_itens=int(os.getenv("SESSAO_CACHE_MAX", "10000")), ttl=SESSAO_VERSAO_TTL)
+
+
+def _b64(dados: bytes) -> bytes:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=")
+
+
+def _assinar(corpo: bytes) -> bytes:
+    return _b64(hmac.new(_segredo, corpo, hashlib.sha256).digest())
+
+
+def criar_token(principal: Principal) -> str:
+    """Serializa e assina o principal para gravar no cookie."""
+    carga = json.dumps(
+        {"u": principal.usuario_id, "t": principal.tipo, "p": principal.papel_id, "v": principal.versao,
+         "iat": int(time.time())},
+        separators=(",", ":")
+    ).encode("utf-8")
+    corpo = _b64(carga)
+    return (corpo + b"." + _assinar(corpo)).decode("ascii")
+
+
+def ler_token(token: Optional[str]) -> Optional[Principal]:
+    """Valida assinatura e validade do token. Retorna None se inválido ou expirado."""
+    if not token:
+        return None
+    principal = _principais.get(token)
+    if principal is not None:
+        return principal
+
+    try:
+        corpo, assinatura = token.encode("ascii").split(b".", 1)
+        if not hmac.compare_digest(assinatura, _assinar(corpo)):
+            return None
+        carga = json.loads(base64.urlsafe_b64decode(corpo + b"=" * (-len(corpo) % 4)))
+        restante = carga["iat"] + SESSAO_MAX_IDADE - time.time()
+        if restante <= 0:
+            return None
+        principal = Principal(int(carga["u"]), carga["t"], carga["p"], int(carga.get("v", 0)))
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        return None
+
+    _principais.set(token, principal, ttl=min(_principais.ttl, restante))
+    return principal
+
+
+def esquecer_token(token: Optional[str]):
+    """Remove o token do cache do processo (logout)."""
+    if token:
+        _principais.delete(token)
+
+
+def lembrar_versao(usuario_id: int, versao: int, tipo: str):
+    """Guarda a versão e o tipo já lidos do banco (login), poupando a consulta da primeira requisição."""
+    _versoes.set(usuario_id, (versao, tipo))
+
+
+def sessao_vigente(db: Session, principal: Principal) -> bool:
+    """Confere se o usuário ainda existe, com o mesmo tipo e a versão de sessão assinada no token."""
+    atual = _versoes.get(principal.usuario_id)
+    if atual is None:
+        from models.usuario import Usuario
+
+        linha = db.query(Usuario.versao_sessao, Usuario.tipo).filter(Usuario.id == principal.usuario_id).first()
+        atual = (linha.versao_sessao, linha.tipo) if linha else (None, None)
+        _versoes.set(principal.usuario_id, atual)
+    return atual == (principal.versao, principal.tipo)
+
+
+def revogar_sessoes(db: Session, usuario_id: int):
+    """
+    Invalida todos os tokens já emitidos para o usuário (sem commit). Neste processo
+    vale na hora; nos demais, quando o cache da versão expirar (SESSAO_VERSAO_TTL).
+    """
+    from models.usuario import Usuario
+
+    db.execute(
+        update(Usuario).where(Usuario.id == usuario_id)
+        .values(versao_sessao=Usuario.versao_sessao + 1)
+        .execution_options(synchronize_session=False)
+    )
+    _versoes.delete(usuario_id)
+
+
+def obter_principal(request: Request, db: Session = Depends(get_db)) -> Principal:
+    """Principal da sessão; sem sessão válida ou revogada, redireciona para o login."""
+    principal = ler_token(request.cookies.get(COOKIE_SESSAO))
+    if principal is None or not sessao_vigente(db, principal):
+        print("❌ Tentativa de acesso sem sessão ativa!")
+        raise HTTPException(
+            status_code=303,
+            detail="Usuário não autenticado",
+            headers={"Location": "/login?erro=Usuario nao autenticado"},
+        )
+    return principal